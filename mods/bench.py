@@ -0,0 +1,207 @@
+"""flux benchmarks"""
+
+import os, sys, json, time, timeit, shutil, tempfile, subprocess
+
+from mods import log, util, project, loader
+from packages import yaml
+from mods.target import Target
+from mods.project import Project
+
+#------------------------------------------------------------------------------
+
+HISTORY_FILE = 'bench.json' # benchmarks history, in workspace intermediate dir
+
+NINJA_SIZES = [10000, 50000, 100000]
+YAML_SIZES  = [1000, 10000]
+
+STARTUP_VERBS  = ['version', 'help', 'list']
+STARTUP_BUDGET = 0.020  # max flux startup time over python startup (seconds)
+
+# modules trivial verbs must not import
+STARTUP_LAZY_MODULES = [
+    'packages.yaml', 'packages.colorama', 'mods.loader',
+    'mods.build', 'mods.target', 'mods.project', 'mods.graph', 'mods.cache',
+]
+
+#------------------------------------------------------------------------------
+def get_history_file(flux_dir):
+    return util.fix_path(os.path.join(util.get_workspace_dir(flux_dir), project.FDIR, HISTORY_FILE))
+
+#------------------------------------------------------------------------------
+def measure(func, repeat=3):
+    '''returns best time in seconds of `repeat` calls'''
+    best = None
+    for _ in range(max(1, repeat)):
+        start = timeit.default_timer()
+        func()
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+#------------------------------------------------------------------------------
+def record(flux_dir, name, results):
+    '''print results and append them to benchmarks history, `results` is a list of (key, seconds)'''
+    path = get_history_file(flux_dir)
+    history = []
+    if os.path.isfile(path):
+        try:
+            with open(path, 'r') as f:
+                history = json.load(f)
+        except ValueError:
+            log.warn('invalid benchmarks history file `%s`, starting a new one' % path)
+
+    # compare with previous runs of same benchmark
+    prev = {}
+    for entry in history:
+        if entry['name'] == name:
+            prev.update(entry['results'])
+
+    for key, secs in results:
+        delta = ''
+        if prev.get(key):
+            delta = ' (%+.1f%%)' % ((secs - prev[key]) * 100.0 / prev[key])
+        log.item('  %s' % key, '%.3fs%s' % (secs, delta))
+
+    history.append({
+        'name': name,
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'version': project.VERSION,
+        'python': '%s.%s.%s' % sys.version_info[:3],
+        'results': dict(results),
+    })
+    if not os.path.exists(util.split_dir(path)):
+        os.makedirs(util.split_dir(path))
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=2, sort_keys=True)
+
+#------------------------------------------------------------------------------
+def bench_ninja(flux_dir, opts, sizes=None, repeat=3):
+    '''measure ninja file generation time of synthetic projects'''
+    target = Target(flux_dir, opts)
+    tmp_dir = util.fix_path(tempfile.mkdtemp(prefix='flux-bench-'))
+    results = []
+    try:
+        with open(os.path.join(tmp_dir, project.FILE), 'w') as f:
+            f.write('name: bench\nbuild: mod\ninputs:\n')
+
+        for size in sizes or NINJA_SIZES:
+            proj = Project(flux_dir, tmp_dir, opts, True)
+            # synthetic sources, 100 files per dir
+            proj.src_files = ['%s/src/dir%04d/file%06d.cpp' % (tmp_dir, i // 100, i) for i in range(size)]
+            proj.make_dirs()
+
+            def gen():
+                with open(proj.gen_file, 'w') as out:
+                    proj.gen_ninja(out, opts, target)
+
+            results.append(('%d sources' % size, measure(gen, repeat)))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    record(flux_dir, 'ninja', results)
+    return results
+
+#------------------------------------------------------------------------------
+def write_yaml(file, size):
+    '''write a synthetic project file of `size` inputs using flux tags'''
+    with open(file, 'w') as f:
+        f.write('name: bench\nbuild: mod\noptions:\n')
+        f.write('  cc: !concat\n    - !?debug -O0 -g\n    - !?release -O3\n    - !$env -I${HOME}\n')
+        f.write('inputs:\n')
+        for i in range(size):
+            tag = ['', '!?debug ', '!?x64 ', '!?windows '][i % 4]
+            f.write('  - %ssrc/dir%04d/file%06d.cpp # source %d\n' % (tag, i // 100, i, i))
+        f.write('defines:\n')
+        for i in range(size // 10):
+            f.write('  - !join [FLUX, DEFINE_%d]\n' % i)
+
+#------------------------------------------------------------------------------
+def bench_yaml(flux_dir, opts, sizes=None, repeat=3):
+    '''measure project file parsing time of synthetic project files, with each available parser'''
+    parsers = ['python']
+    if loader.find_c_base_loader():
+        parsers.append('c')
+    else:
+        log.warn('LibYAML C parser not available, install PyYAML with LibYAML bindings to compare')
+
+    tmp_dir = util.fix_path(tempfile.mkdtemp(prefix='flux-bench-'))
+    results = []
+    try:
+        for size in sizes or YAML_SIZES:
+            file = os.path.join(tmp_dir, '%d.yml' % size)
+            write_yaml(file, size)
+            for parser in parsers:
+                secs = measure(lambda: loader.load(file, opts, None, parser), repeat)
+                results.append(('%d inputs %s' % (size, parser), secs))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    record(flux_dir, 'yaml', results)
+    return results
+
+#------------------------------------------------------------------------------
+def scan(loader_class, data):
+    scanner = loader_class(data)
+    while scanner.check_token():
+        scanner.get_token()
+
+#------------------------------------------------------------------------------
+def bench_scan(flux_dir, sizes=None, repeat=3):
+    '''measure scanning throughput of synthetic project files, tokens are checked by tests/test_scanner.py'''
+    if not hasattr(yaml, 'FastSafeLoader'):
+        log.fatal('fast scanner requires python 3')
+
+    tmp_dir = util.fix_path(tempfile.mkdtemp(prefix='flux-bench-'))
+    results = []
+    try:
+        for size in sizes or YAML_SIZES:
+            file = os.path.join(tmp_dir, '%d.yml' % size)
+            write_yaml(file, size)
+            with open(file, 'rb') as f:
+                data = f.read()
+            for name, loader_class in [('python', yaml.SafeLoader), ('fast', yaml.FastSafeLoader)]:
+                secs = measure(lambda: scan(loader_class, data), repeat)
+                results.append(('%d inputs %s' % (size, name), secs))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    record(flux_dir, 'scan', results)
+    return results
+
+#------------------------------------------------------------------------------
+def get_imported_modules(flux_dir, args):
+    '''returns modules imported by a flux command, from python `-X importtime` output'''
+    cmd = [sys.executable, '-X', 'importtime', os.path.join(flux_dir, 'flux')] + args
+    with open(os.devnull, 'w') as null:
+        proc = subprocess.Popen(cmd, stdout=null, stderr=subprocess.PIPE, cwd=util.get_workspace_dir(flux_dir))
+        _, err = proc.communicate()
+    return [x.split('|')[-1].strip() for x in err.decode('utf-8', 'replace').splitlines() if x.startswith('import time:')]
+
+#------------------------------------------------------------------------------
+def bench_startup(flux_dir, repeat=10):
+    '''measure trivial verbs startup time, check they don't import build modules'''
+    ok = True
+    if sys.version_info >= (3, 7):
+        for name in STARTUP_VERBS:
+            modules = get_imported_modules(flux_dir, [name])
+            lazy = [x for x in modules if x.split('.')[0] + '.' + (x.split('.') + [''])[1] in STARTUP_LAZY_MODULES]
+            if lazy:
+                log.warn('`%s` imports %s' % (name, ', '.join(lazy)))
+                ok = False
+
+    def run(args):
+        with open(os.devnull, 'w') as null:
+            subprocess.call([sys.executable] + args, stdout=null, cwd=util.get_workspace_dir(flux_dir))
+
+    python = measure(lambda: run(['-c', 'pass']), repeat)
+    results = [('python', python)]
+    for name in STARTUP_VERBS:
+        secs = measure(lambda: run([os.path.join(flux_dir, 'flux'), name]), repeat)
+        results.append((name, secs))
+        if secs - python > STARTUP_BUDGET:
+            log.warn('`%s` starts in %.1fms over python startup, budget is %.1fms' % (name, (secs - python) * 1000, STARTUP_BUDGET * 1000))
+            ok = False
+
+    record(flux_dir, 'startup', results)
+    return ok
@@ -41,6 +41,13 @@ EXT = {
     },
 }
 
+# files written by app link next to out file, out file extension replaced
+SIDE_EXT = {
+    'emscripten': {
+        'app': ['.js', '.wasm'],
+    },
+}
+
 # aliases
 aliases = {
     'application' : 'app',
@@ -86,8 +93,15 @@ class BuildOpts:
         self.outdir = ''
         self.profile = '' # profile + tag
         self.clean = False
+        self.generate = False
+        self.relocatable = False # workspace relative paths in ninja files
         self.time = False
+        self.time_file = '' # build timing json file
         self.verbose = 0
+        self.jobs = 0 # 0: default jobs from cpu cores and available memory
+        self.load = 0 # 0: no load average limit
+        self.keep_going = 1 # ninja default, stop after first failure
+        self.opts_args = [] # options forwarded to ninja files regeneration, changing them regenerates ninja files
 
     #------------------------------------------------------------------------------
     def parse_opts(self, proj_dir, args):
@@ -95,8 +109,8 @@ class BuildOpts:
         self.args = args
 
         # parse arguments
-        i = 0
-        for arg in args:
+        first = len(args) # index of first project path
+        for index, arg in enumerate(args):
             # options without params
             if arg in ['-v', '-verbose']:
                 self.verbose = 1
@@ -104,11 +118,15 @@ class BuildOpts:
                 self.time = True
             elif arg in ['-c', '-clean']:
                 self.clean = True
+            elif arg in ['-g', '-generate']:
+                self.generate = True
+            elif arg in ['-r', '-relocatable']:
+                self.relocatable = True
+                self.opts_args.append(arg)
             else:
                 # options with params
                 if arg.startswith('-'):
-                    i = arg.find('=')
-                    if i == -1:
+                    if '=' not in arg:
                         log.fatal('expected value for option `%s`' % arg)
 
                     opt, _, val = arg.partition('=')
@@ -119,10 +137,16 @@ class BuildOpts:
                     opt = opt.lower()
                     val = val.lower()
 
+                    # build timing json file, relative to current dir
+                    if opt in ['-t', '-time']:
+                        self.time = True
+                        self.time_file = os.path.abspath(os.path.join(proj_dir, path))
+                        continue # report only option, don't regenerate ninja files
                     # outdir (output dir)
-                    if opt in ['-o', '-outdir']:
+                    elif opt in ['-o', '-outdir']:
                         # relative to current dir
                         self.outdir = os.path.abspath(os.path.join(proj_dir, path))
+                        arg = '%s=%s' % (opt, util.fix_path(self.outdir))
                     # apptype
                     elif opt == '-apptype':
                         if val in APP_TYPE:
@@ -155,6 +179,7 @@ class BuildOpts:
                             self.verbose = int(val)
                         else:
                             log.fatal('invalid value for `verbose` option: `{}` - must be {}'.format(val, "['0', '1', '2', '3' or '-1']"))
+                        continue
                     # profile
                     elif opt == '-profile':
                         #TODO: -profile=windows-msvc-release-x64; macos-release-x64 ; ios-sim-release-arm64 ; emscripten-release-wasm
@@ -163,15 +188,37 @@ class BuildOpts:
                     # tag
                     elif opt == '-tag':
                         self.tag = val
+                    # jobs
+                    elif opt in ['-j', '-jobs']:
+                        if val.isdigit() and int(val) > 0:
+                            self.jobs = int(val)
+                        else:
+                            log.fatal('invalid value for `jobs` option: `{}` - must be a positive number'.format(val))
+                        continue # ninja only options, don't regenerate ninja files
+                    # load average
+                    elif opt in ['-l', '-load']:
+                        try:
+                            self.load = float(val)
+                        except ValueError:
+                            log.fatal('invalid value for `load` option: `{}` - must be a number'.format(val))
+                        continue
+                    # keep going
+                    elif opt in ['-k', '-keep-going']:
+                        if val.isdigit():
+                            self.keep_going = int(val)
+                        else:
+                            log.fatal('invalid value for `keep-going` option: `{}` - must be a number (0: infinity)'.format(val))
+                        continue
                     else:
                         log.fatal('unrecognized option: `%s`' %arg)
+                    self.opts_args.append(arg)
                 else:
                     #paths of project file
-                    i = args.index(arg)
+                    first = index
                     break
         
         # get project paths
-        args = args[i:]
+        args = args[first:]
 
         # adjust build options
         if self.target == '' or self.target == 'desktop':
@@ -203,11 +250,25 @@ class BuildOpts:
         else:
             log.fatal('unrecognized apptype `%s`' % self.apptype)
 
+        # default jobs
+        if not self.jobs:
+            self.jobs = util.get_num_jobs()
+
         # set built profile: <target>-<config>-<arch>[-<tag>]
         self.profile = '-'.join([self.target, self.config, self.arch]) + (('-' + self.tag) if self.tag else '')
 
         return args
 
+    #------------------------------------------------------------------------------
+    def get_ninja_args(self):
+        '''returns job control arguments for ninja'''
+        args = ['-j', str(self.jobs)]
+        if self.load > 0:
+            args += ['-l', str(self.load)]
+        if self.keep_going != 1:
+            args += ['-k', str(self.keep_going)]
+        return args
+
     #------------------------------------------------------------------------------
     def __repr__(self):
         return \
@@ -219,7 +280,10 @@ class BuildOpts:
             '%stag:%s %s, ' % (log.BLUE, log.DEFAULT, self.tag) + \
             '%stoolchain:%s %s, ' % (log.BLUE, log.DEFAULT, self.toolchain) + \
             '%sclean:%s %s, ' % (log.BLUE, log.DEFAULT, str(self.clean)) + \
+            '%sgenerate:%s %s, ' % (log.BLUE, log.DEFAULT, str(self.generate)) + \
+            '%srelocatable:%s %s, ' % (log.BLUE, log.DEFAULT, str(self.relocatable)) + \
             '%stime:%s %s, ' % (log.BLUE, log.DEFAULT, str(self.time)) + \
             '%sverbose:%s %s, ' % (log.BLUE, log.DEFAULT, str(self.verbose)) + \
+            '%sjobs:%s %s, ' % (log.BLUE, log.DEFAULT, str(self.jobs)) + \
             '%sapptype:%s %s'   % (log.BLUE, log.DEFAULT, self.apptype) + \
             log.DEFAULT
\ No newline at end of file
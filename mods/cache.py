@@ -0,0 +1,410 @@
+"""flux compile cache: content-addressed objects store
+
+run as launcher of compile rules, see `launcher` key in target files:
+    python mods/cache.py <toolchain> <compiler> [compiler args]
+
+the cache key hashes the preprocessed source, the normalized compiler
+arguments and the compiler identity (binary hash and version)."""
+
+import os, sys, subprocess, hashlib, json, shutil, tempfile, zipfile, io
+
+if __name__ == '__main__':
+    # run as launcher, import flux modules from flux dir
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mods import remote
+
+#------------------------------------------------------------------------------
+
+CACHE_DIR  = 'cache'    # workspace cache dir, in workspace intermediate dir
+CACHE_SIZE = 5120       # default max cache size (MB)
+KEY_VERSION = '1'       # bump to invalidate all cached entries
+
+# placeholders in stored files
+WORKSPACE_DIR = b'@FLUX_WORKSPACE_DIR@'
+OBJECT_FILE   = b'@FLUX_OBJECT_FILE@'
+
+SOURCE_EXT = ['.c', '.m', '.cc', '.cxx', '.cpp', '.c++', '.mm']
+
+#------------------------------------------------------------------------------
+def get_workspace_dir():
+    # flux_dir/mods/cache.py
+    ws_dir = os.environ.get('FLUX_WORKSPACE_DIR')
+    if not ws_dir:
+        ws_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return ws_dir.replace('\\', '/')
+
+#------------------------------------------------------------------------------
+def get_cache_dir():
+    '''returns compile cache dir, `FLUX_CACHE_DIR` env var overrides workspace cache dir'''
+    cache_dir = os.environ.get('FLUX_CACHE_DIR')
+    if not cache_dir:
+        cache_dir = os.path.join(get_workspace_dir(), 'flux-proj', CACHE_DIR)
+    return cache_dir.replace('\\', '/')
+
+#------------------------------------------------------------------------------
+def get_max_size():
+    '''returns max cache size in bytes, from `FLUX_CACHE_SIZE` env var (MB)'''
+    size = os.environ.get('FLUX_CACHE_SIZE', '')
+    return (int(size) if size.isdigit() else CACHE_SIZE) * 1024 * 1024
+
+#------------------------------------------------------------------------------
+def is_enabled():
+    '''`FLUX_CACHE=0` env var disables compile cache'''
+    return os.environ.get('FLUX_CACHE', '1') != '0'
+
+#------------------------------------------------------------------------------
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+#------------------------------------------------------------------------------
+def write_file(path, data):
+    '''write file atomically, concurrent launchers may write the same file'''
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    try:
+        if hasattr(os, 'replace'):
+            os.replace(tmp, path)
+        else:
+            os.rename(tmp, path)
+    except OSError:
+        os.remove(tmp)
+
+#------------------------------------------------------------------------------
+def find_program(name):
+    '''returns program path from PATH env var'''
+    if os.path.dirname(name):
+        return name
+    exts = os.environ.get('PATHEXT', '').split(os.pathsep) if sys.platform == 'win32' else []
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        for ext in [''] + exts:
+            file = os.path.join(path.strip('"'), name + ext)
+            if os.path.isfile(file):
+                return file
+    return name
+
+#------------------------------------------------------------------------------
+def get_compiler_id(cache_dir, toolchain, compiler):
+    '''returns compiler identity, cached by compiler path, mtime and size'''
+    path = os.path.abspath(find_program(compiler))
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    id_dir = os.path.join(cache_dir, 'compilers')
+    id_file = os.path.join(id_dir, hashlib.sha1(path.encode('utf-8')).hexdigest() + '.json')
+    stamp = [st.st_mtime, st.st_size]
+    try:
+        with open(id_file, 'r') as f:
+            data = json.load(f)
+        if data['stamp'] == stamp:
+            return data['id']
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    # binary hash and version
+    h = hashlib.sha1(read_file(path))
+    cmd = [compiler] if toolchain == 'msvc' else [compiler, '--version'] # cl prints version banner without args
+    try:
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        h.update(out + err)
+    except OSError:
+        return None
+
+    if not os.path.isdir(id_dir):
+        os.makedirs(id_dir)
+    write_file(id_file, json.dumps({'path': path, 'stamp': stamp, 'id': h.hexdigest()}).encode('utf-8'))
+    return h.hexdigest()
+
+#------------------------------------------------------------------------------
+def parse_args(toolchain, args):
+    '''returns (obj, dep, preprocessor args, normalized args) of a compile command, None if not cacheable'''
+    obj = dep = None
+    srcs = []
+    pp_args = []
+    key_args = []
+    compiling = False
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if toolchain == 'msvc':
+            opt = arg[1:] if arg[:1] in ['-', '/'] else ''
+            if opt.startswith('Fo'):
+                obj = arg[3:]
+            elif opt == 'showIncludes':
+                key_args.append(arg)
+            elif opt == 'c':
+                compiling = True
+                pp_args.append('-E')
+            elif opt[:2] in ['Zi', 'ZI', 'Fd', 'Yu', 'Yc']:
+                # pdb and precompiled headers side effects
+                return None
+            else:
+                pp_args.append(arg)
+                if os.path.splitext(arg)[1].lower() in SOURCE_EXT and not opt:
+                    srcs.append(arg)
+                else:
+                    key_args.append(arg)
+        else:
+            if arg == '-o' and i+1 < len(args):
+                i += 1
+                obj = args[i]
+            elif arg == '-MF' and i+1 < len(args):
+                i += 1
+                dep = args[i]
+            elif arg in ['-MMD', '-MD']:
+                key_args.append(arg)
+            elif arg in ['-MT', '-MQ']:
+                return None
+            elif arg == '-c':
+                compiling = True
+                pp_args.append('-E')
+            else:
+                pp_args.append(arg)
+                if os.path.splitext(arg)[1].lower() in SOURCE_EXT and not arg.startswith('-'):
+                    srcs.append(arg)
+                else:
+                    key_args.append(arg)
+        i += 1
+
+    if not compiling or not obj or len(srcs) != 1:
+        return None
+    return obj, dep, pp_args, key_args
+
+#------------------------------------------------------------------------------
+def normalize(data, ws_dir):
+    '''replace workspace dir in data, paths are the same in all workspaces'''
+    return data.replace(ws_dir.encode('utf-8'), WORKSPACE_DIR)
+
+#------------------------------------------------------------------------------
+def restore(data, ws_dir):
+    return data.replace(WORKSPACE_DIR, ws_dir.encode('utf-8'))
+
+#------------------------------------------------------------------------------
+def get_entry_dir(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], key[2:])
+
+#------------------------------------------------------------------------------
+def lookup(cache_dir, key):
+    '''returns cached entry dir, None if missing'''
+    entry_dir = get_entry_dir(cache_dir, key)
+    if not os.path.isfile(os.path.join(entry_dir, 'obj')):
+        return None
+    # least recently used entries are evicted first
+    try:
+        os.utime(entry_dir, None)
+    except OSError:
+        pass
+    return entry_dir
+
+#------------------------------------------------------------------------------
+def store(cache_dir, key, files):
+    '''store entry files (name: data) in cache'''
+    entry_dir = get_entry_dir(cache_dir, key)
+    if os.path.isdir(entry_dir):
+        return
+    parent_dir = os.path.dirname(entry_dir)
+    if not os.path.isdir(parent_dir):
+        try:
+            os.makedirs(parent_dir)
+        except OSError:
+            pass # created by another launcher
+    # write in temp dir then rename, an entry is complete or missing
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix='.tmp-')
+    for name, data in files.items():
+        with open(os.path.join(tmp_dir, name), 'wb') as f:
+            f.write(data)
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+#------------------------------------------------------------------------------
+def load(entry_dir):
+    '''returns entry files (name: data)'''
+    return dict((name, read_file(os.path.join(entry_dir, name))) for name in os.listdir(entry_dir))
+
+#------------------------------------------------------------------------------
+def pack(files):
+    '''returns entry files packed in a blob, for remote cache'''
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name, data in sorted(files.items()):
+            z.writestr(name, data)
+    return buf.getvalue()
+
+#------------------------------------------------------------------------------
+def unpack(blob):
+    with zipfile.ZipFile(io.BytesIO(blob), 'r') as z:
+        return dict((name, z.read(name)) for name in z.namelist())
+
+#------------------------------------------------------------------------------
+def record(result):
+    '''append launcher result to stats file of running flux build'''
+    stats_file = os.environ.get('FLUX_CACHE_STATS')
+    if stats_file:
+        try:
+            with open(stats_file, 'a') as f:
+                f.write(result + '\n')
+        except (IOError, OSError):
+            pass
+
+#------------------------------------------------------------------------------
+def write_output(out, err):
+    getattr(sys.stdout, 'buffer', sys.stdout).write(out)
+    getattr(sys.stderr, 'buffer', sys.stderr).write(err)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+#------------------------------------------------------------------------------
+def run(toolchain, cmd):
+    '''run compile command through cache, returns exit code'''
+    parsed = parse_args(toolchain, cmd[1:]) if is_enabled() else None
+    if not parsed:
+        record('skip')
+        return subprocess.call(cmd)
+    obj, dep, pp_args, key_args = parsed
+
+    ws_dir = get_workspace_dir()
+    cache_dir = get_cache_dir()
+    compiler_id = get_compiler_id(cache_dir, toolchain, cmd[0])
+
+    # preprocessed source
+    p = subprocess.Popen([cmd[0]] + pp_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    pp_out, _ = p.communicate()
+    if p.returncode != 0 or not compiler_id:
+        # compiler reports errors
+        record('skip')
+        return subprocess.call(cmd)
+
+    h = hashlib.sha1(KEY_VERSION.encode('utf-8'))
+    h.update(compiler_id.encode('utf-8'))
+    h.update(normalize('\0'.join([toolchain] + key_args).encode('utf-8'), ws_dir))
+    h.update(b'\0')
+    h.update(normalize(pp_out, ws_dir))
+    key = h.hexdigest()
+
+    # local hit, else remote hit stored in local cache
+    files = None
+    entry_dir = lookup(cache_dir, key)
+    if entry_dir:
+        try:
+            files = load(entry_dir)
+            result = 'hit'
+        except (IOError, OSError):
+            pass # evicted meanwhile
+    if files is None:
+        blob = remote.fetch(cache_dir, key)
+        if blob:
+            try:
+                files = unpack(blob)
+                store(cache_dir, key, files)
+                result = 'remote-hit'
+            except (zipfile.BadZipfile, IOError, OSError):
+                files = None
+
+    # hit: restore object, depfile and compiler output
+    if files is not None and 'obj' in files:
+        with open(obj, 'wb') as f:
+            f.write(files['obj'])
+        if dep:
+            with open(dep, 'wb') as f:
+                f.write(restore(files.get('dep', b''), ws_dir).replace(OBJECT_FILE, obj.encode('utf-8')))
+        write_output(restore(files.get('stdout', b''), ws_dir), restore(files.get('stderr', b''), ws_dir))
+        record(result)
+        return 0
+
+    # miss: compile and store
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    write_output(out, err)
+    record('miss')
+    if p.returncode != 0:
+        return p.returncode
+
+    try:
+        files = {
+            'obj': read_file(obj),
+            'stdout': normalize(out, ws_dir),
+            'stderr': normalize(err, ws_dir),
+        }
+        if dep:
+            files['dep'] = normalize(read_file(dep).replace(obj.encode('utf-8'), OBJECT_FILE), ws_dir)
+        store(cache_dir, key, files)
+        # warm remote cache for other machines
+        remote.push(cache_dir, key, pack(files))
+    except (IOError, OSError):
+        pass # cache is optional
+    return 0
+
+#------------------------------------------------------------------------------
+def begin_stats():
+    '''start collecting launchers stats of a build, returns stats file'''
+    cache_dir = get_cache_dir()
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    stats_file = os.path.join(cache_dir, 'stats-%d.log' % os.getpid())
+    if os.path.isfile(stats_file):
+        os.remove(stats_file)
+    os.environ['FLUX_CACHE_STATS'] = stats_file
+    return stats_file
+
+#------------------------------------------------------------------------------
+def end_stats(stats_file):
+    '''returns launchers stats of a build: {'hit': n, 'remote-hit': n, 'miss': n, 'skip': n}'''
+    os.environ.pop('FLUX_CACHE_STATS', None)
+    stats = {'hit': 0, 'remote-hit': 0, 'miss': 0, 'skip': 0}
+    if os.path.isfile(stats_file):
+        with open(stats_file, 'r') as f:
+            for line in f:
+                line = line.strip()
+                stats[line] = stats.get(line, 0) + 1
+        os.remove(stats_file)
+    return stats
+
+#------------------------------------------------------------------------------
+def trim(max_size=None):
+    '''evict least recently used entries until cache size fits in `max_size`, returns evicted entries count'''
+    cache_dir = get_cache_dir()
+    max_size = max_size or get_max_size()
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    total = 0
+    for prefix in os.listdir(cache_dir):
+        prefix_dir = os.path.join(cache_dir, prefix)
+        if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            entry_dir = os.path.join(prefix_dir, name)
+            try:
+                size = sum(os.path.getsize(os.path.join(entry_dir, x)) for x in os.listdir(entry_dir))
+                entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+            except OSError:
+                continue
+            total += size
+
+    if total <= max_size:
+        return 0
+
+    # evict down to 90% of max size, don't trim on each build
+    count = 0
+    for _, size, entry_dir in sorted(entries):
+        if total <= max_size * 0.9:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        count += 1
+    return count
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        sys.stderr.write('usage: cache.py <toolchain> <compiler> [args]\n')
+        sys.exit(1)
+    sys.exit(run(sys.argv[1], sys.argv[2:]))
@@ -1,31 +1,15 @@
 '''flux main module'''
 
-import os, sys, shutil, subprocess
-
-from packages.colorama import init
-from packages import yaml
-from mods import log, util, verb, target, project
-
-from mods.build import BuildOpts
-from mods.target import Target
-from mods.project import Project
-
-## TEMP
-try:
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO
-##/ TEMP
+import os, sys, time
 
+# build modules are imported by `build`, other verbs start without them
+from mods import log, util, verb
 
 # set consts
 VERSION = '0.0.2'
 
 ninja_required_version = '1.10.2'
 
-# init colorama
-init()
-
 #------------------------------------------------------------------------------
 
 # workspace directory structure
@@ -46,7 +30,12 @@ def run(flux_dir, proj_dir, args):
     if ' ' in proj_dir:
         log.warn('whitespace in project path detected, `flux` will not work correctly')
 
-    # import verbs from flux dir
+    # ansi colors in windows console
+    if sys.platform == 'win32':
+        from packages.colorama import init
+        init()
+
+    # register verbs from flux dir, imported when used
     verb.import_verbs(flux_dir)
 
     # parse args
@@ -64,167 +53,232 @@ def run(flux_dir, proj_dir, args):
         elif name == 'dev':
             pass
         elif name == 'build':
-            #log.text('===== test console output begin =====')
-            #log.trace('trace message')
-            #log.debug('debug message')
-            #log.info('info message')
-            #log.warn('warn message')
-            #log.error('error message')
-            #log.text('===== test console output end =====')
-
-            # set build opts
-            opts = BuildOpts()
-            args = opts.parse_opts(proj_dir, args)
-
-            # get target datas
-            #TODO: add user custom targets 
-
-            # set target opts
-            target = Target(flux_dir, opts)
-            if target.toolchain == 'msvc':
-                # check msvc install
-                if target.find_msvc():
-                    # update env vars
-                    os.environ['PATH'] = os.environ['FLUX_MSVC_PATH']+';'+os.environ['PATH']
-                    os.environ['INCLUDE'] = os.environ['FLUX_MSVC_INCLUDE']
-                    os.environ['LIB'] = os.environ['FLUX_MSVC_LIB']
-                else:
-                    log.fatal('MSVC installation not found!')
-            elif target.target == 'emscripten':
-                from mods.sdks import emsdk
-                if emsdk.sdk_dir_exists(flux_dir):
-                    os.environ['PATH'] += os.pathsep + emsdk.get_emscripten_dir(flux_dir)
-
-            if opts.verbose >= 3:
-                log.info('python %s.%s.%s' % (sys.version_info[:3]))
-                log.info('os.environ:')
-                for ev in sorted(filter(lambda x: x.startswith('FLUX_'), os.environ)):
-                    log.info('- %s: %s' % (ev, log.YELLOW+os.environ[ev]+log.DEFAULT))
-
-            # if not arg, set project in current dir
-            if not len(args):
-                args += [proj_dir]
-
-            # for each projets
-            for arg in args:
-                print(log.YELLOW+("===== `%s`" % arg)+log.DEFAULT)
-                arg = util.fix_path(arg)
-                path = os.path.join(proj_dir, arg)
-
-                #print(path)
-
-                proj = Project(flux_dir, path, opts)
-
-                # change to project dir
-                os.chdir(os.path.abspath(path))
-
-                # clean output dir
-                if opts.clean:
-                    if opts.verbose >= 1:
-                        log.info("cleaning `%s`" % proj.out_dir)
-                    proj.clean()
-
-                # create project intermediate dirs
-                proj.make_dirs()
-
-                # make Info.plist file
-                if proj.target == 'macos' and proj.apptype == 'window':
-                    proj.make_info_plist()
-
-                # parse project file
-                proj.parse_inputs()
-
-                #print(proj)
-                
-                # depends
-                if proj.build in ['app']: # app only?
-                    if len(proj.flux_libs):
-                        sys_libs = []
-                        for lib in proj.flux_libs:
-                            # load dep project file
-                            dep_dir = os.path.join(util.get_workspace_dir(flux_dir), lib)
-                            dep = Project(flux_dir, dep_dir, opts, True)
-
-                            # module or library dep only
-                            if dep.build in ['mod', 'lib']:
-                                # change dir to dep dir
-                                cd = os.getcwd()
-                                os.chdir(os.path.abspath(dep_dir))
-
-                                # parse dep project file
-                                dep.parse_inputs()
-
-                                # files stamp
-                                out_file_stamp = None
-                                gen_file_stamp = None
-
-                                # check if module archive exists
-                                if not os.path.exists(dep.out_file):
-                                    if not os.path.exists(dep.gen_file):
-                                        #create dep intermediate dirs
-                                        dep.make_dirs()
-
-                                        # generate ninja file for dep
-                                        if opts.verbose >= 1:
-                                            log.info('generate `%s`' % dep.gen_file)
-                                        with open(dep.gen_file, 'w') as out:
-                                            dep.gen_ninja(out, opts, target)
-                                else:
-                                    #TODO: regenerate ninja if 'dep.flux_file' is most recent than 'dep.out_file'
-                                    pass
-
-                                # add 'dep.gen_file' to project
-                                proj.ninja_files.append(dep.gen_file)
-
-                                # build dep module
-                                if os.path.exists(dep.gen_file):
-                                    if opts.verbose >= 1:
-                                        log.info('building `%s` %s' % (dep.base_dir, log.BLUE+'(dependency)'+log.DEFAULT))
-                                    dep.build_ninja(verbose=opts.verbose>=3)
-
-                                # add dep include dirs (abspath)
-                                for inc in dep.include_dirs:
-                                    proj.cc_opts.append('-I"%s"' % inc)
-                                    proj.cxx_opts.append('-I"%s"' % inc)
-
-                                # add dep module archive
-                                proj.lib_files.append('"%s"' % dep.out_file)
-
-                                # append system libs
-                                for lib in dep.lib_files:
-                                    if lib not in sys_libs:
-                                        sys_libs.append(lib)
-
-                                # return to main project
-                                os.chdir(cd)
-
-                        # add dep system libs at end
-                        for lib in sys_libs:
-                            if lib not in proj.lib_files:
-                                proj.lib_files.append(lib)
-                        
-                # set rules vars
-                #rule_vars = target.get_rule_vars(proj)
-
-                # generate ninja in proj.out_dir
-                if opts.verbose >= 1:
-                    log.info('generate `%s`' % proj.gen_file)
+            build(flux_dir, proj_dir, args)
+        else:
+            log.error('unknown verb `%s`' % name)
+
+#------------------------------------------------------------------------------
+def build(flux_dir, proj_dir, args):
+    from mods.build import BuildOpts
+    from mods.target import Target
+    from mods.scheduler import Scheduler
+    from mods.graph import DepGraph
+    from mods import timing
+
+    curr_dir = proj_dir
+
+    #log.text('===== test console output begin =====')
+    #log.trace('trace message')
+    #log.debug('debug message')
+    #log.info('info message')
+    #log.warn('warn message')
+    #log.error('error message')
+    #log.text('===== test console output end =====')
+
+    # set build opts
+    opts = BuildOpts()
+    args = opts.parse_opts(proj_dir, args)
+
+    # get target datas
+    #TODO: add user custom targets 
+
+    # set target opts
+    with timing.measure(timing.WORKSPACE, 'target'):
+        target = Target(flux_dir, opts)
+    if target.toolchain == 'msvc':
+        # check msvc install
+        if target.find_msvc():
+            # update env vars
+            os.environ['PATH'] = os.environ['FLUX_MSVC_PATH']+';'+os.environ['PATH']
+            os.environ['INCLUDE'] = os.environ['FLUX_MSVC_INCLUDE']
+            os.environ['LIB'] = os.environ['FLUX_MSVC_LIB']
+        else:
+            log.fatal('MSVC installation not found!')
+    elif target.target == 'emscripten':
+        from mods.sdks import emsdk
+        if emsdk.sdk_dir_exists(flux_dir):
+            os.environ['PATH'] += os.pathsep + emsdk.get_emscripten_dir(flux_dir)
+
+    if opts.verbose >= 3:
+        log.info('python %s.%s.%s' % (sys.version_info[:3]))
+        log.info('os.environ:')
+        for ev in sorted(filter(lambda x: x.startswith('FLUX_'), os.environ)):
+            log.info('- %s: %s' % (ev, log.YELLOW+os.environ[ev]+log.DEFAULT))
+
+    # if not arg, set project in current dir
+    if not len(args):
+        args += [proj_dir]
+
+    # dependency graph, shared between projects
+    graph = DepGraph(flux_dir, opts)
+    regen_cmd = graph.get_regen_command(proj_dir, args)
+
+    # generate tasks run concurrently, then all projects build from a single ninja graph
+    jobs = opts.jobs
+    sched = Scheduler(jobs)
+    projs = [] # (path, proj, deps)
+
+    # no-op fast path: workspace ninja file regenerates itself when projects inputs change
+    if not opts.clean and not opts.generate and graph.is_generated(regen_cmd):
+        if opts.verbose >= 1:
+            log.info('building `%s`' % graph.gen_file)
+        ok = build_graph(graph, target, opts)
+        if opts.time:
+            timing.report(opts.time_file)
+        os.chdir(curr_dir)
+        if not ok:
+            sys.exit(10)
+        return
+
+    # for each projets
+    for arg in args:
+        path, proj = load_project(flux_dir, proj_dir, arg, opts)
+
+        # depends: load transitive dependencies, each module once
+        deps = graph.add(proj)
+        graph.link(proj, deps)
+        projs.append((path, proj, deps))
+
+        # add 'dep.gen_file' to project
+        proj.ninja_files += [dep.gen_file for dep in deps]
+
+    # prebuilt dependency modules are fetched from store instead of being built
+    with timing.measure(timing.WORKSPACE, 'prebuilt fetch'):
+        graph.fetch_prebuilt(verbose=opts.verbose>=1)
+
+    # generate ninja file for each project, in parallel
+    for proj in graph.get_projects():
+        if proj.prebuilt:
+            continue
+        def gen_task(proj=proj):
+            # create project intermediate dirs
+            proj.make_dirs()
+            if opts.verbose >= 1:
+                log.info('generate `%s`' % proj.gen_file)
+            with timing.measure(proj.name, 'generate'):
                 with open(proj.gen_file, 'w') as out:#StringIO()
                     proj.gen_ninja(out, opts, target)
+        sched.add(proj.gen_file, gen_task)
+
+    # generate workspace ninja file, includes all projects ninja files
+    def gen_graph_task():
+        graph.make_dirs()
+        if opts.verbose >= 1:
+            log.info('generate `%s`' % graph.gen_file)
+        with timing.measure(timing.WORKSPACE, 'generate'):
+            with open(graph.gen_file, 'w') as out:
+                graph.gen_ninja(out, target, regen_cmd)
+    sched.add(graph.gen_file, gen_graph_task)
+
+    # build all projects and dependencies from a single ninja graph
+    if not opts.generate:
+        def build_graph_task():
+            if opts.verbose >= 1:
+                log.info('building %s' % ', '.join('`%s`' % x.base_dir for _, x, _ in projs))
+            return build_graph(graph, target, opts)
+        sched.add(graph.build_dir, build_graph_task, deps=list(sched.tasks), weight=jobs)
+
+    ok = sched.run()
+
+    # publish built modules for later builds
+    if sched.succeeded(graph.build_dir):
+        with timing.measure(timing.WORKSPACE, 'publish'):
+            graph.publish(verbose=opts.verbose>=1)
+
+    if opts.time:
+        timing.report(opts.time_file)
+
+    # return to start dir
+    os.chdir(curr_dir)
+
+    # failed generation or build, e.g. for ninja regeneration to stop
+    if not ok:
+        sys.exit(10)
 
-                # build project from ninja
-                if os.path.exists(proj.gen_file):
-                    if opts.verbose >= 1:
-                        log.info('building `%s`' % proj.base_dir)
-                    proj.build_ninja(verbose=opts.verbose>=3)
-                    # copy assets files
-                    proj.copy_assets(proj.asset_dir)
-                    proj.copy_binaries(proj.out_dir)
-
-            # return to start dir
-            os.chdir(curr_dir)
-        else:
-            log.error('unknown verb `%s`' % name)
+#------------------------------------------------------------------------------
+def build_graph(graph, target, opts):
+    '''build all projects from workspace ninja file, report avoided recompiles and compile cache stats, returns True on success'''
+    from mods import cache, hashdb, stats, timing, transform
+
+    # files touched by a checkout keep their mtime if their content is unchanged
+    if hashdb.is_enabled():
+        with timing.measure(timing.WORKSPACE, 'content check'):
+            restored, avoided = hashdb.restore_mtimes(graph.build_dir, graph.get_ninja_dir())
+        if avoided or (restored and opts.verbose >= 1):
+            log.info('content check: %d unchanged files restored, %d recompiles avoided' % (restored, avoided))
+    stats_file = cache.begin_stats() if target.launcher == 'flux' else None
+    log_pos = timing.get_log_pos(graph.build_dir)
+    start = time.time()
+    with timing.measure(timing.WORKSPACE, 'ninja'):
+        result = graph.build_ninja(verbose=opts.verbose>=3, args=opts.get_ninja_args())
+    # run boundaries in ninja log, for `stats` verb
+    stats.add_run(graph.build_dir, log_pos)
+    if opts.time:
+        # ninja jobs by project and kind: compiles, links, assets...
+        entries = timing.read_ninja_log(graph.build_dir, log_pos)
+        if entries is not None:
+            out_dirs = dict((x.out_dir, x.name) for x in graph.get_projects())
+            timing.add_ninja_jobs(entries, graph.get_ninja_dir(), out_dirs)
+    if stats_file:
+        cache_stats = cache.end_stats(stats_file)
+        hits = cache_stats['hit'] + cache_stats['remote-hit']
+        total = hits + cache_stats['miss']
+        if total:
+            log.info('compile cache: %d hits (%d remote), %d misses (%d%% hit rate)' % (hits, cache_stats['remote-hit'], cache_stats['miss'], hits * 100 // total))
+        # new objects stored, keep cache size in check
+        if cache_stats['miss']:
+            count = cache.trim()
+            if count and opts.verbose >= 1:
+                log.info('compile cache: %d entries evicted' % count)
+    # new transform results stored, same for transforms cache
+    if transform.is_stored_since(start):
+        count = transform.trim()
+        if count and opts.verbose >= 1:
+            log.info('transform cache: %d results evicted' % count)
+    return result
+
+#------------------------------------------------------------------------------
+def load_project(flux_dir, proj_dir, arg, opts):
+    '''load and parse project, returns project path and project'''
+    from mods.project import Project
+    from mods import timing
+
+    print(log.YELLOW+("===== `%s`" % arg)+log.DEFAULT)
+    arg = util.fix_path(arg)
+    path = os.path.join(proj_dir, arg)
+
+    #print(path)
+
+    start = time.time()
+    proj = Project(flux_dir, path, opts)
+    timing.add(proj.name, 'load', time.time() - start)
+
+    # change to project dir
+    cd = os.getcwd()
+    os.chdir(os.path.abspath(path))
+
+    # clean output dir
+    if opts.clean:
+        if opts.verbose >= 1:
+            log.info("cleaning `%s`" % proj.out_dir)
+        proj.clean()
+
+    # create project intermediate dirs
+    proj.make_dirs()
+
+    # make Info.plist file
+    if proj.target == 'macos' and proj.apptype == 'window':
+        proj.make_info_plist()
+
+    # parse project file
+    with timing.measure(proj.name, 'parse inputs'):
+        proj.parse_inputs()
+
+    #print(proj)
+
+    # return to start dir
+    os.chdir(cd)
+    return path, proj
 
 #------------------------------------------------------------------------------
 def usage():
@@ -232,5 +286,5 @@ def usage():
     log.optional('\nusage', 'flux [verb] [opts] [projects]')
     log.text('\nverbs:')
     for verb_name in sorted(verb.verbs):
-        log.item('  '+verb_name, verb.verbs[verb_name].help())
+        log.item('  '+verb_name, verb.verbs.get_help(verb_name))
     log.info('run `flux help` for more informations ') #TODO: Add all usage
\ No newline at end of file
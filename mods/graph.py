@@ -0,0 +1,395 @@
+"""flux modules dependency graph"""
+
+import os, sys, time, subprocess, hashlib
+
+from mods import log, util, ninja, project, store, timing
+from mods.project import Project
+
+#------------------------------------------------------------------------------
+
+GEN_VERSION = '1' # bump when generated ninja files change, older ones are regenerated
+
+RESERVED_NAMES = ['all', 'assets', 'prebuilt_always'] # workspace ninja file aliases
+
+#------------------------------------------------------------------------------
+
+class DepGraph:
+    '''Transitive dependency graph of flux modules, each module is loaded and parsed once per invocation'''
+
+    #------------------------------------------------------------------------------
+    def __init__(self, flux_dir, build_opts):
+        self.flux_dir = flux_dir
+        self.build_opts = build_opts
+
+        self.roots = []    # projects to build
+        self.projects = {} # dep dir: Project
+        self.deps = {}     # dep dir: [dep dirs]
+
+        # workspace ninja file, includes every project ninja file
+        self.build_dir = util.fix_path(os.path.join(util.get_workspace_dir(flux_dir), project.FDIR, build_opts.profile))
+        self.gen_file = util.fix_path(os.path.join(self.build_dir, project.NINJA_FILE))
+
+    #------------------------------------------------------------------------------
+    def get_dir(self, lib):
+        '''returns dependency module dir from `<lib.flux>` input name'''
+        return util.fix_path(os.path.abspath(os.path.join(util.get_workspace_dir(self.flux_dir), lib)))
+
+    #------------------------------------------------------------------------------
+    def add(self, proj):
+        '''load project dependencies, returns them in link order'''
+        self.roots.append(proj)
+        proj_dir = util.fix_path(os.path.abspath(proj.proj_dir))
+        for lib in proj.flux_libs:
+            self.load(lib, [proj_dir])
+        self.check_names()
+        return self.resolve(proj)
+
+    #------------------------------------------------------------------------------
+    def check_names(self):
+        '''projects share one ninja graph: their names are ninja aliases and must be unique'''
+        names = {}
+        for proj in self.get_projects():
+            proj_dir = util.fix_path(os.path.abspath(proj.proj_dir))
+            if proj.name in RESERVED_NAMES:
+                log.fatal('project name `%s` of `%s` is reserved (%s), set another `name` in its project file' % (
+                    proj.name, proj_dir, ', '.join(RESERVED_NAMES)))
+            if names.get(proj.name, proj_dir) != proj_dir:
+                log.fatal('projects `%s` and `%s` have the same name `%s`, set another `name` in one of their project files' % (
+                    names[proj.name], proj_dir, proj.name))
+            names[proj.name] = proj_dir
+
+    #------------------------------------------------------------------------------
+    def load(self, lib, stack):
+        '''load and parse dependency module and its own dependencies'''
+        dep_dir = self.get_dir(lib)
+
+        # check cycles
+        if dep_dir in stack:
+            cycle = stack[stack.index(dep_dir):] + [dep_dir]
+            log.fatal('dependency cycle detected: %s' % ' -> '.join('`%s`' % x for x in cycle))
+
+        # already loaded
+        if dep_dir in self.projects:
+            return self.projects[dep_dir]
+
+        # load dep project file
+        start = time.time()
+        dep = Project(self.flux_dir, dep_dir, self.build_opts, True)
+        timing.add(dep.name, 'load', time.time() - start)
+
+        # parse dep project file from dep dir
+        cd = os.getcwd()
+        os.chdir(dep_dir)
+        with timing.measure(dep.name, 'parse inputs'):
+            dep.parse_inputs()
+        os.chdir(cd)
+
+        # load dep dependencies, module or library dep only
+        deps = []
+        for name in dep.flux_libs:
+            sub = self.load(name, stack + [dep_dir])
+            if sub.build in ['mod', 'lib']:
+                deps.append(self.get_dir(name))
+
+        self.projects[dep_dir] = dep
+        self.deps[dep_dir] = deps
+
+        # add dependencies include dirs
+        for sub in self.resolve(dep):
+            self.add_include_dirs(dep, sub)
+
+        return dep
+
+    #------------------------------------------------------------------------------
+    def resolve(self, proj):
+        '''returns loaded transitive dependencies of project, dependents first (link order)'''
+        order = []
+        visited = {}
+
+        def visit(dep_dir):
+            if dep_dir in visited:
+                return
+            visited[dep_dir] = True
+            for sub in self.deps[dep_dir]:
+                visit(sub)
+            order.append(dep_dir)
+
+        for lib in proj.flux_libs:
+            dep_dir = self.get_dir(lib)
+            if self.projects[dep_dir].build in ['mod', 'lib']:
+                visit(dep_dir)
+
+        # reversed post-order: each module comes before the modules it depends on
+        return [self.projects[x] for x in reversed(order)]
+
+    #------------------------------------------------------------------------------
+    def link(self, proj, deps):
+        '''add dependencies include dirs, module archives and system libs to project'''
+        sys_libs = []
+        for dep in deps:
+            self.add_include_dirs(proj, dep)
+
+            if proj.build in ['app']:
+                # add dep module archive
+                proj.lib_files.append('"%s"' % dep.out_file)
+                proj.mod_files.append(dep.out_file)
+
+                # append system libs
+                for lib in dep.lib_files:
+                    if lib not in sys_libs:
+                        sys_libs.append(lib)
+
+        # add dep system libs at end
+        for lib in sys_libs:
+            if lib not in proj.lib_files:
+                proj.lib_files.append(lib)
+
+    #------------------------------------------------------------------------------
+    def add_include_dirs(self, proj, dep):
+        '''add dep include dirs (abspath)'''
+        for inc in dep.include_dirs:
+            opt = '-I"%s"' % inc
+            if opt not in proj.cxx_opts:
+                proj.cc_opts.append(opt)
+                proj.cxx_opts.append(opt)
+
+    #------------------------------------------------------------------------------
+    def get_projects(self):
+        '''returns dependencies then root projects, each project once'''
+        projs = []
+        for proj in self.roots:
+            for dep in self.resolve(proj):
+                if dep not in projs:
+                    projs.append(dep)
+        for proj in self.roots:
+            # a root module may also be a dependency
+            if proj.gen_file not in [x.gen_file for x in projs]:
+                projs.append(proj)
+        return projs
+
+    #------------------------------------------------------------------------------
+    def make_dirs(self):
+        if not os.path.exists(self.build_dir):
+            os.makedirs(self.build_dir)
+
+    #------------------------------------------------------------------------------
+    def get_regen_command(self, proj_dir, args):
+        '''returns flux command line regenerating ninja files of projects'''
+        paths = [util.fix_path(os.path.abspath(os.path.join(proj_dir, x))) for x in args]
+        cmd = [sys.executable, os.path.join(self.flux_dir, 'flux'), 'build', '-generate'] + self.build_opts.opts_args + paths
+        return ' '.join(util.enquote(util.fix_path(x)) if ' ' in x else util.fix_path(x) for x in cmd)
+
+    #------------------------------------------------------------------------------
+    def get_regen_key(self, regen_cmd):
+        return hashlib.sha1((project.VERSION + GEN_VERSION + regen_cmd).encode('utf-8')).hexdigest()
+
+    #------------------------------------------------------------------------------
+    def get_target_file(self):
+        return util.fix_path(os.path.join(util.get_targets_dir(self.flux_dir), self.build_opts.target + '.yml'))
+
+    #------------------------------------------------------------------------------
+    def fetch_prebuilt(self, verbose=False):
+        '''fetch dependency modules archives from store, prebuilt modules are not built'''
+        backend = store.get_backend(self.flux_dir)
+        if not backend:
+            return
+        target_file = self.get_target_file()
+        keys = {} # dep dir: key
+
+        def get_key(dep_dir):
+            if dep_dir not in keys:
+                dep_keys = [get_key(x) for x in self.deps[dep_dir]]
+                keys[dep_dir] = store.get_key(self.projects[dep_dir], target_file, self.build_opts, dep_keys)
+            return keys[dep_dir]
+
+        # root modules are built, and published
+        roots = [x.gen_file for x in self.roots]
+        for proj in self.roots:
+            if proj.build == 'mod':
+                dep_keys = [get_key(self.get_dir(x.proj_dir)) for x in self.resolve(proj)]
+                proj.artifact_key = store.get_key(proj, target_file, self.build_opts, dep_keys)
+
+        for dep_dir, dep in self.projects.items():
+            if dep.build != 'mod' or dep.gen_file in roots:
+                continue
+            dep.artifact_key = get_key(dep_dir)
+            if dep.artifact_key and store.fetch(backend, dep, dep.artifact_key):
+                dep.prebuilt = True
+                store.update_tree_stamp(dep_dir, store.get_tree_stamp(dep))
+                if verbose:
+                    log.info('prebuilt `%s`' % dep.out_file)
+            else:
+                # built from sources, archive doesn't match any key
+                store.set_stamp(dep, None)
+
+    #------------------------------------------------------------------------------
+    def publish(self, verbose=False):
+        '''publish built modules archives to store'''
+        backend = store.get_backend(self.flux_dir)
+        if not backend:
+            return
+        published = False
+        for proj in self.get_projects():
+            if proj.build == 'mod' and proj.artifact_key and not proj.prebuilt and os.path.isfile(proj.out_file):
+                if store.get_stamp(proj) == proj.artifact_key:
+                    continue # already published
+                if verbose:
+                    log.info('publish `%s`' % proj.out_file)
+                store.publish(backend, proj, proj.artifact_key)
+                published = True
+        # keep store size in check
+        if published:
+            count = backend.trim(store.get_max_size())
+            if count and verbose:
+                log.info('module store: %d artifacts evicted' % count)
+
+    #------------------------------------------------------------------------------
+    def get_regen_inputs(self):
+        '''returns files and dirs used to generate ninja files'''
+        inputs = [self.get_target_file()]
+        for proj in self.get_projects():
+            for path in [proj.flux_file] + proj.input_dirs:
+                path = util.fix_path(os.path.abspath(path))
+                if path not in inputs:
+                    inputs.append(path)
+        return inputs
+
+    #------------------------------------------------------------------------------
+    def is_generated(self, regen_cmd):
+        '''checks if workspace ninja file was generated by the same command, ninja regenerates it when its inputs change'''
+        if not os.path.isfile(self.gen_file):
+            return False
+        key = '# invocation: ' + self.get_regen_key(regen_cmd)
+        found = False
+        with open(self.gen_file, 'r') as f:
+            for line in f:
+                if line.startswith(key):
+                    found = True
+                # projects ninja files must exist to load workspace ninja file
+                elif line.startswith('subninja '):
+                    path = line[len('subninja '):].strip().replace('$:', ':').replace('$ ', ' ')
+                    if not os.path.isfile(os.path.join(self.get_ninja_dir(), path)):
+                        return False
+        return found
+
+    #------------------------------------------------------------------------------
+    def gen_ninja(self, file, target, regen_cmd):
+        '''generate workspace ninja file, one ninja graph for all projects'''
+        relocate = util.get_workspace_dir(self.flux_dir) if self.build_opts.relocatable else None
+        n = ninja.Writer(file, 150, buffered=True, relocate=relocate)
+
+        n.comment('flux build system '+project.VERSION)
+        n.comment('repo: https://github.com/seyhajin/flux')
+        n.comment('this file is generated automatically, do not edit!')
+        n.comment('invocation: ' + self.get_regen_key(regen_cmd))
+        n.newline()
+        n.variable('ninja_required_version', project.ninja_required_version)
+        n.newline()
+        n.comment('ninja settings')
+        n.variable('builddir', self.build_dir)
+
+        # pools are global, declared once before projects rules use them
+        if target.pools:
+            n.newline()
+            n.comment('----------------------------')
+            n.comment('POOLS')
+            n.comment('----------------------------')
+            n.newline()
+            for rule, depth in sorted(target.pools.items()):
+                n.pool(target.get_pool(rule), depth)
+
+        # `subninja` introduces a new scope for each project rules and variables
+        n.newline()
+        n.comment('----------------------------')
+        n.comment('PROJECTS')
+        n.comment('----------------------------')
+        n.newline()
+        for proj in self.get_projects():
+            if not proj.prebuilt:
+                n.subninja(ninja.escape_path(proj.gen_file))
+
+        # regenerate ninja files only when project files, target file or globbed dirs change
+        n.newline()
+        n.comment('----------------------------')
+        n.comment('REGENERATE')
+        n.comment('----------------------------')
+        n.newline()
+        n.rule('regen',
+            ninja.escape(regen_cmd),
+            description='Regenerating ninja files',
+            generator=True
+        )
+        n.newline()
+
+        # prebuilt module sources aren't built, their git tree state is checked on each build
+        # and any change regenerates ninja files
+        stamps = []
+        prebuilts = [x for x in self.get_projects() if x.prebuilt]
+        if prebuilts:
+            python = util.enquote(util.fix_path(sys.executable)) if ' ' in sys.executable else util.fix_path(sys.executable)
+            n.rule('prebuilt_check',
+                '%s %s $dir $out' % (python, util.fix_path(os.path.join(self.flux_dir, 'mods', 'store.py'))),
+                description='Checking prebuilt $dir',
+                restat=True
+            )
+            n.newline()
+            n.build('prebuilt_always', 'phony')
+            for proj in prebuilts:
+                stamp = store.get_tree_stamp(proj)
+                n.build(stamp, 'prebuilt_check', implicit='prebuilt_always',
+                    variables={'dir': util.fix_path(os.path.abspath(proj.proj_dir))})
+                stamps.append(stamp)
+            n.newline()
+
+        inputs = self.get_regen_inputs()
+        n.build(
+            self.gen_file,
+            'regen',
+            implicit=inputs + stamps,
+            implicit_outputs=[x.gen_file for x in self.get_projects() if not x.prebuilt],
+        )
+        # deleted inputs trigger regeneration instead of a ninja error
+        n.newline()
+        for path in inputs:
+            n.build(path, 'phony')
+
+        n.newline()
+        n.comment('----------------------------')
+        n.comment('DEFAULT')
+        n.comment('----------------------------')
+        n.newline()
+        out_files = []
+        assets = []
+        for proj in self.roots:
+            if proj.out_file not in out_files:
+                out_files.append(proj.out_file)
+            if proj.name + '_assets' not in assets:
+                assets.append(proj.name + '_assets')
+        # projects assets and binaries copies
+        n.build(
+            'assets',
+            'phony %s' % ' '.join(assets),
+        )
+        n.build(
+            'all',
+            'phony %s assets' % ' '.join(ninja.escape_path(x) for x in out_files),
+        )
+        n.newline()
+        n.default('all')
+
+        n.newline()
+        n.close()
+
+    #------------------------------------------------------------------------------
+    def get_ninja_dir(self):
+        '''returns ninja working dir, paths in relocatable ninja files are relative to workspace dir'''
+        if self.build_opts.relocatable:
+            return util.fix_path(util.get_workspace_dir(self.flux_dir))
+        return self.build_dir
+
+    #------------------------------------------------------------------------------
+    def build_ninja(self, verbose=False, args=None):
+        '''build all projects from workspace ninja file, `args` are job control arguments, returns True on success'''
+        ninja_dir = self.get_ninja_dir()
+        cmd = ['ninja', '-C', ninja_dir, '-f', self.gen_file] + (['-v'] if verbose else []) + (args or [])
+        return subprocess.call(cmd, cwd=ninja_dir, shell=util.get_host_platform() == 'windows') == 0
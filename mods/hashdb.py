@@ -0,0 +1,163 @@
+"""files content hash database
+
+ninja rebuilds by mtime, a checkout back and forth touches files without
+changing their contents. files of ninja deps log whose mtime changed but
+content didn't get their recorded mtime back before ninja runs."""
+
+import os, sys, struct, marshal, hashlib
+
+from mods import util
+
+#------------------------------------------------------------------------------
+
+DB_FILE = 'hashes.db'           # in workspace build dir
+DEPS_FILE = '.ninja_deps'
+DB_VERSION = 1
+
+#------------------------------------------------------------------------------
+def read_ninja_deps(file):
+    '''returns {output: [inputs]} from ninja deps log, empty if missing or unsupported'''
+    deps = {}
+    try:
+        with open(file, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return deps
+
+    header = b'# ninjadeps\n'
+    if not data.startswith(header) or len(data) < len(header) + 4:
+        return deps
+    version = struct.unpack_from('<i', data, len(header))[0]
+    if version not in [3, 4]:
+        return deps
+    mtime_size = 8 if version == 4 else 4
+
+    paths = []
+    pos = len(header) + 4
+    end = len(data)
+    while pos + 4 <= end:
+        size = struct.unpack_from('<I', data, pos)[0]
+        pos += 4
+        is_deps = size & 0x80000000
+        size &= 0x7FFFFFFF
+        if pos + size > end:
+            break # truncated record
+        if is_deps:
+            out_id = struct.unpack_from('<i', data, pos)[0]
+            count = (size - 4 - mtime_size) // 4
+            ids = struct.unpack_from('<%di' % count, data, pos + 4 + mtime_size)
+            if 0 <= out_id < len(paths):
+                # later records supersede previous ones
+                deps[paths[out_id]] = [paths[x] for x in ids if 0 <= x < len(paths)]
+        else:
+            # path padded with nul chars, followed by checksum (version 4)
+            path = data[pos:pos + size - (4 if version == 4 else 0)].rstrip(b'\0')
+            paths.append(path.decode('utf-8', 'replace'))
+        pos += size
+    return deps
+
+#------------------------------------------------------------------------------
+def get_mtime(st):
+    return st.st_mtime_ns if hasattr(st, 'st_mtime_ns') else int(st.st_mtime * 1000000000)
+
+#------------------------------------------------------------------------------
+def set_mtime(path, mtime):
+    if sys.version_info[0] >= 3:
+        os.utime(path, ns=(mtime, mtime))
+    else:
+        os.utime(path, (mtime / 1e9, mtime / 1e9))
+
+#------------------------------------------------------------------------------
+def hash_file(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+#------------------------------------------------------------------------------
+def load(file):
+    '''returns {path: (mtime, size, hash)}'''
+    try:
+        with open(file, 'rb') as f:
+            data = marshal.load(f)
+        if data.get('version') == DB_VERSION:
+            return data['files']
+    except (IOError, OSError, EOFError, ValueError, TypeError, KeyError, AttributeError):
+        pass
+    return {}
+
+#------------------------------------------------------------------------------
+def save(file, files):
+    tmp_file = file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        marshal.dump({'version': DB_VERSION, 'files': files}, f)
+    if os.path.isfile(file):
+        os.remove(file)
+    os.rename(tmp_file, file)
+
+#------------------------------------------------------------------------------
+def is_enabled():
+    '''`FLUX_MTIME_RESTORE=0` env var disables mtimes restore'''
+    return os.environ.get('FLUX_MTIME_RESTORE', '1') != '0'
+
+#------------------------------------------------------------------------------
+def restore_mtimes(build_dir, ninja_dir):
+    '''restore mtimes of ninja deps inputs with unchanged content, returns (restored files, avoided rebuilds)'''
+    from mods import project
+
+    deps = read_ninja_deps(os.path.join(build_dir, DEPS_FILE))
+    if not deps:
+        return 0, 0
+
+    db_file = os.path.join(build_dir, DB_FILE)
+    files = load(db_file)
+    changed = False
+    restored = set()
+
+    inputs = set()
+    for paths in deps.values():
+        inputs.update(paths)
+
+    for path in inputs:
+        # generated files are ninja outputs, leave them to ninja
+        if project.FDIR in util.fix_path(path).split('/'):
+            continue
+        file = os.path.join(ninja_dir, path)
+        try:
+            st = os.stat(file)
+        except OSError:
+            if path in files:
+                del files[path]
+                changed = True
+            continue
+
+        mtime = get_mtime(st)
+        entry = files.get(path)
+        if entry and entry[0] == mtime and entry[1] == st.st_size:
+            continue
+
+        # stat changed: same content gets recorded mtime back, else record new content
+        try:
+            digest = hash_file(file)
+        except (IOError, OSError):
+            continue
+        if entry and entry[1] == st.st_size and entry[2] == digest:
+            try:
+                set_mtime(file, entry[0])
+                restored.add(path)
+                continue
+            except OSError:
+                pass
+        files[path] = (mtime, st.st_size, digest)
+        changed = True
+
+    if changed:
+        save(db_file, files)
+
+    avoided = 0
+    if restored:
+        for paths in deps.values():
+            if not restored.isdisjoint(paths):
+                avoided += 1
+    return len(restored), avoided
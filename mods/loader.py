@@ -0,0 +1,229 @@
+"""flux yaml loader
+
+one loader class per build options signature, flux tags are registered once
+on it. the global yaml loaders are left untouched.
+
+parsed files are cached in workspace `flux-proj/yaml` dir, one entry per file
+path and build options signature, keyed by the file content and checked
+against the env vars read by `!$env` tags. a changed file replaces its entry.
+
+the LibYAML C parser of an installed PyYAML is used when available, the
+vendored pure python parser otherwise. the vendored package has no compiled
+`_yaml` module, the C parser builds nodes of the installed PyYAML, so its own
+constructor and resolver classes come with it."""
+
+import os, sys, re, marshal, hashlib
+
+#------------------------------------------------------------------------------
+
+CACHE_DIR = 'yaml'      # parsed files cache dir, in workspace intermediate dir
+CACHE_VERSION = 2       # bump when tags change
+
+# pattern for global vars: look for ${word}
+ENV_PATTERN = re.compile(r'.*?\${([A-Za-z0-9._-]+)}.*?')
+
+# conditional tags: tag: build options condition
+conditions = {
+    # targets
+    '!?linux':          lambda opts: opts.target == 'linux',
+    '!?macos':          lambda opts: opts.target == 'macos',
+    '!?windows':        lambda opts: opts.target in ['windows', 'windows-msvc'],
+    '!?emscripten':     lambda opts: opts.target == 'emscripten',
+    # target aliases
+    '!?desktop':        lambda opts: opts.target in ['windows', 'windows-msvc', 'linux', 'macos', 'raspbian'],
+    '!?web':            lambda opts: opts.target == 'emscripten',
+    '!?mobile':         lambda opts: opts.target in ['android', 'ios', 'ios-sim'],
+    # configs
+    '!?debug':          lambda opts: opts.config == 'debug',
+    '!?release':        lambda opts: opts.config == 'release',
+    # archs
+    '!?x86':            lambda opts: opts.arch == 'x86',
+    '!?x64':            lambda opts: opts.arch == 'x64',
+    '!?arm32':          lambda opts: opts.arch == 'arm32',
+    '!?arm64':          lambda opts: opts.arch == 'arm64',
+    '!?wasm':           lambda opts: opts.arch == 'wasm',
+    # toolchains
+    '!?gcc':            lambda opts: opts.toolchain == 'gcc',
+    '!?msvc':           lambda opts: opts.toolchain == 'msvc',
+    '!?mingw':          lambda opts: opts.target == 'windows' and opts.toolchain == 'gcc',
+    # build options
+    '!?relocatable':    lambda opts: opts.relocatable,
+}
+
+# loader classes by parser and build options signature
+loaders = {}
+
+# LibYAML based base loader class of an installed PyYAML, False until looked up
+c_base_loader = False
+
+#------------------------------------------------------------------------------
+def env(loader, node):
+    '''Extracts the environment variable from the node's value'''
+    value = loader.construct_scalar(node)
+    match = ENV_PATTERN.findall(value) # to find all env variables in line
+    if match:
+        new_value = value
+        for g in match:
+            loader.env_vars[g] = os.environ.get(g)
+            new_value = new_value.replace('${%s}' % g, os.environ.get(g, g))
+        return new_value
+    return value
+
+#------------------------------------------------------------------------------
+def join(loader, node):
+    '''directory join'''
+    seq = loader.construct_sequence(node)
+    return os.path.sep.join(seq)
+
+#------------------------------------------------------------------------------
+def concat(loader, node):
+    '''string concatenation'''
+    seq = loader.construct_sequence(node)
+    return ' '.join([str(i) for i in seq if str(i) != ''])
+
+#------------------------------------------------------------------------------
+def keep(loader, node):
+    return loader.construct_scalar(node)
+
+#------------------------------------------------------------------------------
+def drop(loader, node):
+    loader.construct_scalar(node)
+    return ''
+
+#------------------------------------------------------------------------------
+def get_signature(opts):
+    '''returns build options the conditional tags depend on'''
+    return (opts.target, opts.config, opts.arch, opts.toolchain, bool(opts.relocatable))
+
+#------------------------------------------------------------------------------
+def find_c_base_loader():
+    '''returns `CSafeLoader` of an installed PyYAML with LibYAML bindings, None if missing or broken'''
+    global c_base_loader
+    if c_base_loader is False:
+        c_base_loader = None
+        try:
+            import yaml as pyyaml
+            if pyyaml.load('a: [b, 1]', Loader=pyyaml.CSafeLoader) == {'a': ['b', 1]}:
+                c_base_loader = pyyaml.CSafeLoader
+        except Exception:
+            pass
+    return c_base_loader
+
+#------------------------------------------------------------------------------
+def get_parser():
+    '''returns `c` if LibYAML parser is available, else `python`, `FLUX_YAML_PARSER=python` env var forces pure python parser'''
+    if os.environ.get('FLUX_YAML_PARSER', 'c') != 'python' and find_c_base_loader():
+        return 'c'
+    return 'python'
+
+#------------------------------------------------------------------------------
+def make_loader(opts, parser):
+    '''returns a new loader class with flux tags resolved for build options'''
+    from packages import yaml
+    if parser == 'c':
+        base = find_c_base_loader()
+    else:
+        # fast scanning mode of the vendored python 3 parser
+        base = getattr(yaml, 'FastSafeLoader', yaml.SafeLoader)
+
+    class FluxLoader(base):
+        def __init__(self, stream):
+            base.__init__(self, stream)
+            self.env_vars = {} # env vars read by `!$env` tags
+
+    # `${VAR}` in plain scalars is kept as is, rules placeholders like
+    # `${target.cc}` are replaced later, only explicit `!$env` reads env vars
+    FluxLoader.add_constructor('!$env', env)
+
+    FluxLoader.add_constructor('!join', join)
+    FluxLoader.add_constructor('!concat', concat)
+    FluxLoader.add_constructor('!flags', concat) # extra
+    FluxLoader.add_constructor('!opts', concat) # extra
+    FluxLoader.add_constructor('!args', concat) # extra
+
+    for tag, cond in conditions.items():
+        FluxLoader.add_constructor(tag, keep if cond(opts) else drop)
+    return FluxLoader
+
+#------------------------------------------------------------------------------
+def get_loader(opts, parser=None):
+    '''returns loader class for build options, created once per parser and signature'''
+    parser = parser or get_parser()
+    key = (parser,) + get_signature(opts)
+    if key not in loaders:
+        loaders[key] = make_loader(opts, parser)
+    return loaders[key]
+
+#------------------------------------------------------------------------------
+def is_cache_enabled():
+    '''`FLUX_YAML_CACHE=0` env var disables parsed files cache'''
+    return os.environ.get('FLUX_YAML_CACHE', '1') != '0'
+
+#------------------------------------------------------------------------------
+def get_key(content, opts):
+    h = hashlib.sha1(('%d %d.%d ' % ((CACHE_VERSION,) + tuple(sys.version_info[:2]))).encode('utf-8'))
+    h.update(repr(get_signature(opts)).encode('utf-8'))
+    h.update(b'\0' + content)
+    return h.hexdigest()
+
+#------------------------------------------------------------------------------
+def get_entry_name(file, opts):
+    '''returns cache entry file name of a file parsed with build options'''
+    h = hashlib.sha1(('%d %d.%d ' % ((CACHE_VERSION,) + tuple(sys.version_info[:2]))).encode('utf-8'))
+    h.update(repr(get_signature(opts)).encode('utf-8'))
+    h.update(b'\0' + os.path.abspath(file).encode('utf-8'))
+    return h.hexdigest()
+
+#------------------------------------------------------------------------------
+def read_cache(cache_dir, name, key):
+    '''returns cached data, None if missing, if file content changed or if a read env var changed'''
+    try:
+        with open(os.path.join(cache_dir, name), 'rb') as f:
+            entry = marshal.load(f)
+        if entry['key'] != key:
+            return None
+        for var, value in entry['env'].items():
+            if os.environ.get(var) != value:
+                return None
+        return entry
+    except (IOError, OSError, EOFError, ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+#------------------------------------------------------------------------------
+def write_cache(cache_dir, name, key, data, env_vars):
+    file = os.path.join(cache_dir, name)
+    tmp_file = '%s.%d.tmp' % (file, os.getpid())
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(tmp_file, 'wb') as f:
+            marshal.dump({'key': key, 'env': env_vars, 'data': data}, f)
+        if os.path.isfile(file):
+            os.remove(file)
+        os.rename(tmp_file, file)
+    except (IOError, OSError, ValueError):
+        # data with non marshallable values (e.g. dates) isn't cached
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+
+#------------------------------------------------------------------------------
+def load(file, opts, cache_dir=None, parser=None):
+    '''load flux yaml file, parsed data is cached in `cache_dir`'''
+    with open(file, 'rb') as f:
+        content = f.read()
+    key = None
+    if cache_dir and is_cache_enabled():
+        name = get_entry_name(file, opts)
+        key = get_key(content, opts)
+        entry = read_cache(cache_dir, name, key)
+        if entry:
+            return entry['data']
+
+    loader = get_loader(opts, parser)(content)
+    try:
+        data = loader.get_single_data()
+    finally:
+        loader.dispose()
+    if key:
+        write_cache(cache_dir, name, key, data, loader.env_vars)
+    return data
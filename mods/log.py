@@ -20,6 +20,10 @@ CYAN    = '\033[36m'
 WHITE   = '\033[37m'
 DEFAULT = '\033[39m'
 
+# no colors when output isn't a terminal, e.g. piped or in CI logs
+if not (hasattr(sys.stdout, 'isatty') and sys.stdout.isatty()):
+    BLACK = RED = GREEN = YELLOW = BLUE = MAGENTA = CYAN = WHITE = DEFAULT = ''
+
 #------------------------------------------------------------------------------
 
 def fatal(msg, fatal=True):
@@ -27,17 +27,38 @@ def escape_path(word):
     return word.replace('$ ', '$$ ').replace(' ', '$ ').replace(':', '$:')
 
 class Writer(object):
-    def __init__(self, output, width=78):
+    """'width' of 0 (or None) disables wrapping. A 'buffered' writer collects
+    output in memory and writes it to 'output' at once on close(). Paths in
+    'relocate' dir are written relative to it, ninja must run from it."""
+    def __init__(self, output, width=78, buffered=False, relocate=None):
         self.output = output
         self.width = width
+        self.buffer = [] if buffered else None
+        self._write = self.buffer.append if buffered else output.write
+        # escaped paths cache, the same paths are written many times per manifest
+        self._escaped_paths = {}
+        self._relocate = None
+        if relocate:
+            dirs = set([relocate, escape_path(relocate)])
+            self._relocate = re.compile('(?:%s)(/|(?=["\'\\s]|$))' % '|'.join(
+                re.escape(x) for x in sorted(dirs, key=len, reverse=True)))
+
+    def _escape_path(self, word):
+        escaped = self._escaped_paths.get(word)
+        if escaped is None:
+            escaped = self._escaped_paths[word] = escape_path(word)
+        return escaped
 
     def newline(self):
-        self.output.write('\n')
+        self._write('\n')
 
     def comment(self, text):
+        if not self.width:
+            self._write('# ' + text + '\n')
+            return
         for line in textwrap.wrap(text, self.width - 2, break_long_words=False,
                                   break_on_hyphens=False):
-            self.output.write('# ' + line + '\n')
+            self._write('# ' + line + '\n')
 
     def variable(self, key, value, indent=0):
         if value is None:
@@ -75,19 +96,19 @@ class Writer(object):
     def build(self, outputs, rule, inputs=None, implicit=None, order_only=None,
               variables=None, implicit_outputs=None, pool=None, dyndep=None):
         outputs = as_list(outputs)
-        out_outputs = [escape_path(x) for x in outputs]
-        all_inputs = [escape_path(x) for x in as_list(inputs)]
+        out_outputs = [self._escape_path(x) for x in outputs]
+        all_inputs = [self._escape_path(x) for x in as_list(inputs)]
 
         if implicit:
-            implicit = [escape_path(x) for x in as_list(implicit)]
+            implicit = [self._escape_path(x) for x in as_list(implicit)]
             all_inputs.append('|')
             all_inputs.extend(implicit)
         if order_only:
-            order_only = [escape_path(x) for x in as_list(order_only)]
+            order_only = [self._escape_path(x) for x in as_list(order_only)]
             all_inputs.append('||')
             all_inputs.extend(order_only)
         if implicit_outputs:
-            implicit_outputs = [escape_path(x)
+            implicit_outputs = [self._escape_path(x)
                                 for x in as_list(implicit_outputs)]
             out_outputs.append('|')
             out_outputs.extend(implicit_outputs)
@@ -119,52 +140,65 @@ class Writer(object):
     def default(self, paths):
         self._line('default %s' % ' '.join(as_list(paths)))
 
-    def _count_dollars_before_index(self, s, i):
+    def _count_dollars_before_index(self, s, i, start=0):
         """Returns the number of '$' characters right in front of s[i]."""
         dollar_count = 0
         dollar_index = i - 1
-        while dollar_index > 0 and s[dollar_index] == '$':
+        while dollar_index > start and s[dollar_index] == '$':
             dollar_count += 1
             dollar_index -= 1
         return dollar_count
 
     def _line(self, text, indent=0):
         """Write 'text' word-wrapped at self.width characters."""
+        if self._relocate:
+            text = self._relocate.sub(
+                lambda m: '' if m.group(1) else '.', text)
         leading_space = '  ' * indent
-        while len(leading_space) + len(text) > self.width:
+        if not self.width:
+            self._write(leading_space + text + '\n')
+            return
+
+        # Wrap from an offset instead of slicing the remaining text, so long
+        # lines (e.g. thousands of objects) are written in linear time.
+        start = 0
+        while len(leading_space) + len(text) - start > self.width:
             # The text is too wide; wrap if possible.
 
             # Find the rightmost space that would obey our width constraint and
             # that's not an escaped space.
             available_space = self.width - len(leading_space) - len(' $')
-            space = available_space
+            space = start + available_space
             while True:
-                space = text.rfind(' ', 0, space)
+                space = text.rfind(' ', start, space)
                 if (space < 0 or
-                    self._count_dollars_before_index(text, space) % 2 == 0):
+                    self._count_dollars_before_index(text, space, start) % 2 == 0):
                     break
 
             if space < 0:
                 # No such space; just use the first unescaped space we can find.
-                space = available_space - 1
+                space = start + available_space - 1
                 while True:
                     space = text.find(' ', space + 1)
                     if (space < 0 or
-                        self._count_dollars_before_index(text, space) % 2 == 0):
+                        self._count_dollars_before_index(text, space, start) % 2 == 0):
                         break
             if space < 0:
                 # Give up on breaking.
                 break
 
-            self.output.write(leading_space + text[0:space] + ' $\n')
-            text = text[space+1:]
+            self._write(leading_space + text[start:space] + ' $\n')
+            start = space + 1
 
             # Subsequent lines are continuations, so indent them.
             leading_space = '  ' * (indent+2)
 
-        self.output.write(leading_space + text + '\n')
+        self._write(leading_space + text[start:] + '\n')
 
     def close(self):
+        if self.buffer is not None:
+            self.output.write(''.join(self.buffer))
+            self.buffer = []
         self.output.close()
 
 
@@ -0,0 +1,243 @@
+"""packed assets archive
+
+run by pack rules of project ninja files, packs manifest files into one archive:
+    python mods/pack.py <manifest> <pack>
+
+archive layout, little endian, entries data aligned to 16 bytes:
+    header  : magic `FLUXPACK`, u32 version, u32 count, u64 index offset, u64 index size
+    data    : entries data, stored or zlib compressed
+    index   : count records sorted by name, then names blob (utf-8)
+    record  : u64 offset, u64 size, u64 raw size, u32 name offset, u32 name size,
+              u32 flags, u32 reserved, sha1 of raw data (20 bytes), 4 bytes padding
+
+stored entries can be read in place from a memory mapped archive. entries with
+the same content share their data. packs are updated in place: unchanged
+entries are kept, changed ones are appended and the index rewritten, the pack
+is rewritten from scratch when dead data outgrows live data."""
+
+import os, sys, struct, marshal, hashlib, json, zlib
+
+#------------------------------------------------------------------------------
+
+MAGIC = b'FLUXPACK'
+VERSION = 1
+ALIGN = 16
+
+FLAG_ZLIB = 1
+
+HEADER = struct.Struct('<8sIIQQ')
+RECORD = struct.Struct('<QQQIIII20s4x')
+
+STATE_EXT = '.state'    # files stats of last pack, next to pack file
+STATE_VERSION = 1
+
+#------------------------------------------------------------------------------
+def align(pos):
+    return (pos + ALIGN - 1) & ~(ALIGN - 1)
+
+#------------------------------------------------------------------------------
+def write_manifest(file, files, compress=False):
+    '''write pack manifest of `{name: src}` files, left untouched if unchanged, returns True if written'''
+    content = json.dumps({
+        'compress': bool(compress),
+        'files': sorted([name, src] for name, src in files.items()),
+    }, indent=1)
+    if os.path.isfile(file):
+        with open(file, 'r') as f:
+            if f.read() == content:
+                return False
+    with open(file, 'w') as f:
+        f.write(content)
+    return True
+
+#------------------------------------------------------------------------------
+def read_index(f):
+    '''returns {name: (offset, size, raw size, flags, hash)} and index offset of pack file, None if invalid'''
+    f.seek(0)
+    header = f.read(HEADER.size)
+    if len(header) != HEADER.size:
+        return None
+    magic, version, count, index_offset, index_size = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        return None
+    f.seek(index_offset)
+    index = f.read(index_size)
+    if len(index) != index_size or index_size < count * RECORD.size:
+        return None
+    names = index[count * RECORD.size:]
+    entries = {}
+    for i in range(count):
+        offset, size, raw_size, name_offset, name_size, flags, _, digest = RECORD.unpack_from(index, i * RECORD.size)
+        name = names[name_offset:name_offset + name_size].decode('utf-8')
+        entries[name] = (offset, size, raw_size, flags, digest)
+    return entries, index_offset
+
+#------------------------------------------------------------------------------
+def write_index(f, entries, index_offset):
+    '''write sorted index at `index_offset` and header, truncate pack file'''
+    names = sorted(entries)
+    records = []
+    blob = []
+    name_offset = 0
+    for name in names:
+        offset, size, raw_size, flags, digest = entries[name]
+        data = name.encode('utf-8')
+        records.append(RECORD.pack(offset, size, raw_size, name_offset, len(data), flags, 0, digest))
+        blob.append(data)
+        name_offset += len(data)
+    index = b''.join(records) + b''.join(blob)
+    f.seek(index_offset)
+    f.write(index)
+    f.truncate()
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, len(names), index_offset, len(index)))
+
+#------------------------------------------------------------------------------
+def get_stat(path):
+    st = os.stat(path)
+    return st.st_mtime_ns if hasattr(st, 'st_mtime_ns') else int(st.st_mtime * 1000000000), st.st_size
+
+#------------------------------------------------------------------------------
+def load_state(pack_file, compress):
+    '''returns {name: (mtime, size, src)} of last pack, empty if pack file or compression changed since'''
+    try:
+        with open(pack_file + STATE_EXT, 'rb') as f:
+            state = marshal.load(f)
+        if state['version'] == STATE_VERSION and state['pack'] == get_stat(pack_file) \
+                and state['compress'] == compress:
+            return state['files']
+    except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+        pass
+    return {}
+
+#------------------------------------------------------------------------------
+def save_state(pack_file, files, compress):
+    with open(pack_file + STATE_EXT, 'wb') as f:
+        marshal.dump({'version': STATE_VERSION, 'pack': get_stat(pack_file), 'compress': compress, 'files': files}, f)
+
+#------------------------------------------------------------------------------
+def get_dead_size(entries, data_size):
+    '''returns size of data no entry refers to'''
+    live = set((x[0], x[1]) for x in entries.values())
+    return data_size - HEADER.size - sum(align(size) for _, size in live)
+
+#------------------------------------------------------------------------------
+def pack(pack_file, files, compress=False):
+    '''pack `{name: src}` files, returns (written, kept) entries'''
+    # previous pack is reused if unchanged since last pack
+    compress = bool(compress)
+    state = load_state(pack_file, compress)
+    old = None
+    if state:
+        with open(pack_file, 'rb') as f:
+            old = read_index(f)
+    if old:
+        entries, data_end = old
+        entries = dict((x, entries[x]) for x in files if x in entries)
+        # too much dead data: pack from scratch
+        if get_dead_size(entries, data_end) > max(data_end // 2, 1 << 20):
+            entries, data_end = {}, align(HEADER.size)
+    else:
+        entries, data_end = {}, align(HEADER.size)
+
+    # data by content hash, for dedupe
+    data_by_hash = {}
+    for name, entry in entries.items():
+        data_by_hash[entry[4]] = entry
+
+    new_state = {}
+    written = 0
+    kept = 0
+    mode = 'r+b' if old else 'w+b'
+    with open(pack_file, mode) as f:
+        if not old:
+            f.write(b'\0' * data_end)
+        for name in sorted(files):
+            src = files[name]
+            mtime, size = get_stat(src)
+            new_state[name] = (mtime, size, src)
+            if name in entries and state.get(name) == (mtime, size, src):
+                kept += 1
+                continue
+
+            with open(src, 'rb') as s:
+                data = s.read()
+            digest = hashlib.sha1(data).digest()
+            if name in entries and entries[name][4] == digest:
+                kept += 1
+                continue
+            if digest in data_by_hash:
+                entries[name] = data_by_hash[digest]
+                written += 1
+                continue
+
+            flags = 0
+            raw_size = len(data)
+            if compress:
+                packed = zlib.compress(data, 6)
+                # compressed only if worth it, stored entries are read in place
+                if len(packed) < raw_size * 9 // 10:
+                    data = packed
+                    flags |= FLAG_ZLIB
+            f.seek(data_end)
+            f.write(data)
+            entries[name] = (data_end, len(data), raw_size, flags, digest)
+            data_by_hash[digest] = entries[name]
+            data_end = align(data_end + len(data))
+            written += 1
+
+        write_index(f, entries, data_end)
+    save_state(pack_file, new_state, compress)
+    return written, kept
+
+#------------------------------------------------------------------------------
+
+class Pack:
+    '''Memory mapped pack file, stored entries are read without copy'''
+
+    #------------------------------------------------------------------------------
+    def __init__(self, file):
+        import mmap
+        self.file = open(file, 'rb')
+        result = read_index(self.file)
+        if not result:
+            self.file.close()
+            raise ValueError('invalid pack file `%s`' % file)
+        self.entries = result[0]
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    #------------------------------------------------------------------------------
+    def __contains__(self, name):
+        return name in self.entries
+
+    #------------------------------------------------------------------------------
+    def __iter__(self):
+        return iter(sorted(self.entries))
+
+    #------------------------------------------------------------------------------
+    def __getitem__(self, name):
+        '''returns entry data, a memoryview of the mapped pack for stored entries'''
+        offset, size, raw_size, flags, _ = self.entries[name]
+        data = memoryview(self.map)[offset:offset + size]
+        if flags & FLAG_ZLIB:
+            return zlib.decompress(data.tobytes())
+        return data
+
+    #------------------------------------------------------------------------------
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+#------------------------------------------------------------------------------
+def run(manifest_file, pack_file):
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    pack(pack_file, dict(manifest['files']), manifest['compress'])
+    return 0
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.stderr.write('usage: pack.py <manifest> <pack>\n')
+        sys.exit(1)
+    sys.exit(run(sys.argv[1], sys.argv[2]))
@@ -1,8 +1,8 @@
-import os, sys, subprocess, glob, fnmatch
+import os, sys, glob, fnmatch
 
-from shutil import rmtree, copyfile
+from shutil import rmtree
 from packages import yaml
-from mods import util, log, build, ninja
+from mods import util, log, build, ninja, transform
 
 #------------------------------------------------------------------------------
 
@@ -10,6 +10,8 @@ FILE        = 'flux.yml'    # default project file
 FDIR        = 'flux-proj'   # intermediate dir
 CACHE_DIR   = 'build'       # cache build dir
 ASSET_DIR   = 'assets'      # assets dir
+PACK_FILE   = 'assets.pack' # packed assets file, in out dir
+SYNC_FILE   = 'assets.sync' # copied assets and binaries stamp, in cache dir
 NINJA_FILE  = 'build.ninja'
 
 # Ugly!!!!! from flux.py
@@ -50,6 +52,8 @@ class Project:
     def __init__(self, flux_dir, proj_dir, build_opts, is_dep=False):
         '''load project file and prepare intermediate dirs'''
         
+        self.flux_dir = flux_dir
+
         # project yaml datas
         self.data = None
 
@@ -64,11 +68,15 @@ class Project:
         self.java_files= []
         self.asset_files = []
         self.ninja_files = []
+        self.input_dirs = [] # globbed dirs and assets, regenerate ninja file when changed
 
         # flux project
         self.flux_file = ''
         self.flux_srcs = []
         self.flux_libs = []
+        self.mod_files = [] # dependency modules archives
+        self.prebuilt = False # module archive fetched from store, not built
+        self.artifact_key = None # module store key, None if not storable
 
         # project build opts
         self.cc_opts = []
@@ -94,7 +102,7 @@ class Project:
                 #log.track('proj_file: '+file, __file__)
                 if os.path.isfile(file):
                     proj_file = file
-                    self.data = util.load_flux_yaml(proj_file, build_opts)
+                    self.data = util.load_flux_yaml(proj_file, build_opts, flux_dir)
                     self.flux_file = proj_file
                     break
 
@@ -102,7 +110,7 @@ class Project:
             #log.track('is_file: '+file, __file__)
             proj_file = proj_dir
             proj_dir = util.split_dir(proj_dir)
-            self.data = util.load_flux_yaml(proj_file, build_opts)
+            self.data = util.load_flux_yaml(proj_file, build_opts, flux_dir)
             self.flux_file = proj_file
         
         if not self.data:
@@ -150,10 +158,38 @@ class Project:
         #else:
         #    self.out_file = util.fix_path(os.path.join(self.out_dir, self.name + self.out_ext))
         self.out_file = util.fix_path(os.path.join(self.out_dir, self.name + self.out_ext))
+        self.side_files = [util.fix_path(os.path.join(self.out_dir, self.name + x)) for x in build.SIDE_EXT.get(build_opts.target, {}).get(build_opts.build, [])]
 
         # set gen file
         self.gen_file = util.fix_path(os.path.join(self.out_dir, NINJA_FILE))
 
+        # packed assets: `pack: true`, or `pack: {compress: true}` for zlib compressed entries
+        pack = self.data.get('pack')
+        self.pack_file = util.fix_path(os.path.join(self.out_dir, PACK_FILE)) if pack else None
+        self.pack_compress = isinstance(pack, dict) and bool(pack.get('compress'))
+
+        # asset transforms, first rule matching asset extension applies:
+        # `{ext: [.js, .wasm], run: gzip|deflate|script.py, out: .ext, keep: bool, version: n}`
+        # rules with an empty `run` are skipped, e.g. `run: !?web gzip`
+        self.transforms = []
+        for rule in self.data.get('transforms') or []:
+            if not isinstance(rule, dict) or not rule.get('run'):
+                continue
+            run = rule['run']
+            if run not in transform.BUILTINS:
+                run = util.fix_path(os.path.abspath(os.path.join(self.proj_dir, run)))
+                if not os.path.isfile(run):
+                    log.fatal('transform script `%s` not found' % rule['run'])
+            exts = rule.get('ext') or []
+            exts = [exts] if not isinstance(exts, list) else exts
+            self.transforms.append({
+                'ext': ['.' + x.lower().lstrip('.') for x in exts],
+                'run': run,
+                'out': rule.get('out'),
+                'keep': rule.get('keep', run in transform.BUILTINS),
+                'version': str(rule.get('version', 1)),
+            })
+
         # get build options
         if 'options' in self.data:
             self.opts = self.data['options'] if self.data.get('options') else {}
@@ -207,32 +243,11 @@ class Project:
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir)
 
-    #------------------------------------------------------------------------------
-    def clean_ninja(self, cd=None, verbose=False):
-        if cd is None:
-            cd = os.getcwd()
-        os.chdir(self.out_dir)
-        if verbose:
-            subprocess.call(['ninja', '-C', self.build_dir, '-f', self.gen_file, '-t', 'clean', '-v'], shell=True)
-        else:
-            subprocess.call(['ninja', '-C', self.build_dir, '-f', self.gen_file, '-t', 'clean'], shell=True)
-        os.chdir(cd)
-
-    #------------------------------------------------------------------------------
-    def build_ninja(self, cd=None, verbose=False):
-        if cd is None:
-            cd = os.getcwd()
-        os.chdir(self.out_dir)
-        if verbose:
-            subprocess.call(['ninja', '-C', self.build_dir, '-f', self.gen_file, '-v'], shell=True)
-        else:
-            subprocess.call(['ninja', '-C', self.build_dir, '-f', self.gen_file], shell=True)
-        os.chdir(cd)
-
     #------------------------------------------------------------------------------
     def gen_ninja(self, file, build_opts, target):
         '''generate ninja build file from project'''
         rules_remap = {
+            'target.launcher'     : '$launcher',
             'target.cmds.cc'      : '$cc',
             'target.cmds.cxx'     : '$cxx',
             'target.cmds.ar'      : '$ar',
@@ -253,13 +268,16 @@ class Project:
 
             'project.out.file'    : '$out',
             'project.libs'        : '$libs',
-            'project.objs'        : '$objs',
+            'project.objs'        : '$in',
+            'project.rspfile'     : '$rspfile',
             'project.source'      : '$in',
             'project.source.dep'  : '$dep_file',
             'project.source.obj'  : '$out', # $obj?
         }
         
-        n = ninja.Writer(file, 150)
+        # relocatable: workspace relative paths, ninja runs from workspace dir
+        relocate = util.get_workspace_dir(self.flux_dir) if build_opts.relocatable else None
+        n = ninja.Writer(file, 150, buffered=True, relocate=relocate) # written at once on close
 
         n.comment('flux build system '+VERSION)
         n.comment('repo: https://github.com/seyhajin/flux')
@@ -285,6 +303,7 @@ class Project:
         n.variable('as', target.cmds['as'])
         n.variable('ar', target.cmds['ar'])
         n.variable('ld', target.cmds['ld'])
+        n.variable('launcher', target.get_launcher())
         n.newline()
         n.comment('target options')
         n.variable('cc_opts_target', util.replace_env(target.opts['cc'], os.environ))
@@ -305,14 +324,6 @@ class Project:
         n.variable('ar_opts_project', util.replace_env(ar_opts, os.environ))
         n.variable('ld_opts_project', util.replace_env(ld_opts, os.environ))
 
-        #TODO: add `subninja` for depends modules : used to include another .ninja file, introduces a new scope
-        # `include` used to include another .ninja file in the current scope (use this only for global configurations)
-        #if len(self.ninja_files):
-        #    n.newline()
-        #    n.comment('project depends')
-        #    for dep in self.ninja_files:
-        #        n.subninja(dep)
-
         n.newline()
         n.comment('----------------------------')
         n.comment('RULES')
@@ -325,7 +336,8 @@ class Project:
             util.replace_env(target.rules['cc'], rules_remap),
             deps=target.toolchain if target.toolchain in ['gcc', 'msvc'] else 'gcc',
             depfile=rules_remap['project.source.dep'] if self.toolchain == 'gcc' else '',
-            description='Compiling $in'
+            description='Compiling $in',
+            pool=target.get_pool('cc')
         )
         n.newline()
 
@@ -333,7 +345,8 @@ class Project:
             util.replace_env(target.rules['cxx'], rules_remap),
             deps=target.toolchain if target.toolchain in ['gcc', 'msvc'] else 'gcc',
             depfile=rules_remap['project.source.dep'] if self.toolchain == 'gcc' else '',
-            description='Compiling $in'
+            description='Compiling $in',
+            pool=target.get_pool('cxx')
         )
         n.newline()
 
@@ -342,19 +355,36 @@ class Project:
                 n.rule('as_compile',
                     util.replace_env(target.rules['as'], rules_remap),
                     #deps=target.toolchain if target.toolchain in ['gcc', 'msvc'] else 'gcc',
-                    description='Assembling $in'
+                    description='Assembling $in',
+                    pool=target.get_pool('as')
                 )
                 n.newline()
 
         if self.build in ['mod', 'module']:
+            rule, rsp = target.get_rsp_rule('ar')
+            if target.toolchain == 'gcc':
+                # ar updates an existing archive, members of removed sources would be kept
+                if util.get_host_platform() == 'windows':
+                    rule = 'cmd /c (if exist "$out" del /f /q "$out") & ' + rule
+                else:
+                    rule = 'rm -f $out && ' + rule
             n.rule('archive',
-                util.replace_env(target.rules['ar'], rules_remap),
-                description='Archiving $out'
+                util.replace_env(rule, rules_remap),
+                rspfile='$out.rsp' if rsp else None, # keep command line short
+                rspfile_content=rsp,
+                description='Archiving $out',
+                restat=True, # archive is rewritten, prunes dependents only for ar commands keeping an unchanged archive
+                pool=target.get_pool('ar') # pools are declared in workspace ninja file
             )
         elif self.build in ['app', 'application']:
+            rule, rsp = target.get_rsp_rule('ld')
             n.rule('link',
-                util.replace_env(target.rules['ld'], rules_remap),
-                description='Linking $out'
+                util.replace_env(rule, rules_remap),
+                rspfile='$out.rsp' if rsp else None,
+                rspfile_content=rsp,
+                description='Linking $out',
+                restat=True,
+                pool=target.get_pool('ld')
             )
         else:
             log.fatal('ninja: unrecognized project build type: `%s`' % self.build)
@@ -368,9 +398,15 @@ class Project:
         # for each project source file
         objs = []
         done = {}
+        proj_prefix = util.fix_path(os.path.abspath(self.proj_dir)).rstrip('/') + '/'
         for src in self.src_files:
             ext = util.split_ext(src)
-            obj = util.fix_path(os.path.join(self.cache_dir, os.path.relpath(src, self.proj_dir)))
+            # avoid costly `relpath` for normalized sources in project dir
+            path = util.fix_path(src)
+            if path.startswith(proj_prefix) and '/.' not in path and '//' not in path:
+                obj = self.cache_dir + '/' + path[len(proj_prefix):]
+            else:
+                obj = util.fix_path(os.path.join(self.cache_dir, os.path.relpath(src, self.proj_dir)))
             dep = obj+'.d'
             obj += '.obj' if self.toolchain == 'msvc' else '.o'
 
@@ -397,10 +433,11 @@ class Project:
 
         objs += self.obj_files
 
-        # objects alias
+        # objects alias, project aliases are global in workspace ninja file
+        objects = self.name + '_objects'
         n.newline()
         n.comment('objects alias')
-        n.build('objects', 'phony ' + ' '.join(objs))
+        n.build(objects, 'phony ' + ' '.join(objs))
 
         if self.build in ['mod', 'module']:
             n.newline()
@@ -409,12 +446,12 @@ class Project:
             n.comment('----------------------------')
             n.newline()
             n.build(
-                self.out_file, 
-                'archive || objects', 
-                '',
+                self.out_file,
+                'archive',
+                objs,
+                implicit=self.mod_files, # relink when a dependency module archive changes
                 variables= {
                     'libs': self.lib_files,
-                    'objs': ' '.join(objs),
                 }
             )
         elif self.build in ['app', 'application']:
@@ -424,33 +461,122 @@ class Project:
             n.comment('----------------------------')
             n.newline()
             n.build(
-                self.out_file, 
-                'link || objects', 
-                '',
+                self.out_file,
+                'link',
+                objs,
+                implicit=self.mod_files, # relink when a dependency module archive changes
+                implicit_outputs=self.side_files or None,
                 variables= {
                     'libs': self.lib_files,
-                    'objs': ' '.join(objs),
                 }
             )
         else:
             log.fatal('ninja: unrecognized project build type: `%s`' % self.build)
 
-        # project alias
-        n.newline()
-        n.comment('project alias')
-        n.build(self.name, 'phony ' + ninja.escape_path(self.out_file))
-
         n.newline()
         n.comment('----------------------------')
-        n.comment('DEFAULT')
+        n.comment('ASSETS')
         n.comment('----------------------------')
         n.newline()
-        n.build(
-            'all',
-            'phony %s %s' % (self.name, 'objects'),
-        )
+
+        # assets and binaries are copied when changed, in parallel with compiles
+        files = self.get_binary_files()
+        assets = {}     # name in out dir: src
+        transforms = {} # name in out dir: (src, transform rule, packed)
+        for dst, src in self.get_asset_files().items():
+            name = os.path.relpath(dst, self.out_dir).replace('\\', '/')
+            rule = self.get_transform(src)
+            if rule:
+                out = self.get_transform_name(name, rule)
+                if out in transforms:
+                    log.fatal('transforms of `%s` and `%s` both write `%s`' % (transforms[out][0], src, out))
+                transforms[out] = (src, rule, bool(self.pack_file))
+                if not rule['keep'] or out == name:
+                    continue
+            assets[name] = src
+
+        # app link outputs transforms, e.g. precompressed emscripten `.js` and `.wasm`, never packed
+        if self.build in ['app', 'application']:
+            for src in [self.out_file] + self.side_files:
+                rule = self.get_transform(src)
+                if rule:
+                    out = self.get_transform_name(util.strip_dir(src), rule)
+                    if out == util.strip_dir(src):
+                        log.fatal('transform of link output `%s` must set an `out` extension' % src)
+                    if out in transforms:
+                        log.fatal('transforms of `%s` and `%s` both write `%s`' % (transforms[out][0], src, out))
+                    transforms[out] = (src, rule, False)
+        for out, (src, rule, packed) in transforms.items():
+            if out in assets:
+                log.fatal('transform of `%s` writes `%s`, already an asset from `%s`' % (src, out, assets[out]))
+        if not self.pack_file:
+            for name, src in assets.items():
+                files[util.fix_path(os.path.join(self.out_dir, name))] = src
+
+        python = util.enquote(util.fix_path(sys.executable)) if ' ' in sys.executable else util.fix_path(sys.executable)
+        outputs = []
+        written = [] # out dir files written by other edges than copies
+
+        # transformed assets, packed ones are transformed in build dir
+        if transforms:
+            n.rule('transform',
+                '%s %s $transform $version $in $out' % (python, util.fix_path(os.path.join(self.flux_dir, 'mods', 'transform.py'))),
+                description='Transforming $in'
+            )
+            n.newline()
+            for name, (src, rule, packed) in sorted(transforms.items()):
+                dst = util.fix_path(os.path.join(os.path.join(self.cache_dir, ASSET_DIR) if packed else self.out_dir, name))
+                n.build(dst, 'transform', src,
+                    implicit=rule['run'] if rule['run'] not in transform.BUILTINS else None, # script changes rerun it
+                    variables={'transform': rule['run'], 'version': rule['version']})
+                if packed:
+                    assets[name] = dst
+                else:
+                    written.append(dst)
+                    outputs.append(dst)
+            n.newline()
+
+        # packed assets, names are paths in out dir
+        if self.pack_file:
+            from mods import pack
+            manifest = util.fix_path(os.path.join(self.cache_dir, PACK_FILE + '.json'))
+            pack.write_manifest(manifest, assets, self.pack_compress)
+            n.rule('pack',
+                '%s %s $in $out' % (python, util.fix_path(os.path.join(self.flux_dir, 'mods', 'pack.py'))),
+                description='Packing $out'
+            )
+            n.newline()
+            n.build(self.pack_file, 'pack', manifest, implicit=sorted(assets.values()))
+            outputs.append(self.pack_file)
+            n.newline()
+
+        # copied files: one process copies changed files and removes stale assets,
+        # instead of an interpreter startup per file
+        if files or os.path.isdir(self.asset_dir):
+            from mods import sync
+            manifest = util.fix_path(os.path.join(self.cache_dir, SYNC_FILE + '.json'))
+            stamp = util.fix_path(os.path.join(self.cache_dir, SYNC_FILE))
+            sync.write_manifest(manifest, files, self.asset_dir, written)
+            n.rule('sync',
+                '%s %s $in $out' % (python, util.fix_path(os.path.join(self.flux_dir, 'mods', 'sync.py'))),
+                description='Copying %s assets and binaries' % self.name,
+                restat=True, # copies keep their source mtime, checked against recorded run time
+            )
+            n.newline()
+            # copies are outputs too, a deleted copy reruns the sync
+            n.build(stamp, 'sync', manifest, implicit=sorted(set(files.values())), implicit_outputs=sorted(files))
+            outputs.append(stamp)
+
+        # assets alias
+        assets = self.name + '_assets'
         n.newline()
-        n.default('all')
+        n.comment('assets alias')
+        n.build(assets, 'phony ' + ' '.join(ninja.escape_path(x) for x in outputs))
+
+        # project alias
+        n.newline()
+        n.comment('project alias')
+        n.build(self.name, 'phony %s %s' % (ninja.escape_path(self.out_file), assets))
 
         n.newline()
         n.close()
@@ -532,6 +658,7 @@ class Project:
                 log.error('asset `%s` not found' % src)
                 return
             self.asset_files.append(path)
+            self.add_asset_inputs(src)
             return
 
         # get name and extension
@@ -571,6 +698,13 @@ class Project:
                     self.ld_opts.append('-F"%s"' % path_dir)
             elif ext in ['.c', '.cc', '.cxx', '.cpp', '.c++', '.m', '.mm', '.asm', '.s']:
 
+                # keep globbed dirs
+                if path_dir.endswith('**'):
+                    for dirpath, _, _ in os.walk(path_dir[:-3]):
+                        self.input_dirs.append(util.fix_path(dirpath))
+                else:
+                    self.input_dirs.append(util.fix_path(path_dir))
+
                 srcs = []
                 if sys.version_info[:2] >= (3, 5):
                     srcs = glob.glob(os.path.join(path_dir, name+ext), recursive=True)
@@ -605,6 +739,7 @@ class Project:
         elif '$(TARGET_ARCH' not in path:
             if os.path.isdir(path):
                 self.asset_files.append(path)
+                self.add_asset_inputs(path)
                 return
             elif not os.path.isfile(path):
                 log.fatal('input file not found "%s"' % path)
@@ -617,7 +752,7 @@ class Project:
             if self.target == 'android':
                 self.java_files.append(path)
         elif ext == '.o':
-            self.obj_files.append(path)
+            self.obj_files.append(util.fix_path(os.path.abspath(path)))
         elif ext == '.lib':
             self.lib_files.append(path)
         elif ext == '.a':
@@ -639,112 +774,68 @@ class Project:
                 pass
         else:
             self.asset_files.append(path)
+            self.add_asset_inputs(path)
 
     #------------------------------------------------------------------------------
-    def copy_assets(self, assets_dir):
-        if not assets_dir.endswith('/'):
-            assets_dir+='/'
+    def add_asset_inputs(self, path):
+        '''keep asset dirs, added or removed assets regenerate ninja file, edited ones are copied by their edges'''
+        if os.path.isdir(path):
+            for dirpath, _, _ in os.walk(path):
+                self.input_dirs.append(util.fix_path(os.path.abspath(dirpath)))
+        else:
+            self.input_dirs.append(util.fix_path(os.path.abspath(util.split_dir(path) or '.')))
+
+    #------------------------------------------------------------------------------
+    def get_asset_files(self):
+        '''returns {dst: src} asset files, `src@/dst` inputs are copied to `dst` dir of out dir'''
         asset_files = {}
-        for src in self.asset_files:
-            dst = assets_dir
-            if src.find('@/'):
-                src, _, dst = src.partition('@/')
-                if not dst.endswith('/') and dst != '':
-                    dst+='/'
+        for asset in self.asset_files:
+            src, _, dst = asset.partition('@/')
+            if not dst.endswith('/') and dst != '':
+                dst+='/'
+            src = os.path.join(self.proj_dir, src)
             if os.path.isfile(src):
                 dst+=util.strip_dir(src)
-                self.enum_asset_files(src, dst, asset_files)
-            elif os.path.isdir(src):
-                self.enum_asset_files(src, dst, asset_files)
-        if not len(asset_files):
-            return
-
-        # remove dest assets dir
-        if os.path.exists(assets_dir):
-            rmtree(assets_dir)
-
-        # create dest assets dir
-        for src, dst in asset_files.items():
-            if dst.startswith(self.out_dir):
-                os.makedirs(assets_dir)
-                break
-
-        # copy asset files
-        self.copy_asset_files(asset_files)
+            self.enum_asset_files(src, dst, asset_files)
+        return asset_files
 
     #------------------------------------------------------------------------------
-    def copy_binaries(self, bins_dir):
-        if not bins_dir.endswith('/'):
-            bins_dir+='/'
-        for src in self.bin_files:
-            bdir = bins_dir
+    def get_transform(self, src):
+        '''returns first transform rule matching file extension, None if copied as is'''
+        ext = util.split_ext(src).lower()
+        for rule in self.transforms:
+            if ext in rule['ext']:
+                return rule
+        return None
 
-            ext = util.split_ext(src)
-            if ext != '':
-                # dylibs for in Contents/MacOS dir...
-                if ext == '.dylib':
-                    bdir = os.path.abspath(bdir+'/')
-                # frameworks go in app Contents/Frameworks dir
-                elif ext == '.framework':
-                    bdir = os.path.abspath(bdir+'../Frameworks/')
-            dst = bdir + util.strip_dir(src)
-
-            #FIXME: Hack for copying frameworks on macos!
-            if self.target == 'macos':
-                if util.split_ext(dst).lower() == '.framework':
-                    os.makedirs(util.split_dir(dst))
-                    log.trace('copy_binairies: make dst dir...`%s`' % util.split_dir(dst))
-                    if not subprocess.call('rm -f -R '+dst):
-                        log.failed('copy_binaires: `rm`', 'failed')
-                    if not subprocess.call('cp -f -R '+src+' '+dst):
-                        log.failed('copy_binaires: `cp`', 'failed')
-
-            if not self.copy_all(src, dst):
-                log.failed('copy_binaires: copy `%s` to `%s`' % (src, dst), 'failed')
+    #------------------------------------------------------------------------------
+    def get_transform_name(self, name, rule):
+        '''returns transformed file name of `name`'''
+        if rule['out']:
+            return os.path.splitext(name)[0] + rule['out']
+        if rule['run'] in transform.BUILTINS:
+            return name + transform.BUILTINS[rule['run']]
+        return name
 
     #------------------------------------------------------------------------------
-    def copy_asset_files(self, files):
-        for dst, src in files.items():
-            # create dest dir if not exist
-            if not os.path.exists(util.split_dir(dst)):
-                os.makedirs(util.split_dir(dst))
-            # copy file from src to dest
-            copyfile(src, dst)
-            # check if copy exist
-            if os.path.exists(dst):
-                continue
-            log.fatal('error copying asset file `%s` to `%s`' % (src, dst))
+    def get_binary_files(self):
+        '''returns {dst: src} binary files, copied next to out file'''
+        bin_files = {}
+        for src in self.bin_files:
+            dst = util.fix_path(os.path.join(self.out_dir, util.strip_dir(src)))
+            if dst not in bin_files:
+                bin_files[dst] = util.fix_path(os.path.join(self.proj_dir, src))
+        return bin_files
 
     #------------------------------------------------------------------------------
     def enum_asset_files(self, src, dst, files):
         if os.path.isfile(src):
-            src = os.path.join(self.proj_dir, src)
-            dst = os.path.join(self.out_dir, dst)
+            dst = util.fix_path(os.path.join(self.out_dir, dst))
             if dst not in files:
-                files[dst] = src
+                files[dst] = util.fix_path(src)
         elif os.path.isdir(src):
             for f in os.listdir(src):
-                self.enum_asset_files(os.path.join(self.base_dir, src, f), os.path.join(self.out_dir, dst, f), files)
-
-    #------------------------------------------------------------------------------
-    def copy_all(self, src, dst):
-        if os.path.isfile(src):
-            if not os.makedirs(util.split_dir(dst)): 
-                return False
-            if not copyfile(src, dst): 
-                return False
-            log.trace('copy_all: make dirs...`%s`' % util.split_dir(dst))
-            return True
-        elif os.path.isdir(src):
-            if not os.makedirs(dst): 
-                return False
-            log.trace('copy_all: make dirs...`%s`' % dst)
-            for file in os.listdir(src):
-                if not self.copy_all(os.path.join(src, file), os.path.join(dst, file)) : 
-                    return False
-                log.trace('copy_all: `%s` to `%s`' % (os.path.join(src, file), os.path.join(dst, file)))
-            return True
-        return False
+                self.enum_asset_files(os.path.join(src, f), os.path.join(dst, f), files)
 
     #------------------------------------------------------------------------------
     def make_info_plist(self):
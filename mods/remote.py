@@ -0,0 +1,252 @@
+"""flux remote cache: content-addressed blobs over HTTP GET/PUT
+
+`FLUX_CACHE_REMOTE` env var sets the remote cache url, e.g. `http://cache-host:8088`,
+`flux cache-server` serves a local dir with the same protocol. uploads are
+authenticated with the `FLUX_CACHE_REMOTE_TOKEN` shared token, a server
+without token is read-only."""
+
+import os, sys, re, time, socket, tempfile, hmac
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import URLError, HTTPError
+except ImportError:
+    from urllib2 import Request, urlopen, URLError, HTTPError
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+#------------------------------------------------------------------------------
+
+TIMEOUT = 2.0     # default request timeout (seconds)
+RETRY_DELAY = 60  # skip unreachable remote cache during delay (seconds)
+MAX_SIZE = 256    # default max uploaded blob size (MB)
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
+#------------------------------------------------------------------------------
+
+class HttpBackend:
+    '''Remote cache backend, blobs are `<url>/<key>`'''
+
+    #------------------------------------------------------------------------------
+    def __init__(self, url, timeout, readonly, token=''):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.readonly = readonly
+        self.token = token
+
+    #------------------------------------------------------------------------------
+    def get(self, key):
+        '''returns blob data, None if missing'''
+        try:
+            res = urlopen(self.url + '/' + key, timeout=self.timeout)
+            try:
+                return res.read()
+            finally:
+                res.close()
+        except HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    #------------------------------------------------------------------------------
+    def put(self, key, data):
+        if self.readonly:
+            return
+        req = Request(self.url + '/' + key, data=data)
+        req.add_header('Content-Type', 'application/octet-stream')
+        if self.token:
+            req.add_header('Authorization', 'Bearer ' + self.token)
+        req.get_method = lambda: 'PUT'
+        urlopen(req, timeout=self.timeout).close()
+
+#------------------------------------------------------------------------------
+
+# remote cache backends: url scheme: backend class
+backends = {
+    'http': HttpBackend,
+    'https': HttpBackend,
+}
+
+#------------------------------------------------------------------------------
+def get_backend():
+    '''returns remote cache backend from env vars, None if not set'''
+    url = os.environ.get('FLUX_CACHE_REMOTE', '')
+    if not url:
+        return None
+    scheme = url.partition(':')[0].lower()
+    if scheme not in backends:
+        sys.stderr.write('flux: unsupported remote cache `%s`\n' % url)
+        return None
+    timeout = os.environ.get('FLUX_CACHE_REMOTE_TIMEOUT', '')
+    timeout = float(timeout) if timeout.replace('.', '', 1).isdigit() else TIMEOUT
+    readonly = os.environ.get('FLUX_CACHE_REMOTE_READONLY', '0') != '0'
+    return backends[scheme](url, timeout, readonly, get_token())
+
+#------------------------------------------------------------------------------
+def get_token():
+    '''returns uploads shared token, from `FLUX_CACHE_REMOTE_TOKEN` env var'''
+    return os.environ.get('FLUX_CACHE_REMOTE_TOKEN', '')
+
+#------------------------------------------------------------------------------
+def is_down(cache_dir):
+    '''remote cache failed recently, don't make each launcher wait for timeout'''
+    try:
+        return time.time() - os.path.getmtime(os.path.join(cache_dir, 'remote-down')) < RETRY_DELAY
+    except OSError:
+        return False
+
+#------------------------------------------------------------------------------
+def set_down(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'remote-down'), 'w') as f:
+            f.write('%d\n' % time.time())
+    except (IOError, OSError):
+        pass
+
+#------------------------------------------------------------------------------
+def fetch(cache_dir, key):
+    '''returns blob from remote cache, None if missing or on failure'''
+    backend = get_backend()
+    if not backend or is_down(cache_dir):
+        return None
+    try:
+        return backend.get(key)
+    except (URLError, HTTPError, socket.error, socket.timeout, IOError):
+        set_down(cache_dir)
+        return None
+
+#------------------------------------------------------------------------------
+def push(cache_dir, key, data):
+    '''upload blob to remote cache, returns True on success'''
+    backend = get_backend()
+    if not backend or backend.readonly or is_down(cache_dir):
+        return False
+    try:
+        backend.put(key, data)
+        return True
+    except HTTPError:
+        # upload refused, e.g. missing token: remote cache is still up for fetches
+        return False
+    except (URLError, socket.error, socket.timeout, IOError):
+        set_down(cache_dir)
+        return False
+
+#------------------------------------------------------------------------------
+
+class ServerHandler(BaseHTTPRequestHandler):
+    '''GET/HEAD/PUT blobs in server dir, PUT requires server token'''
+
+    timeout = 30 # slow or stalled clients don't hold a thread forever
+
+    #------------------------------------------------------------------------------
+    def get_file(self):
+        key = self.path.strip('/')
+        if not KEY_PATTERN.match(key):
+            self.send_error(400, 'invalid key')
+            return None
+        return os.path.join(self.server.blobs_dir, key[:2], key)
+
+    #------------------------------------------------------------------------------
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    #------------------------------------------------------------------------------
+    def do_GET(self, head=False):
+        file = self.get_file()
+        if not file:
+            return
+        if not os.path.isfile(file):
+            self.send_error(404, 'not found')
+            return
+        with open(file, 'rb') as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(data)
+
+    #------------------------------------------------------------------------------
+    def is_authorized(self):
+        token = self.server.token
+        auth = self.headers.get('Authorization', '')
+        return bool(token) and hmac.compare_digest(auth.encode('utf-8'), ('Bearer ' + token).encode('utf-8'))
+
+    #------------------------------------------------------------------------------
+    def do_PUT(self):
+        if not self.is_authorized():
+            self.send_error(403, 'uploads require a valid token')
+            return
+        file = self.get_file()
+        if not file:
+            return
+        length = self.headers.get('Content-Length')
+        if not length or not length.isdigit():
+            self.send_error(411, 'length required')
+            return
+        length = int(length)
+        if length > self.server.max_size:
+            self.send_error(413, 'blob too large')
+            return
+        data = self.rfile.read(length)
+        # truncated uploads would be served forever
+        if len(data) != length:
+            self.send_error(400, 'incomplete upload')
+            return
+        if not os.path.isdir(os.path.dirname(file)):
+            try:
+                os.makedirs(os.path.dirname(file))
+            except OSError:
+                pass
+        # blobs are content-addressed, a complete blob is never rewritten
+        if not os.path.isfile(file):
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(file), prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            try:
+                os.rename(tmp, file)
+            except OSError:
+                os.remove(tmp)
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    #------------------------------------------------------------------------------
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+#------------------------------------------------------------------------------
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+#------------------------------------------------------------------------------
+def create_server(blobs_dir, host, port, token='', max_size=MAX_SIZE, verbose=False):
+    '''returns blobs dir server, uploads require `token`, `max_size` is max blob size (MB)'''
+    if not os.path.isdir(blobs_dir):
+        os.makedirs(blobs_dir)
+    server = Server((host, port), ServerHandler)
+    server.blobs_dir = blobs_dir
+    server.token = token
+    server.max_size = max_size * 1024 * 1024
+    server.verbose = verbose
+    return server
+
+#------------------------------------------------------------------------------
+def serve(blobs_dir, host, port, token='', max_size=MAX_SIZE, verbose=False):
+    '''serve blobs dir until interrupted'''
+    server = create_server(blobs_dir, host, port, token, max_size, verbose)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
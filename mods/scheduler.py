@@ -0,0 +1,115 @@
+"""dependency-aware task scheduler"""
+
+import threading
+
+from mods import log
+
+#------------------------------------------------------------------------------
+
+class Task:
+    '''Scheduled task'''
+
+    #------------------------------------------------------------------------------
+    def __init__(self, name, func, deps, weight):
+        self.name = name
+        self.func = func
+        self.deps = deps
+        self.weight = weight
+
+        # task states: 'pending', 'running', 'done', 'failed', 'skipped'
+        self.state = 'pending'
+        self.result = None
+
+#------------------------------------------------------------------------------
+
+class Scheduler:
+    '''Run tasks concurrently in dependency order within a global job budget'''
+
+    #------------------------------------------------------------------------------
+    def __init__(self, jobs):
+        self.jobs = max(1, jobs)
+        self.tasks = {}
+        self.order = [] # task names in insertion order
+        self.running = 0 # sum of running tasks weight
+        self.cond = threading.Condition()
+
+    #------------------------------------------------------------------------------
+    def add(self, name, func, deps=None, weight=1):
+        '''add a task, `func` returns False (or raises) on failure, `weight` is the number of jobs used by the task'''
+        if name in self.tasks:
+            log.fatal('scheduler: task `%s` already added' % name)
+        self.tasks[name] = Task(name, func, list(deps or []), min(max(1, weight), self.jobs))
+        self.order.append(name)
+
+    #------------------------------------------------------------------------------
+    def run(self):
+        '''run all tasks, returns True if all tasks succeeded'''
+        for task in self.tasks.values():
+            for dep in task.deps:
+                if dep not in self.tasks:
+                    log.fatal('scheduler: task `%s` depends on unknown task `%s`' % (task.name, dep))
+
+        with self.cond:
+            while True:
+                self.skip_failed()
+                for name in self.order:
+                    task = self.tasks[name]
+                    if task.state == 'pending' and self.is_ready(task):
+                        # keep within budget, but always let one task run
+                        if self.running and self.running + task.weight > self.jobs:
+                            continue
+                        self.start(task)
+                if not self.running:
+                    break
+                self.cond.wait()
+
+        return all(task.state == 'done' for task in self.tasks.values())
+
+    #------------------------------------------------------------------------------
+    def succeeded(self, name):
+        return name in self.tasks and self.tasks[name].state == 'done'
+
+    #------------------------------------------------------------------------------
+    def is_ready(self, task):
+        return all(self.tasks[dep].state == 'done' for dep in task.deps)
+
+    #------------------------------------------------------------------------------
+    def skip_failed(self):
+        '''skip pending tasks which depend on failed or skipped tasks'''
+        changed = True
+        while changed:
+            changed = False
+            for name in self.order:
+                task = self.tasks[name]
+                if task.state != 'pending':
+                    continue
+                for dep in task.deps:
+                    if self.tasks[dep].state in ['failed', 'skipped']:
+                        log.error('skipping `%s`: `%s` failed' % (task.name, dep))
+                        task.state = 'skipped'
+                        changed = True
+                        break
+
+    #------------------------------------------------------------------------------
+    def start(self, task):
+        task.state = 'running'
+        self.running += task.weight
+        thread = threading.Thread(target=self.execute, args=(task,))
+        thread.daemon = True
+        thread.start()
+
+    #------------------------------------------------------------------------------
+    def execute(self, task):
+        try:
+            task.result = task.func()
+            state = 'failed' if task.result is False else 'done'
+        except SystemExit:
+            # log.fatal() called from task
+            state = 'failed'
+        except Exception as e:
+            log.error('task `%s` failed with "%s"' % (task.name, str(e)))
+            state = 'failed'
+        with self.cond:
+            task.state = state
+            self.running -= task.weight
+            self.cond.notify()
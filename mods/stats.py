@@ -0,0 +1,195 @@
+"""build stats from the workspace ninja log
+
+ninja appends one entry per finished job to the `.ninja_log` of the workspace
+build dir, with start and end times relative to its own start. `flux build`
+records the log inode and the byte range written by each run in `.ninja_runs`,
+runs of a recompacted log, in hash order, are dropped. ninja files regeneration
+restarts the ninja clock within a run. the critical path is walked back from
+the last link: each job waits for the last finished job it may depend on,
+compiles of the same project and archives of its dependencies for archives and
+links."""
+
+import os, json
+
+from mods import log, util, timing
+
+#------------------------------------------------------------------------------
+
+TOP = 10                # default number of listed sources
+RUNS_FILE = '.ninja_runs'   # ninja log ranges of runs, in build dir
+
+#------------------------------------------------------------------------------
+def add_run(build_dir, pos):
+    '''record ninja log range written since `pos` (inode, size), ranges of a recompacted log are dropped'''
+    inode, size = timing.get_log_pos(build_dir)
+    if inode is None:
+        return
+    if pos[0] is not None and pos[0] != inode:
+        # recompacted by this run, its jobs can't be told apart
+        start = size
+    else:
+        start = pos[1] if pos[0] is not None else 0
+    file = os.path.join(build_dir, RUNS_FILE)
+    lines = []
+    try:
+        with open(file, 'r') as f:
+            lines = [x for x in f.read().splitlines() if x.split(' ')[0] == str(inode)]
+    except (IOError, OSError):
+        pass
+    if size > start:
+        lines.append('%d %d %d' % (inode, start, size))
+    with open(file, 'w') as f:
+        f.write(''.join(x + '\n' for x in lines))
+
+#------------------------------------------------------------------------------
+def read_runs(build_dir):
+    '''returns ninja log jobs `[(start ms, end ms, output)]` by run, oldest first'''
+    try:
+        with open(os.path.join(build_dir, RUNS_FILE), 'r') as f:
+            ranges = [x.split(' ') for x in f.read().splitlines()]
+        f = open(os.path.join(build_dir, timing.NINJA_LOG), 'rb')
+    except (IOError, OSError):
+        return []
+
+    runs = []
+    with f:
+        inode = str(os.fstat(f.fileno()).st_ino)
+        for fields in ranges:
+            if len(fields) != 3 or fields[0] != inode:
+                continue
+            f.seek(int(fields[1]))
+            lines = f.read(int(fields[2]) - int(fields[1])).decode('utf-8', 'replace').splitlines()
+            # jobs are logged when they end, a lower end time is a new ninja clock after regeneration
+            jobs = []
+            offset = last_end = 0
+            for start, end, output in timing.parse_ninja_log(lines):
+                if end + offset < last_end:
+                    offset = last_end
+                jobs.append((start + offset, end + offset, output))
+                last_end = end + offset
+            if jobs:
+                runs.append(jobs)
+    return runs
+
+#------------------------------------------------------------------------------
+def get_unit(output, out_dir):
+    '''returns source name of compile job output, relative to project dir'''
+    if out_dir and output.startswith(out_dir + '/'):
+        unit = output[len(out_dir) + 1:]
+        if unit.startswith('build/'):
+            unit = unit[len('build/'):]
+    elif '/flux-proj/' in output:
+        # <proj>/flux-proj/<profile>/build/<source>.o
+        unit = '/'.join(output.split('/flux-proj/', 1)[1].split('/')[2:])
+    else:
+        unit = output
+    return os.path.splitext(unit)[0]
+
+#------------------------------------------------------------------------------
+def get_stats(run, ws_dir, out_dirs=None, deps=None, projects=None):
+    '''returns stats of run jobs, `out_dirs` maps project out dirs to names, `deps` project names to dependencies names,
+    jobs of `projects` only if any'''
+    out_dirs = out_dirs or {}
+    jobs = []
+    for start, end, output in run:
+        output = util.fix_path(os.path.join(ws_dir, output))
+        kind = timing.get_job_kind(output)
+        proj = timing.WORKSPACE if kind == 'regenerate' else timing.get_job_project(output, out_dirs)
+        if projects and proj not in projects:
+            continue
+        out_dir = [x for x, name in out_dirs.items() if name == proj]
+        name = get_unit(output, out_dir[0] if out_dir else None) if kind == 'compile' else util.strip_dir(output)
+        jobs.append({'project': proj, 'kind': kind, 'name': name, 'start': start / 1000.0, 'end': end / 1000.0})
+    if not jobs:
+        return None
+
+    wall = max(x['end'] for x in jobs) - min(x['start'] for x in jobs)
+    cpu = sum(x['end'] - x['start'] for x in jobs)
+    stats = {
+        'jobs': len(jobs),
+        'wall': wall,
+        'cpu': cpu,
+        'parallelism': cpu / wall if wall else 1.0,
+        'projects': {},
+        'units': {},
+        'critical': [],
+    }
+    for job in jobs:
+        proj = stats['projects'].setdefault(job['project'], {'jobs': 0, 'cpu': 0.0})
+        proj['jobs'] += 1
+        proj['cpu'] += job['end'] - job['start']
+        if job['kind'] == 'compile':
+            stats['units']['%s: %s' % (job['project'], job['name'])] = job['end'] - job['start']
+
+    # critical path, walked back from last link
+    links = [x for x in jobs if x['kind'] == 'link']
+    job = max(links or jobs, key=lambda x: x['end'])
+    path = [job]
+    while job['kind'] in ['link', 'archive']:
+        def waits_for(x):
+            if x['end'] > job['start'] or x is job:
+                return False
+            if x['project'] == job['project']:
+                return x['kind'] == 'compile'
+            if deps is not None:
+                return x['kind'] == 'archive' and x['project'] in deps.get(job['project'], [])
+            return x['kind'] == 'archive'
+        prev = [x for x in jobs if waits_for(x)]
+        if not prev:
+            break
+        job = max(prev, key=lambda x: x['end'])
+        path.append(job)
+    stats['critical'] = [[x['project'], x['kind'], x['name'], x['start'], x['end']] for x in reversed(path)]
+    return stats
+
+#------------------------------------------------------------------------------
+def report(stats, top=TOP):
+    log.text('\nbuild stats: %d jobs, wall %.3fs, cpu %.3fs, parallelism %.1fx' % (stats['jobs'], stats['wall'], stats['cpu'], stats['parallelism']))
+
+    log.text('\nprojects:')
+    for name, proj in sorted(stats['projects'].items(), key=lambda x: -x[1]['cpu']):
+        log.item('  %s' % name, '%8.3fs %6d jobs' % (proj['cpu'], proj['jobs']))
+
+    units = sorted(stats['units'].items(), key=lambda x: -x[1])[:top]
+    if units:
+        log.text('\nslowest sources:')
+        for name, secs in units:
+            log.item('  %s' % name, '%8.3fs' % secs, 40)
+
+    log.text('\ncritical path:')
+    for proj, kind, name, start, end in stats['critical']:
+        log.item('  %s %s' % (kind, name if kind == 'compile' else '%s: %s' % (proj, name)), '%8.3fs (at %.3fs)' % (end - start, start), 40)
+
+#------------------------------------------------------------------------------
+def report_delta(stats, base, base_name, top=TOP):
+    '''compare stats with base stats'''
+    def delta(new, old):
+        return '%+.3fs (%+.0f%%)' % (new - old, (new - old) * 100 / old if old else 0)
+
+    log.text('\ncompared with %s:' % base_name)
+    log.item('  wall', '%8.3fs %s' % (stats['wall'], delta(stats['wall'], base['wall'])))
+    log.item('  cpu', '%8.3fs %s' % (stats['cpu'], delta(stats['cpu'], base['cpu'])))
+    log.item('  parallelism', '%8.1fx %+.1fx' % (stats['parallelism'], stats['parallelism'] - base['parallelism']))
+    for name in sorted(set(stats['projects']) | set(base['projects'])):
+        new = stats['projects'].get(name, {'cpu': 0.0})['cpu']
+        old = base['projects'].get(name, {'cpu': 0.0})['cpu']
+        log.item('  %s' % name, '%8.3fs %s' % (new, delta(new, old)))
+
+    changes = []
+    for name in set(stats['units']) | set(base['units']):
+        changes.append((stats['units'].get(name, 0.0) - base['units'].get(name, 0.0), name))
+    changes = [x for x in sorted(changes, key=lambda x: -abs(x[0])) if x[0]][:top]
+    if changes:
+        log.text('\nsources with largest changes:')
+        for secs, name in changes:
+            log.item('  %s' % name, '%+8.3fs' % secs, 40)
+
+#------------------------------------------------------------------------------
+def load(file):
+    with open(file, 'r') as f:
+        return json.load(f)
+
+#------------------------------------------------------------------------------
+def save(file, stats):
+    with open(file, 'w') as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
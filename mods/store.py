@@ -0,0 +1,241 @@
+"""flux prebuilt modules store
+
+a built module archive is published keyed by the module git revision, its
+project file, the build profile and its dependencies keys. later builds fetch
+the archive instead of building the module, its include dirs and libs are still
+read from its project file. least recently used artifacts are evicted when the
+store exceeds `FLUX_STORE_SIZE` MB.
+
+run by the check rule of workspace ninja file, updates prebuilt module tree stamp:
+    python mods/store.py <module dir> <stamp>"""
+
+import os, sys, json, hashlib, shutil, tempfile
+
+if __name__ == '__main__':
+    # run by ninja, import flux modules from flux dir
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from urllib.request import url2pathname
+except ImportError:
+    from urllib import url2pathname
+
+from mods import log, util
+from mods.tools import git
+
+#------------------------------------------------------------------------------
+
+STORE_DIR = 'store'             # default store dir, in workspace intermediate dir
+STORE_SIZE = 2048               # default max store size (MB)
+KEY_FILE  = 'artifact.key'      # key of fetched or published module archive, in module out dir
+META_FILE = 'artifact.json'
+TREE_FILE = 'artifact.tree'     # git tree state of prebuilt module, in module out dir
+
+#------------------------------------------------------------------------------
+
+class DirBackend:
+    '''Store artifacts in a local dir or a file share, `<dir>/<key[:2]>/<key>/`'''
+
+    #------------------------------------------------------------------------------
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+    #------------------------------------------------------------------------------
+    def get_dir(self, key):
+        return os.path.join(self.store_dir, key[:2], key)
+
+    #------------------------------------------------------------------------------
+    def fetch(self, key, out_file):
+        '''copy artifact archive to `out_file`, returns artifact metadata, None if missing'''
+        artifact_dir = self.get_dir(key)
+        try:
+            with open(os.path.join(artifact_dir, META_FILE), 'r') as f:
+                meta = json.load(f)
+            out_dir = os.path.dirname(out_file)
+            if not os.path.isdir(out_dir):
+                os.makedirs(out_dir)
+            # copy then rename, a killed fetch doesn't leave a truncated archive
+            tmp_file = out_file + '.tmp'
+            shutil.copyfile(os.path.join(artifact_dir, meta['out_file']), tmp_file)
+            if os.path.isfile(out_file):
+                os.remove(out_file)
+            os.rename(tmp_file, out_file)
+            # least recently used artifacts are evicted first
+            try:
+                os.utime(artifact_dir, None)
+            except OSError:
+                pass
+            return meta
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    #------------------------------------------------------------------------------
+    def publish(self, key, out_file, meta):
+        '''copy archive and metadata to store'''
+        artifact_dir = self.get_dir(key)
+        if os.path.isdir(artifact_dir):
+            return
+        parent_dir = os.path.dirname(artifact_dir)
+        if not os.path.isdir(parent_dir):
+            os.makedirs(parent_dir)
+        # write in temp dir then rename, an artifact is complete or missing
+        tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix='.tmp-')
+        shutil.copyfile(out_file, os.path.join(tmp_dir, meta['out_file']))
+        with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2, sort_keys=True)
+        try:
+            os.rename(tmp_dir, artifact_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    #------------------------------------------------------------------------------
+    def trim(self, max_size):
+        '''evict least recently used artifacts until store size fits in `max_size`, returns evicted artifacts count'''
+        if not os.path.isdir(self.store_dir):
+            return 0
+
+        artifacts = []
+        total = 0
+        for prefix in os.listdir(self.store_dir):
+            prefix_dir = os.path.join(self.store_dir, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                artifact_dir = os.path.join(prefix_dir, name)
+                if name.startswith('.tmp-'):
+                    continue # being published
+                try:
+                    size = sum(os.path.getsize(os.path.join(artifact_dir, x)) for x in os.listdir(artifact_dir))
+                    artifacts.append((os.path.getmtime(artifact_dir), size, artifact_dir))
+                except OSError:
+                    continue
+                total += size
+
+        if total <= max_size:
+            return 0
+
+        # evict down to 90% of max size, don't trim on each publish
+        count = 0
+        for _, size, artifact_dir in sorted(artifacts):
+            if total <= max_size * 0.9:
+                break
+            shutil.rmtree(artifact_dir, ignore_errors=True)
+            total -= size
+            count += 1
+        return count
+
+#------------------------------------------------------------------------------
+def get_backend(flux_dir):
+    '''returns store backend from `FLUX_STORE` env var: a dir or a `file://` url, `0` disables store'''
+    store = os.environ.get('FLUX_STORE', '')
+    if store == '0':
+        return None
+    if not store:
+        from mods import project
+        return DirBackend(util.fix_path(os.path.join(util.get_workspace_dir(flux_dir), project.FDIR, STORE_DIR)))
+    if store.startswith('file://'):
+        return DirBackend(url2pathname(store[len('file://'):]))
+    if '://' in store:
+        log.warn('unsupported store `%s`, prebuilt modules disabled' % store)
+        return None
+    return DirBackend(store)
+
+#------------------------------------------------------------------------------
+def get_max_size():
+    '''returns max store size in bytes, from `FLUX_STORE_SIZE` env var (MB)'''
+    size = os.environ.get('FLUX_STORE_SIZE', '')
+    return (int(size) if size.isdigit() else STORE_SIZE) * 1024 * 1024
+
+#------------------------------------------------------------------------------
+def hash_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+#------------------------------------------------------------------------------
+def get_key(proj, target_file, build_opts, dep_keys):
+    '''returns module artifact key, None if module has local changes or is not in a git repo'''
+    if None in dep_keys:
+        return None
+    from mods import project
+    proj_dir = util.fix_path(os.path.abspath(proj.proj_dir))
+    tree = git.get_tree(proj_dir)
+    if not tree or git.is_dirty(proj_dir, ignore=project.FDIR):
+        return None
+    h = hashlib.sha1(project.VERSION.encode('utf-8'))
+    for item in [tree, hash_file(proj.flux_file), hash_file(target_file), build_opts.profile] + build_opts.opts_args + dep_keys:
+        h.update(b'\0' + item.encode('utf-8'))
+    return h.hexdigest()
+
+#------------------------------------------------------------------------------
+def get_stamp(proj):
+    '''returns key of module archive in out dir'''
+    try:
+        with open(os.path.join(proj.out_dir, KEY_FILE), 'r') as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+#------------------------------------------------------------------------------
+def set_stamp(proj, key):
+    stamp_file = os.path.join(proj.out_dir, KEY_FILE)
+    if key:
+        with open(stamp_file, 'w') as f:
+            f.write(key + '\n')
+    elif os.path.isfile(stamp_file):
+        os.remove(stamp_file)
+
+#------------------------------------------------------------------------------
+def fetch(backend, proj, key):
+    '''fetch module archive, returns True if module is prebuilt'''
+    if get_stamp(proj) == key and os.path.isfile(proj.out_file):
+        return True
+    if not backend.fetch(key, proj.out_file):
+        return False
+    set_stamp(proj, key)
+    return True
+
+#------------------------------------------------------------------------------
+def publish(backend, proj, key):
+    '''publish built module archive'''
+    meta = {
+        'name': proj.name,
+        'key': key,
+        'profile': proj.profile,
+        'out_file': os.path.basename(proj.out_file),
+    }
+    backend.publish(key, proj.out_file, meta)
+    set_stamp(proj, key)
+
+#------------------------------------------------------------------------------
+def get_tree_state(proj_dir):
+    '''returns git tree hash of module dir, marked dirty on local changes'''
+    tree = git.get_tree(proj_dir) or ''
+    # intermediate dir name, not imported from project: run by ninja on each build
+    if git.is_dirty(proj_dir, ignore='flux-proj'):
+        tree += ' dirty'
+    return tree
+
+#------------------------------------------------------------------------------
+def get_tree_stamp(proj):
+    return util.fix_path(os.path.join(proj.out_dir, TREE_FILE))
+
+#------------------------------------------------------------------------------
+def update_tree_stamp(proj_dir, stamp_file):
+    '''write module tree state to stamp, left untouched if unchanged: commits, checkouts and edits regenerate ninja files'''
+    state = get_tree_state(proj_dir) + '\n'
+    try:
+        with open(stamp_file, 'r') as f:
+            if f.read() == state:
+                return 0
+    except (IOError, OSError):
+        pass
+    with open(stamp_file, 'w') as f:
+        f.write(state)
+    return 0
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.stderr.write('usage: store.py <module dir> <stamp>\n')
+        sys.exit(1)
+    sys.exit(update_tree_stamp(sys.argv[1], sys.argv[2]))
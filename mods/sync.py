@@ -0,0 +1,192 @@
+"""incremental files sync
+
+run by sync rules of project ninja files, copies changed or missing manifest
+files in one process, in parallel threads, then removes stale files of the
+manifest root dir:
+    python mods/sync.py <manifest> <stamp>
+
+a destination file is up to date when its size and mtime match the source
+file ones, copies keep the source mtime. `FLUX_SYNC_HASH=1` env var also
+compares contents of files with different mtimes, touched but unchanged files
+aren't copied again. `FLUX_SYNC_MODE` env var sets how files are synced:
+`copy` (default), `hardlink` or `reflink` (copy-on-write clone), the last two
+fall back to copies across filesystems."""
+
+import os, sys, json, shutil
+
+if __name__ == '__main__':
+    # run by ninja, import flux modules from flux dir
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mods import util, hashdb
+
+#------------------------------------------------------------------------------
+
+MODES = ['copy', 'hardlink', 'reflink']
+
+FICLONE = 0x40049409 # linux ioctl: share source file extents
+
+#------------------------------------------------------------------------------
+def get_mode():
+    mode = os.environ.get('FLUX_SYNC_MODE', 'copy')
+    if mode not in MODES:
+        sys.stderr.write('warn: unknown sync mode `%s` (%s), files are copied\n' % (mode, ', '.join(MODES)))
+        return 'copy'
+    return mode
+
+#------------------------------------------------------------------------------
+def get_num_jobs():
+    '''copies wait on disk more than on cpu'''
+    return min(32, util.get_num_cpucores() * 4)
+
+#------------------------------------------------------------------------------
+def is_hash_enabled():
+    return os.environ.get('FLUX_SYNC_HASH', '0') != '0'
+
+#------------------------------------------------------------------------------
+def is_up_to_date(src, dst, mode, check_hash):
+    try:
+        dst_st = os.stat(dst)
+    except OSError:
+        return False
+    src_st = os.stat(src)
+    if mode == 'hardlink' and os.path.samestat(src_st, dst_st):
+        return True
+    if src_st.st_size != dst_st.st_size:
+        return False
+    if hashdb.get_mtime(src_st) == hashdb.get_mtime(dst_st):
+        return True
+    if check_hash and hashdb.hash_file(src) == hashdb.hash_file(dst):
+        hashdb.set_mtime(dst, hashdb.get_mtime(src_st))
+        return True
+    return False
+
+#------------------------------------------------------------------------------
+def clone_file(src, dst):
+    '''copy-on-write clone, returns False if not supported'''
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, 'rb') as s:
+            with open(dst, 'wb') as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except (IOError, OSError):
+        return False
+
+#------------------------------------------------------------------------------
+def sync_file(src, dst, mode):
+    dst_dir = util.split_dir(dst)
+    if not os.path.isdir(dst_dir):
+        try:
+            os.makedirs(dst_dir)
+        except OSError:
+            if not os.path.isdir(dst_dir): # made concurrently
+                raise
+
+    # new file replaces old one: a killed sync doesn't leave a truncated file
+    # and a hardlinked old file doesn't write through to its source
+    tmp_file = dst + '.tmp'
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    done = False
+    if mode == 'hardlink':
+        try:
+            os.link(src, tmp_file)
+            done = True
+        except (OSError, AttributeError):
+            pass
+    elif mode == 'reflink':
+        done = clone_file(src, tmp_file)
+    if not done:
+        shutil.copyfile(src, tmp_file)
+        shutil.copystat(src, tmp_file)
+    if os.path.exists(dst):
+        os.remove(dst)
+    os.rename(tmp_file, dst)
+
+#------------------------------------------------------------------------------
+def remove_stale_files(root_dir, keep):
+    '''remove files of `root_dir` not in `keep` and empty dirs, returns number of removed files'''
+    count = 0
+    for dir, dirs, files in os.walk(root_dir, topdown=False):
+        for file in files:
+            path = os.path.normpath(os.path.join(dir, file))
+            if path not in keep:
+                os.remove(path)
+                count += 1
+        if dir != root_dir and not os.listdir(dir):
+            os.rmdir(dir)
+    return count
+
+#------------------------------------------------------------------------------
+def write_manifest(file, files, root_dir=None, keep=None):
+    '''write sync manifest of `{dst: src}` files, stale files of `root_dir` not in `keep` are removed,
+    left untouched if unchanged, returns True if written'''
+    content = json.dumps({
+        'files': sorted([dst, src] for dst, src in files.items()),
+        'root': root_dir or '',
+        'keep': sorted(keep or []),
+    }, indent=1)
+    if os.path.isfile(file):
+        with open(file, 'r') as f:
+            if f.read() == content:
+                return False
+    with open(file, 'w') as f:
+        f.write(content)
+    return True
+
+#------------------------------------------------------------------------------
+def run(manifest_file, stamp_file):
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    mode = get_mode()
+    check_hash = is_hash_enabled()
+
+    def sync(item):
+        '''returns error message, None if synced'''
+        dst, src = item
+        try:
+            if not is_up_to_date(src, dst, mode, check_hash):
+                sync_file(src, dst, mode)
+        except (IOError, OSError) as e:
+            return 'error copying file `%s` to `%s`: %s' % (src, dst, e)
+        return None
+
+    # a pool isn't worth its threads for a few files
+    files = manifest['files']
+    if len(files) <= 4:
+        errors = [sync(x) for x in files]
+    else:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(get_num_jobs(), len(files)))
+        try:
+            errors = pool.map(sync, files)
+        finally:
+            pool.close()
+            pool.join()
+    errors = [x for x in errors if x]
+    if errors:
+        sys.stderr.write(''.join(x + '\n' for x in errors))
+        return 1
+    root_dir = manifest['root']
+    if root_dir and os.path.isdir(root_dir):
+        keep = [x[0] for x in manifest['files']] + manifest['keep']
+        remove_stale_files(os.path.normpath(root_dir), set(os.path.normpath(x) for x in keep))
+    with open(stamp_file, 'w') as f:
+        f.write('%d\n' % len(manifest['files']))
+    return 0
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.stderr.write('usage: sync.py <manifest> <stamp>\n')
+        sys.exit(1)
+    try:
+        sys.exit(run(sys.argv[1], sys.argv[2]))
+    except (IOError, OSError, ValueError, KeyError) as e:
+        sys.stderr.write('error syncing files of `%s`: %s\n' % (sys.argv[1], e))
+        sys.exit(1)
@@ -1,5 +1,5 @@
 
-import os.path
+import os.path, sys
 
 from mods import log, util
 
@@ -45,9 +45,10 @@ class Target:
     def __init__(self, flux_dir, build_opts):
         '''Load target setting values from yaml datas'''
 
-        data = util.load_flux_yaml(os.path.join(util.get_targets_dir(flux_dir), build_opts.target + '.yml'), build_opts)
+        data = util.load_flux_yaml(os.path.join(util.get_targets_dir(flux_dir), build_opts.target + '.yml'), build_opts, flux_dir)
 
         self.data = data
+        self.flux_dir = flux_dir
         self.buildopts = build_opts
         self.target = data['target']
         self.toolchain = data['toolchain'] if data.get('toolchain') else 'gcc'
@@ -86,13 +87,59 @@ class Target:
         self.rules['ar'] = data['rules']['ar']  if data['rules'].get('ar')  else ''
         self.rules['ld'] = data['rules']['ld']  if data['rules'].get('ld')  else ''
 
+        # compile rules launcher, `flux` is flux compile cache
+        self.launcher = data['launcher'] if data.get('launcher') else ''
+
+        # response files: objects (and libs) of archive and link rules passed in `$out.rsp` file
+        self.rspfile = data['rspfile'] if data.get('rspfile') else {}
+        self.rspfile['syntax'] = self.rspfile['syntax'] if self.rspfile.get('syntax') else ''
+        self.rspfile['libs'] = True if self.rspfile.get('libs') else False
+
+        # pools: max parallel jobs of rules, e.g. `ld: 2` for memory heavy links
+        self.pools = {}
+        for rule, depth in (data['pools'] if data.get('pools') else {}).items():
+            if rule not in ['cc', 'cxx', 'as', 'ar', 'ld']:
+                log.fatal('invalid pool `%s` - must be a rule: %s' % (rule, "['cc', 'cxx', 'as', 'ar', 'ld']"))
+            if not str(depth).isdigit() or int(depth) < 1:
+                log.fatal('invalid depth for pool `%s`: `%s` - must be a positive number' % (rule, depth))
+            self.pools[rule] = int(depth)
+
     #------------------------------------------------------------------------------
     def __repr__(self):
         return \
             '%s==== target: %s, %s\n' % (log.YELLOW, self.target, self.toolchain) + \
             '%scommands:%s %s\n' % (log.BLUE, log.DEFAULT, self.cmds) + \
             '%soptions :%s %s\n' % (log.BLUE, log.DEFAULT, self.opts) + \
-            '%srules   :%s %s'   % (log.BLUE, log.DEFAULT, self.rules)
+            '%srules   :%s %s\n' % (log.BLUE, log.DEFAULT, self.rules) + \
+            '%slauncher:%s %s\n' % (log.BLUE, log.DEFAULT, self.launcher) + \
+            '%spools   :%s %s\n' % (log.BLUE, log.DEFAULT, self.pools) + \
+            '%srspfile :%s %s'   % (log.BLUE, log.DEFAULT, self.rspfile)
+
+    #------------------------------------------------------------------------------
+    def get_rsp_rule(self, rule):
+        '''returns archive or link rule using response file, with response file content'''
+        cmd = self.rules[rule]
+        if not self.rspfile['syntax'] or '${project.objs}' not in cmd:
+            return cmd, None
+        cmd = cmd.replace('${project.objs}', self.rspfile['syntax'])
+        content = '$in_newline'
+        if rule == 'ld' and self.rspfile['libs'] and '${project.libs}' in cmd:
+            cmd = cmd.replace('${project.libs}', '')
+            content += ' $libs'
+        return cmd, content
+
+    #------------------------------------------------------------------------------
+    def get_launcher(self):
+        '''returns launcher command of compile rules'''
+        if self.launcher == 'flux':
+            cmd = [sys.executable, os.path.join(self.flux_dir, 'mods', 'cache.py'), self.toolchain]
+            return ' '.join(util.enquote(util.fix_path(x)) if ' ' in x else util.fix_path(x) for x in cmd)
+        return self.launcher
+
+    #------------------------------------------------------------------------------
+    def get_pool(self, rule):
+        '''returns ninja pool name of rule, None if not pooled'''
+        return rule + '_pool' if rule in self.pools else None
 
     #------------------------------------------------------------------------------
     def get_rule_vars(self, proj):
@@ -0,0 +1,139 @@
+"""build phases timing, reported by `-time` build option
+
+flux phases are measured around each project step, ninja jobs durations are
+read from ninja log entries appended by the build and summed by kind."""
+
+import os, time, threading, contextlib
+
+from mods import log, util
+
+#------------------------------------------------------------------------------
+
+NINJA_LOG = '.ninja_log'
+NINJA_FILE = 'build.ninja'
+PREBUILT_STAMP = 'artifact.tree' # prebuilt module check output, see store.TREE_FILE
+WORKSPACE = 'workspace'     # phases of all projects
+
+# (project, phase, secs, jobs), in measure order
+phases = []
+lock = threading.Lock()
+start_time = time.time()
+
+#------------------------------------------------------------------------------
+def add(proj, phase, secs, jobs=None):
+    with lock:
+        phases.append((proj, phase, secs, jobs))
+
+#------------------------------------------------------------------------------
+@contextlib.contextmanager
+def measure(proj, phase):
+    '''measure `with` block duration as project phase'''
+    start = time.time()
+    try:
+        yield
+    finally:
+        add(proj, phase, time.time() - start)
+
+#------------------------------------------------------------------------------
+def get_log_pos(build_dir):
+    '''returns ninja log (inode, size) before a build'''
+    try:
+        st = os.stat(os.path.join(build_dir, NINJA_LOG))
+        return st.st_ino, st.st_size
+    except OSError:
+        return None, 0
+
+#------------------------------------------------------------------------------
+def parse_ninja_log(lines):
+    '''returns [(start ms, end ms, output)] of ninja log lines, one entry per job'''
+    jobs = []
+    last = None
+    for line in lines:
+        fields = line.split('\t')
+        if len(fields) == 5 and not line.startswith('#'):
+            # outputs of the same job follow each other with the same times and command hash
+            job = (fields[0], fields[1], fields[4])
+            if job != last:
+                jobs.append((int(fields[0]), int(fields[1]), fields[3]))
+            last = job
+    return jobs
+
+#------------------------------------------------------------------------------
+def read_ninja_log(build_dir, pos):
+    '''returns [(output, secs)] of ninja log jobs appended since `pos`, None if log was recompacted'''
+    file = os.path.join(build_dir, NINJA_LOG)
+    try:
+        with open(file, 'r') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            if pos[0] is not None and inode != pos[0]:
+                return None
+            f.seek(pos[1] if pos[0] is not None else 0)
+            lines = f.read().splitlines()
+    except (IOError, OSError):
+        return []
+    return [(output, (end - start) / 1000.0) for start, end, output in parse_ninja_log(lines)]
+
+#------------------------------------------------------------------------------
+def get_job_kind(output):
+    '''returns ninja job kind from its output file'''
+    ext = util.split_ext(output).lower()
+    if util.strip_dir(output) == NINJA_FILE:
+        return 'regenerate'
+    if util.strip_dir(output) == PREBUILT_STAMP:
+        return 'prebuilt check'
+    if ext in ['.o', '.obj']:
+        return 'compile'
+    if ext in ['.a', '.lib']:
+        return 'archive'
+    # assets and binaries copies, transforms and packs
+    if '/assets/' in output or ext in ['.pack', '.sync']:
+        return 'assets'
+    return 'link'
+
+#------------------------------------------------------------------------------
+def get_job_project(output, out_dirs):
+    '''returns project name of ninja job output, from `{out_dir: name}` or project dir name'''
+    for out_dir, name in out_dirs.items():
+        if output.startswith(out_dir + '/'):
+            return name
+    if '/flux-proj/' in output:
+        return util.strip_dir(output.split('/flux-proj/')[0])
+    return WORKSPACE
+
+#------------------------------------------------------------------------------
+def add_ninja_jobs(entries, ninja_dir, out_dirs):
+    '''add ninja jobs durations by project and kind'''
+    jobs = {}
+    for output, secs in entries:
+        output = util.fix_path(os.path.join(ninja_dir, output))
+        kind = get_job_kind(output)
+        # ninja files are regenerated all at once
+        proj = WORKSPACE if kind == 'regenerate' else get_job_project(output, out_dirs)
+        key = (proj, 'ninja ' + kind)
+        count, total = jobs.get(key, (0, 0.0))
+        jobs[key] = (count + 1, total + secs)
+    for (proj, phase), (count, secs) in sorted(jobs.items()):
+        add(proj, phase, secs, count)
+
+#------------------------------------------------------------------------------
+def report(json_file=None):
+    '''print phases timing table, write it to `json_file` if any'''
+    total = time.time() - start_time
+    ninja = sum(x[2] for x in phases if x[1] == 'ninja')
+    width = max([len(x[0]) for x in phases] + [len(WORKSPACE)]) + 2
+
+    log.text('\nbuild timing:')
+    log.text('  %s%-20s %9s %6s' % ('project'.ljust(width), 'phase', 'time', 'jobs'))
+    for proj, phase, secs, jobs in phases:
+        log.text('  %s%-20s %8.3fs %6s' % (proj.ljust(width), phase, secs, jobs if jobs is not None else ''))
+    log.text('  total %.3fs: flux %.3fs, ninja %.3fs (ninja jobs are summed, they run in parallel)' % (total, total - ninja, ninja))
+
+    if json_file:
+        import json
+        with open(json_file, 'w') as f:
+            json.dump({
+                'total': total,
+                'ninja': ninja,
+                'phases': [{'project': p, 'phase': n, 'secs': s, 'jobs': j} for p, n, s, j in phases],
+            }, f, indent=2)
+        log.info('build timing written to `%s`' % json_file)
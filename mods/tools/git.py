@@ -1,6 +1,6 @@
 """wrapper for some git commands"""
 
-import re, subprocess
+import os, re, subprocess
 from mods import log
 
 # flux tool desc
@@ -144,4 +144,39 @@ def branches(proj_dir):
                 branches[local_branch] = remote_branch
     except subprocess.CalledProcessError:
         log.error('failed to call "git branch -vv"')
-    return branches
\ No newline at end of file
+    return branches
+
+#------------------------------------------------------------------------------
+
+def rev_parse(proj_dir, *args):
+    '''returns "git rev-parse args" output in the provided dir, None if not a git repo or unknown revision'''
+    if not exists(verbose=False):
+        return None
+    try:
+        with open(os.devnull, 'w') as devnull:
+            output = subprocess.check_output(['git', 'rev-parse'] + list(args), cwd=proj_dir, stderr=devnull).decode('utf-8')
+        return output.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#------------------------------------------------------------------------------
+
+def get_tree(proj_dir):
+    '''returns the tree hash of the provided dir at HEAD revision, changes only with dir contents'''
+    return rev_parse(proj_dir, 'HEAD:./')
+
+#------------------------------------------------------------------------------
+
+def is_dirty(proj_dir, ignore=None):
+    '''checks if the provided dir has uncommitted changes or untracked files, paths containing an `ignore` dir name are skipped'''
+    # don't refresh index file, status runs on each build of prebuilt modules
+    env = dict(os.environ, GIT_OPTIONAL_LOCKS='0')
+    try:
+        output = subprocess.check_output(['git', 'status', '--porcelain', '--', '.'], cwd=proj_dir, env=env).decode('utf-8')
+    except (OSError, subprocess.CalledProcessError):
+        return True
+    for line in output.splitlines():
+        path = line[3:].strip('"')
+        if not ignore or ignore not in path.split('/'):
+            return True
+    return False
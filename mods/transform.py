@@ -0,0 +1,205 @@
+"""asset transforms with a content-addressed results cache
+
+run by transform rules of project ninja files:
+    python mods/transform.py <transform> <version> <src> <dst>
+
+`transform` is a builtin transform (`gzip`, `deflate`) or a python script run
+with `<src> <dst>` arguments. results are cached in workspace
+`flux-proj/transforms` dir, keyed by the transform, its version, the script
+content and the source content, so other profiles and later builds reuse them.
+`FLUX_TRANSFORM_CACHE=0` env var disables the cache, `FLUX_TRANSFORM_CACHE_SIZE`
+sets its max size in MB, least recently used results are evicted first."""
+
+import os, sys, shutil, hashlib
+
+#------------------------------------------------------------------------------
+
+CACHE_DIR = 'transforms'    # results cache dir, in workspace intermediate dir
+CACHE_SIZE = 1024           # default max cache size (MB)
+STORED_FILE = 'stored'      # touched when results are stored, checked before trimming
+KEY_VERSION = '1'           # bump to invalidate all cached results
+
+# builtin transforms: output file suffix
+BUILTINS = {
+    'gzip':     '.gz',
+    'deflate':  '.deflate',
+}
+
+#------------------------------------------------------------------------------
+def get_cache_dir():
+    # flux_dir/mods/transform.py
+    ws_dir = os.environ.get('FLUX_WORKSPACE_DIR')
+    if not ws_dir:
+        ws_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(ws_dir, 'flux-proj', CACHE_DIR)
+
+#------------------------------------------------------------------------------
+def is_cache_enabled():
+    return os.environ.get('FLUX_TRANSFORM_CACHE', '1') != '0'
+
+#------------------------------------------------------------------------------
+def get_max_size():
+    '''returns max cache size in bytes, from `FLUX_TRANSFORM_CACHE_SIZE` env var (MB)'''
+    size = os.environ.get('FLUX_TRANSFORM_CACHE_SIZE', '')
+    return (int(size) if size.isdigit() else CACHE_SIZE) * 1024 * 1024
+
+#------------------------------------------------------------------------------
+def hash_file(path, h):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+
+#------------------------------------------------------------------------------
+def get_key(transform, version, src):
+    h = hashlib.sha1(('%s\0%s\0%s\0' % (KEY_VERSION, transform if transform in BUILTINS else 'script', version)).encode('utf-8'))
+    if transform not in BUILTINS:
+        hash_file(transform, h)
+        h.update(b'\0')
+    hash_file(src, h)
+    return h.hexdigest()
+
+#------------------------------------------------------------------------------
+def compress(src, dst, transform):
+    with open(src, 'rb') as f:
+        data = f.read()
+    if transform == 'gzip':
+        import gzip
+        # no name and mtime in header: same output for same content
+        with open(dst, 'wb') as f:
+            with gzip.GzipFile('', 'wb', 9, f, 0) as z:
+                z.write(data)
+    else:
+        import zlib
+        with open(dst, 'wb') as f:
+            f.write(zlib.compress(data, 9))
+
+#------------------------------------------------------------------------------
+def run_script(script, src, dst):
+    '''run python script with `<src> <dst>` arguments, in this process'''
+    import runpy
+    argv = sys.argv
+    sys.argv = [script, src, dst]
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        if e.code:
+            raise
+    finally:
+        sys.argv = argv
+
+#------------------------------------------------------------------------------
+def apply(transform, src, dst):
+    if transform in BUILTINS:
+        compress(src, dst, transform)
+    else:
+        run_script(transform, src, dst)
+    if not os.path.isfile(dst):
+        raise IOError('transform `%s` produced no output for `%s`' % (transform, src))
+
+#------------------------------------------------------------------------------
+def copy_file(src, dst):
+    '''copy with a fresh mtime, cached results are older than their sources'''
+    tmp_file = '%s.%d.tmp' % (dst, os.getpid())
+    shutil.copyfile(src, tmp_file)
+    if os.path.exists(dst):
+        os.remove(dst)
+    os.rename(tmp_file, dst)
+
+#------------------------------------------------------------------------------
+def run(transform, version, src, dst):
+    dst_dir = os.path.dirname(dst)
+    if dst_dir and not os.path.isdir(dst_dir):
+        os.makedirs(dst_dir)
+    if not is_cache_enabled():
+        apply(transform, src, dst)
+        return 0
+
+    key = get_key(transform, version, src)
+    entry = os.path.join(get_cache_dir(), key[:2], key)
+    if os.path.isfile(entry):
+        copy_file(entry, dst)
+        # least recently used results are evicted first
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        return 0
+
+    # temp output keeps dst extension for scripts
+    root, ext = os.path.splitext(dst)
+    tmp_file = '%s.%d.tmp%s' % (root, os.getpid(), ext)
+    try:
+        apply(transform, src, tmp_file)
+        if not os.path.isdir(os.path.dirname(entry)):
+            try:
+                os.makedirs(os.path.dirname(entry))
+            except OSError:
+                pass # made by another transform
+        copy_file(tmp_file, entry)
+        with open(os.path.join(get_cache_dir(), STORED_FILE), 'w'):
+            pass
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(tmp_file, dst)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return 0
+
+#------------------------------------------------------------------------------
+def is_stored_since(start):
+    '''returns True if results were stored since `start` time'''
+    try:
+        return os.path.getmtime(os.path.join(get_cache_dir(), STORED_FILE)) >= start
+    except OSError:
+        return False
+
+#------------------------------------------------------------------------------
+def trim(max_size=None):
+    '''evict least recently used results until cache size fits in `max_size`, returns evicted results count'''
+    cache_dir = get_cache_dir()
+    max_size = max_size or get_max_size()
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    total = 0
+    for prefix in os.listdir(cache_dir):
+        prefix_dir = os.path.join(cache_dir, prefix)
+        if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            entry = os.path.join(prefix_dir, name)
+            try:
+                size = os.path.getsize(entry)
+                entries.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+            total += size
+
+    if total <= max_size:
+        return 0
+
+    # evict down to 90% of max size, don't trim on each build
+    count = 0
+    for _, size, entry in sorted(entries):
+        if total <= max_size * 0.9:
+            break
+        try:
+            os.remove(entry)
+        except OSError:
+            continue
+        total -= size
+        count += 1
+    return count
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if len(sys.argv) != 5:
+        sys.stderr.write('usage: transform.py <transform> <version> <src> <dst>\n')
+        sys.exit(1)
+    try:
+        sys.exit(run(*sys.argv[1:]))
+    except (IOError, OSError) as e:
+        sys.stderr.write('error: %s\n' % e)
+        sys.exit(1)
@@ -3,10 +3,6 @@
 import os
 import stat
 import sys
-import platform
-import multiprocessing
-import re
-from packages import yaml
 
 host_platforms = {
     'Darwin':   'macos',
@@ -18,17 +14,72 @@ python_version = sys.version_info[:3]
 
 #------------------------------------------------------------------------------ system
 def get_host_platform():
+    import platform
     pf = platform.system()
     if 'CYGWIN_NT' in pf:
         return host_platforms['Linux']
     return host_platforms[pf]
 
 def get_num_cpucores():
+    import multiprocessing
     try:
         return multiprocessing.cpu_count()
     except NotImplementedError:
         return 2
 
+def get_available_memory():
+    '''returns available physical memory in bytes, 0 if unknown'''
+    import subprocess
+    try:
+        pf = get_host_platform()
+        if pf == 'linux':
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) * 1024
+        elif pf == 'macos':
+            # free and reclaimable pages, `hw.memsize` is total memory
+            out = subprocess.check_output(['vm_stat']).decode('utf-8', 'replace').splitlines()
+            page_size = int(out[0].split('page size of')[1].split()[0])
+            pages = {}
+            for line in out[1:]:
+                name, _, value = line.partition(':')
+                if value.strip().rstrip('.').isdigit():
+                    pages[name.strip()] = int(value.strip().rstrip('.'))
+            return (pages.get('Pages free', 0) + pages.get('Pages inactive', 0) + pages.get('Pages speculative', 0)) * page_size
+        elif pf == 'windows':
+            import ctypes
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ('dwLength', ctypes.c_ulong),
+                    ('dwMemoryLoad', ctypes.c_ulong),
+                    ('ullTotalPhys', ctypes.c_ulonglong),
+                    ('ullAvailPhys', ctypes.c_ulonglong),
+                    ('ullTotalPageFile', ctypes.c_ulonglong),
+                    ('ullAvailPageFile', ctypes.c_ulonglong),
+                    ('ullTotalVirtual', ctypes.c_ulonglong),
+                    ('ullAvailVirtual', ctypes.c_ulonglong),
+                    ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+                ]
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return status.ullAvailPhys
+    except (OSError, ValueError, IndexError, subprocess.CalledProcessError):
+        pass
+    return 0
+
+def get_num_jobs():
+    '''returns default number of parallel build jobs: `FLUX_JOBS` env var, else cpu cores limited by available memory (`FLUX_JOB_MEMORY` MB per job, default 1024)'''
+    if os.environ.get('FLUX_JOBS', '').isdigit() and int(os.environ['FLUX_JOBS']) > 0:
+        return int(os.environ['FLUX_JOBS'])
+    jobs = get_num_cpucores()
+    job_mem = int(os.environ['FLUX_JOB_MEMORY']) if os.environ.get('FLUX_JOB_MEMORY', '').isdigit() else 1024
+    mem = get_available_memory()
+    if mem and job_mem:
+        jobs = min(jobs, mem // (job_mem * 1024 * 1024))
+    return max(1, int(jobs))
+
 #------------------------------------------------------------------------------ workspace/project
 
 def get_workspace_dir(flux_dir):
@@ -110,6 +161,7 @@ def remove_readonly(func, path, _):
 
 def replace_env(txt, dic):
     '''replace environment variables in text with dict'''
+    import re
     pattern = re.compile(r'.*?\${([A-Za-z0-9._-]+)}.*?')
     match = pattern.findall(txt)
     if match:
@@ -124,172 +176,8 @@ def enquote(txt, quote='"'):
 
 #------------------------------------------------------------------------------ yaml
 
-def load_flux_yaml(file, opts):
-    '''load flux yaml file'''
-
-    file = fix_path(file)
-
-    # pattern for global vars: look for ${word}
-    pattern = re.compile(r'.*?\${([A-Za-z0-9._-]+)}.*?')
-    loader = yaml.SafeLoader
-
-    # the tag will be used to mark where to start searching for the pattern
-    # e.g. somekey: !$env somestring${MYENVVAR}blah blah blah
-    loader.add_implicit_resolver('!$env', pattern, None)
-
-    #---------------------------------------
-    # defines custom tag handlers
-    #---------------------------------------
-
-    def env(loader, node):
-        '''Extracts the environment variable from the node's value'''
-        value = loader.construct_scalar(node)
-        match = pattern.findall(value) # to find all env variables in line
-        if match:
-            new_value = value
-            for g in match:
-                new_value = new_value.replace('${%s}' % g, os.environ.get(g, g))
-            return new_value
-        return value
-
-    # add direction join function when parse the yaml file
-    def join(loader, node):
-        seq = loader.construct_sequence(node)
-        return os.path.sep.join(seq)
-
-    # add string concatenation function when parse the yaml file
-    def concat(loader, node):
-        seq = loader.construct_sequence(node)
-        return ' '.join([str(i) for i in seq if str(i) != ''])
-
-    #TODO: add conditional function when parse the yaml file
-    #def iif(loader, node):
-    #    value = loader.construct_scalar(node)
-    #    return value if cond else ''
-    
-    # targets
-    def if_linux(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.target == 'linux' else ''
-
-    def if_macos(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.target == 'macos' else ''
-
-    def if_windows(loader, node):
-        value = loader.construct_scalar(node)
-        return value if (opts.target == 'windows' or opts.target == 'windows-msvc') else ''
-
-    def if_emscripten(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.target == 'emscripten' else ''
-
-    # target aliases
-    def if_desktop(loader, node):
-        value = loader.construct_scalar(node)
-        return value if (opts.target == 'windows' or \
-                         opts.target == 'windows-msvc' or \
-                         opts.target == 'linux' or \
-                         opts.target == 'macos' or \
-                         opts.target == 'raspbian') \
-                         else ''
-
-    def if_web(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.target == 'emscripten' else ''
-
-    def if_mobile(loader, node):
-        value = loader.construct_scalar(node)
-        return value if (opts.target == 'android' or \
-                         opts.target == 'ios' or \
-                         opts.target == 'ios-sim') \
-                         else ''
-    
-    # configs
-    def if_debug(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.config == 'debug' else ''
-
-    def if_release(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.config == 'release' else ''
-
-    # archs
-    def if_x86(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.arch == 'x86' else ''
-
-    def if_x64(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.arch == 'x64' else ''
-
-    def if_arm32(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.arch == 'arm32' else ''
-
-    def if_arm64(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.arch == 'arm64' else ''
-
-    def if_wasm(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.arch == 'wasm' else ''
-
-    # toolchains
-    def if_gcc(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.toolchain == 'gcc' else ''
-
-    def if_msvc(loader, node):
-        value = loader.construct_scalar(node)
-        return value if opts.toolchain == 'msvc' else ''
-
-    def if_mingw(loader, node):
-        value = loader.construct_scalar(node)
-        return value if (opts.target == 'windows' and opts.toolchain == 'gcc') else ''
-
-    #---------------------------------------
-    # register the tag handlers
-    #---------------------------------------
-
-    yaml.add_constructor('!$env', env)
-
-    yaml.add_constructor('!join', join)
-    yaml.add_constructor('!concat', concat)
-    yaml.add_constructor('!flags', concat) # extra
-    yaml.add_constructor('!opts', concat) # extra
-    yaml.add_constructor('!args', concat) # extra
-
-    #yaml.add_constructor('!?macos', iif(opts.target == 'macos'))
-
-    yaml.add_constructor('!?linux', if_linux)
-    yaml.add_constructor('!?macos', if_macos)
-    yaml.add_constructor('!?windows', if_windows)
-    yaml.add_constructor('!?emscripten', if_emscripten)
-
-    yaml.add_constructor('!?desktop', if_desktop)
-    yaml.add_constructor('!?web', if_web)
-    yaml.add_constructor('!?mobile', if_mobile)
-
-    #TODO: Add 'ios', 'android', 'darwin' for macos|ios|tvos, 'mobile', 'desktop', 'web', 'tv', 'console'
-
-    yaml.add_constructor('!?debug', if_debug)
-    yaml.add_constructor('!?release', if_release)
-
-    yaml.add_constructor('!?x86', if_x86)
-    yaml.add_constructor('!?x64', if_x64)
-    yaml.add_constructor('!?arm32', if_arm32)
-    yaml.add_constructor('!?arm64', if_arm64)
-    yaml.add_constructor('!?wasm', if_wasm)
-
-    yaml.add_constructor('!?gcc', if_gcc)
-    yaml.add_constructor('!?msvc', if_msvc)
-    yaml.add_constructor('!?mingw', if_mingw)
-
-    #---------------------------------------
-    # Load yaml file and return yaml object
-    #---------------------------------------
-    with open(file, 'r') as f:
-        data = yaml.full_load(f)
-        f.close()
-    return data
\ No newline at end of file
+def load_flux_yaml(file, opts, flux_dir=None):
+    '''load flux yaml file, parsed files are cached in workspace when `flux_dir` is given'''
+    from mods import loader
+    cache_dir = os.path.join(get_workspace_dir(flux_dir), 'flux-proj', loader.CACHE_DIR) if flux_dir else None
+    return loader.load(fix_path(file), opts, cache_dir)
@@ -1,49 +1,165 @@
-"""access to verb modules"""
+"""access to verb modules
+
+verb names and help texts are read from verb files without running them and
+cached in workspace `flux-proj/verbs.index` until the verbs dir changes, verb
+modules are imported when used."""
 
 import sys
 import os
-import glob
+import marshal
 
 #FIXME: Python2
 is_python3 = sys.version_info > (3,5)
 if is_python3:
-    import importlib.util
+    # `importlib.util` import costs more than a trivial verb run
+    import importlib.machinery, types
 else:
     import imp
 
-from collections import OrderedDict
 from mods import log, util
 
-# dictionary of 'name: module'
-verbs = {}
+#------------------------------------------------------------------------------
+
+INDEX_FILE = 'verbs.index'  # verbs index, in workspace intermediate dir
+INDEX_VERSION = 1
 
 #------------------------------------------------------------------------------
 
-def import_verbs(flux_dir):
-    global verbs
+class Verbs:
+    '''Verb modules by name, a module is imported on first access'''
+
+    #------------------------------------------------------------------------------
+    def __init__(self):
+        self.files = {}     # name: verb file
+        self.helps = {}     # name: help text, None if not a literal string
+        self.modules = {}   # name: imported module
+
+    #------------------------------------------------------------------------------
+    def __contains__(self, name):
+        return name in self.files
+
+    #------------------------------------------------------------------------------
+    def __iter__(self):
+        return iter(self.files)
+
+    #------------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.files)
+
+    #------------------------------------------------------------------------------
+    def __getitem__(self, name):
+        if name not in self.modules:
+            self.modules[name] = import_verb(name, self.files[name])
+        return self.modules[name]
+
+    #------------------------------------------------------------------------------
+    def get_help(self, name):
+        '''returns verb help text, imports verb module only if its help isn't a literal string'''
+        if self.helps.get(name) is None:
+            return self[name].help()
+        return self.helps[name]
+
+#------------------------------------------------------------------------------
+
+# verb modules by name
+verbs = Verbs()
 
-    # make sure flux-verbs find their modules
-    #sys.path.insert(0, flux_dir)
+#------------------------------------------------------------------------------
+def import_verb(verb_name, verb_file):
+    if is_python3:
+        loader = importlib.machinery.SourceFileLoader(verb_name, verb_file)
+        verb_mod = types.ModuleType(verb_name)
+        verb_mod.__file__ = verb_file
+        verb_mod.__loader__ = loader
+        loader.exec_module(verb_mod)
+    else:
+        #FIXME: Python2
+        fp, pathname, desc = imp.find_module(verb_name, [util.split_dir(verb_file)])
+        verb_mod = imp.load_module(verb_name, fp, pathname, desc)
+    return verb_mod
+
+#------------------------------------------------------------------------------
+def read_help(verb_file):
+    '''returns literal string returned by verb `help` function, None otherwise'''
+    import ast
+    try:
+        with open(verb_file, 'r') as f:
+            tree = ast.parse(f.read())
+    except (IOError, OSError, SyntaxError, ValueError):
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == 'help':
+            for stmt in node.body:
+                if isinstance(stmt, ast.Return) and stmt.value is not None:
+                    try:
+                        value = ast.literal_eval(stmt.value)
+                    except ValueError:
+                        return None
+                    return value if isinstance(value, str) else None
+    return None
 
+#------------------------------------------------------------------------------
+def get_index_file(flux_dir):
+    return os.path.join(util.get_workspace_dir(flux_dir), 'flux-proj', INDEX_FILE)
+
+#------------------------------------------------------------------------------
+def load_index(index_file, verb_dir):
+    '''returns {name: (file, mtime, help)} if verbs dir and files didn't change, None otherwise'''
+    try:
+        with open(index_file, 'rb') as f:
+            index = marshal.load(f)
+        if index['version'] != INDEX_VERSION or index['dir'] != verb_dir \
+                or index['mtime'] != os.path.getmtime(verb_dir):
+            return None
+        for verb_file, mtime, _ in index['verbs'].values():
+            if os.path.getmtime(verb_file) != mtime:
+                return None
+        return index['verbs']
+    except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+        return None
+
+#------------------------------------------------------------------------------
+def save_index(index_file, verb_dir, entries):
+    try:
+        if not os.path.isdir(util.split_dir(index_file)):
+            os.makedirs(util.split_dir(index_file))
+        tmp_file = '%s.%d.tmp' % (index_file, os.getpid())
+        with open(tmp_file, 'wb') as f:
+            marshal.dump({
+                'version': INDEX_VERSION,
+                'dir': verb_dir,
+                'mtime': os.path.getmtime(verb_dir),
+                'verbs': entries,
+            }, f)
+        if os.path.isfile(index_file):
+            os.remove(index_file)
+        os.rename(tmp_file, index_file)
+    except (IOError, OSError):
+        pass
+
+#------------------------------------------------------------------------------
+def import_verbs(flux_dir):
+    '''register verbs of flux dir, verb modules are imported when used'''
     # verbs directory
     verb_dir = util.get_verbs_dir(flux_dir)
 
     if os.path.isdir(verb_dir):
-        # get all .py file in verb dir
-        verb_files = glob.glob(verb_dir + '/*.py')
-        if verb_files:
-            for verb_file in verb_files:
-                verb_name = util.split_name(verb_file)
-                if not verb_name.startswith('__'):
-                    if is_python3:
-                        spec = importlib.util.spec_from_file_location(verb_name, verb_file)
-                        verb_mod = importlib.util.module_from_spec(spec)
-                        spec.loader.exec_module(verb_mod)
-                    else:
-                        #FIXME: Python2
-                        fp, pathname, desc = imp.find_module(verb_name, [verb_dir])
-                        verb_mod = imp.load_module(verb_name, fp, pathname, desc)
-                    verbs[verb_name] = verb_mod
+        index_file = get_index_file(flux_dir)
+        entries = load_index(index_file, verb_dir)
+        if entries is None:
+            # get all .py file in verb dir
+            entries = {}
+            for file in os.listdir(verb_dir):
+                verb_name, ext = os.path.splitext(file)
+                if ext == '.py' and not verb_name.startswith('__'):
+                    verb_file = os.path.join(verb_dir, file)
+                    entries[verb_name] = (verb_file, os.path.getmtime(verb_file), read_help(verb_file))
+            save_index(index_file, verb_dir, entries)
+
+        if entries:
+            for verb_name, (verb_file, _, help_text) in entries.items():
+                verbs.files[verb_name] = verb_file
+                verbs.helps[verb_name] = help_text
         else:
             log.error('no verb was found in `verbs` dir: `%s`' % verb_dir)
     else:
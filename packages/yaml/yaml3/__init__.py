@@ -6,6 +6,7 @@ from .events import *
 from .nodes import *
 
 from .loader import *
+from .fast import *
 from .dumper import *
 
 __version__ = '5.3.1'
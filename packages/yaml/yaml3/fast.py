@@ -0,0 +1,226 @@
+# Fast scanning mode of the pure python parser.
+#
+#   FastReader(stream)
+# Reader decoding the whole stream up front, so `forward` moves over runs of
+# characters without line breaks in a single step.
+#
+#   FastScanner
+# Scanner consuming plain scalars, quoted scalars runs, spaces, indentation
+# and comments with precompiled regexes instead of one `peek` per character.
+# It produces the same tokens, with the same marks, as `Scanner`.
+
+__all__ = ['FastReader', 'FastScanner', 'FastSafeLoader']
+
+from .reader import *
+from .scanner import *
+from .scanner import ScannerError
+from .tokens import *
+from .parser import *
+from .composer import *
+from .constructor import *
+from .resolver import *
+
+import re
+
+# characters changing line and column counting
+SPECIAL = re.compile('[\r\n\x85\u2028\u2029\uFEFF]')
+
+# blank and comment lines, then spaces and an optional comment
+TO_NEXT_TOKEN = re.compile('((?: *(?:#[^\0\r\n\x85\u2028\u2029]*)?(?:\r\n?|[\n\x85\u2028\u2029]))*) *(?:#[^\0\r\n\x85\u2028\u2029]*)?')
+
+SPACES = re.compile(' *')
+
+# plain scalar run, up to a space, a line break or a ': '
+PLAIN_BLOCK = re.compile('(?:[^\0 \t\r\n\x85\u2028\u2029:]|:(?![\0 \t\r\n\x85\u2028\u2029]))*')
+
+# in the flow context ',?[]{}' also end a plain scalar
+PLAIN_FLOW = re.compile('(?:[^\0 \t\r\n\x85\u2028\u2029:,?\\[\\]{}]|:(?![\0 \t\r\n\x85\u2028\u2029,\\[\\]{}]))*')
+
+# tag uri run, up to an escape
+URI = re.compile('[0-9A-Za-z\\-;/?:@&=+$,_.!~*\'()\\[\\]]*')
+
+# quoted scalar run, up to a quote, an escape, a space or a line break
+QUOTED = re.compile('[^\'\"\\\\\0 \t\r\n\x85\u2028\u2029]*')
+
+class FastReader(Reader):
+
+    def __init__(self, stream):
+        if isinstance(stream, (str, bytes)):
+            Reader.__init__(self, stream)
+        else:
+            # read the whole file, marks keep the file name and no snippet
+            Reader.__init__(self, stream.read())
+            self.stream = stream
+            self.name = getattr(stream, 'name', "<file>")
+
+    def forward(self, length=1):
+        buffer = self.buffer
+        start = self.pointer
+        end = start+length
+        if not SPECIAL.search(buffer, start, end):
+            self.column += length
+        else:
+            chunk = buffer[start:end]
+            if '\uFEFF' in chunk:
+                Reader.forward(self, length)
+                return
+            # '\r\n' is a single line break, counted on '\n'
+            lines = chunk.count('\n')+chunk.count('\x85')+chunk.count('\u2028')    \
+                    +chunk.count('\u2029')+chunk.count('\r')-chunk.count('\r\n')
+            last = max(chunk.rfind('\n'), chunk.rfind('\x85'),
+                    chunk.rfind('\u2028'), chunk.rfind('\u2029'), chunk.rfind('\r'))
+            if last == length-1 and chunk[last] == '\r' and buffer[end] == '\n':
+                lines -= 1
+                last = max(chunk.rfind('\n'), chunk.rfind('\x85'),
+                        chunk.rfind('\u2028'), chunk.rfind('\u2029'), chunk.rfind('\r', 0, last))
+            if lines:
+                self.line += lines
+                self.column = length-last-1
+            else:
+                self.column += length
+        self.pointer = end
+        self.index += length
+
+class FastScanner(Scanner):
+
+    def scan_to_next_token(self):
+        # See `Scanner.scan_to_next_token`.
+        if self.index == 0 and self.peek() == '\uFEFF':
+            self.forward()
+        match = TO_NEXT_TOKEN.match(self.buffer, self.pointer)
+        if match.end(1) > self.pointer and not self.flow_level:
+            self.allow_simple_key = True
+        if match.end() > self.pointer:
+            self.forward(match.end()-self.pointer)
+
+    def scan_plain(self):
+        # See `Scanner.scan_plain`.
+        chunks = []
+        start_mark = self.get_mark()
+        end_mark = start_mark
+        indent = self.indent+1
+        spaces = []
+        buffer = self.buffer
+        while True:
+            if buffer[self.pointer] == '#':
+                break
+            if self.flow_level:
+                end = PLAIN_FLOW.match(buffer, self.pointer).end()
+            else:
+                end = PLAIN_BLOCK.match(buffer, self.pointer).end()
+            length = end-self.pointer
+            if length == 0:
+                break
+            self.allow_simple_key = False
+            chunks.extend(spaces)
+            chunks.append(buffer[self.pointer:end])
+            self.forward(length)
+            end_mark = self.get_mark()
+            spaces = self.scan_plain_spaces(indent, start_mark)
+            if not spaces or buffer[self.pointer] == '#' \
+                    or (not self.flow_level and self.column < indent):
+                break
+        return ScalarToken(''.join(chunks), True, start_mark, end_mark)
+
+    def scan_plain_spaces(self, indent, start_mark):
+        # See `Scanner.scan_plain_spaces`.
+        chunks = []
+        buffer = self.buffer
+        end = SPACES.match(buffer, self.pointer).end()
+        whitespaces = buffer[self.pointer:end]
+        self.forward(end-self.pointer)
+        ch = buffer[self.pointer]
+        if ch in '\r\n\x85\u2028\u2029':
+            line_break = self.scan_line_break()
+            self.allow_simple_key = True
+            prefix = self.prefix(3)
+            if (prefix == '---' or prefix == '...')   \
+                    and self.peek(3) in '\0 \t\r\n\x85\u2028\u2029':
+                return
+            breaks = []
+            while buffer[self.pointer] in ' \r\n\x85\u2028\u2029':
+                if buffer[self.pointer] == ' ':
+                    self.forward(SPACES.match(buffer, self.pointer).end()-self.pointer)
+                else:
+                    breaks.append(self.scan_line_break())
+                    prefix = self.prefix(3)
+                    if (prefix == '---' or prefix == '...')   \
+                            and self.peek(3) in '\0 \t\r\n\x85\u2028\u2029':
+                        return
+            if line_break != '\n':
+                chunks.append(line_break)
+            elif not breaks:
+                chunks.append(' ')
+            chunks.extend(breaks)
+        elif whitespaces:
+            chunks.append(whitespaces)
+        return chunks
+
+    def scan_tag_uri(self, name, start_mark):
+        # See `Scanner.scan_tag_uri`.
+        chunks = []
+        buffer = self.buffer
+        while True:
+            end = URI.match(buffer, self.pointer).end()
+            if end > self.pointer:
+                chunks.append(buffer[self.pointer:end])
+                self.forward(end-self.pointer)
+            if buffer[self.pointer] != '%':
+                break
+            chunks.append(self.scan_uri_escapes(name, start_mark))
+        if not chunks:
+            raise ScannerError("while parsing a %s" % name, start_mark,
+                    "expected URI, but found %r" % self.peek(), self.get_mark())
+        return ''.join(chunks)
+
+    def scan_flow_scalar_non_spaces(self, double, start_mark):
+        # See `Scanner.scan_flow_scalar_non_spaces`.
+        chunks = []
+        buffer = self.buffer
+        while True:
+            end = QUOTED.match(buffer, self.pointer).end()
+            if end > self.pointer:
+                chunks.append(buffer[self.pointer:end])
+                self.forward(end-self.pointer)
+            ch = self.peek()
+            if not double and ch == '\'' and self.peek(1) == '\'':
+                chunks.append('\'')
+                self.forward(2)
+            elif (double and ch == '\'') or (not double and ch in '\"\\'):
+                chunks.append(ch)
+                self.forward()
+            elif double and ch == '\\':
+                self.forward()
+                ch = self.peek()
+                if ch in self.ESCAPE_REPLACEMENTS:
+                    chunks.append(self.ESCAPE_REPLACEMENTS[ch])
+                    self.forward()
+                elif ch in self.ESCAPE_CODES:
+                    length = self.ESCAPE_CODES[ch]
+                    self.forward()
+                    for k in range(length):
+                        if self.peek(k) not in '0123456789ABCDEFabcdef':
+                            raise ScannerError("while scanning a double-quoted scalar", start_mark,
+                                    "expected escape sequence of %d hexdecimal numbers, but found %r" %
+                                        (length, self.peek(k)), self.get_mark())
+                    code = int(self.prefix(length), 16)
+                    chunks.append(chr(code))
+                    self.forward(length)
+                elif ch in '\r\n\x85\u2028\u2029':
+                    self.scan_line_break()
+                    chunks.extend(self.scan_flow_scalar_breaks(double, start_mark))
+                else:
+                    raise ScannerError("while scanning a double-quoted scalar", start_mark,
+                            "found unknown escape character %r" % ch, self.get_mark())
+            else:
+                return chunks
+
+class FastSafeLoader(FastReader, FastScanner, Parser, Composer, SafeConstructor, Resolver):
+
+    def __init__(self, stream):
+        FastReader.__init__(self, stream)
+        FastScanner.__init__(self)
+        Parser.__init__(self)
+        Composer.__init__(self)
+        SafeConstructor.__init__(self)
+        Resolver.__init__(self)
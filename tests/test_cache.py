@@ -0,0 +1,163 @@
+"""compile cache launcher: cache keys, hits, misses and trimming"""
+
+import os, sys, shutil, tempfile, subprocess, unittest
+
+FLUX_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLUX_DIR)
+
+from mods import cache
+
+CACHE_SCRIPT = os.path.join(FLUX_DIR, 'mods', 'cache.py')
+
+#------------------------------------------------------------------------------
+
+class ArgsTest(unittest.TestCase):
+
+    #------------------------------------------------------------------------------
+    def test_gcc(self):
+        obj, dep, pp_args, key_args = cache.parse_args('gcc', ['-O2', '-Iinc', '-MMD', '-MF', 'a.c.d', '-c', 'a.c', '-o', 'a.c.o'])
+        self.assertEqual((obj, dep), ('a.c.o', 'a.c.d'))
+        self.assertEqual(pp_args, ['-O2', '-Iinc', '-E', 'a.c'])
+        # output names aren't part of the key, objects are shared between profiles
+        self.assertEqual(key_args, ['-O2', '-Iinc', '-MMD'])
+
+    #------------------------------------------------------------------------------
+    def test_msvc(self):
+        obj, dep, pp_args, key_args = cache.parse_args('msvc', ['/nologo', '/showIncludes', '/c', 'a.cpp', '/Foa.cpp.obj'])
+        self.assertEqual((obj, dep), ('a.cpp.obj', None))
+        self.assertEqual(pp_args, ['/nologo', '-E', 'a.cpp'])
+        self.assertEqual(key_args, ['/nologo', '/showIncludes'])
+
+    #------------------------------------------------------------------------------
+    def test_not_cacheable(self):
+        # links, several sources, custom depfile targets, pdb side effects
+        self.assertIsNone(cache.parse_args('gcc', ['a.o', 'b.o', '-o', 'app']))
+        self.assertIsNone(cache.parse_args('gcc', ['-c', 'a.c', 'b.c', '-o', 'a.o']))
+        self.assertIsNone(cache.parse_args('gcc', ['-MT', 'x', '-c', 'a.c', '-o', 'a.o']))
+        self.assertIsNone(cache.parse_args('msvc', ['/Zi', '/c', 'a.c', '/Foa.obj']))
+
+#------------------------------------------------------------------------------
+
+@unittest.skipUnless(shutil.which('gcc') if hasattr(shutil, 'which') else False, 'gcc not found')
+class LauncherTest(unittest.TestCase):
+
+    #------------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ws_dir = os.path.join(self.tmp_dir, 'ws')
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.stats_file = os.path.join(self.tmp_dir, 'stats')
+        self.write(os.path.join(self.ws_dir, 'inc', 'a.h'), 'int a(void);\n')
+        self.write(os.path.join(self.ws_dir, 'a.c'), '#include "a.h"\nint a(void) { return 1; }\n')
+
+    #------------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    #------------------------------------------------------------------------------
+    def write(self, path, text):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+
+    #------------------------------------------------------------------------------
+    def compile(self, obj, ws_dir=None, args=None, env=None):
+        '''compile `a.c` of workspace through launcher like ninja does, returns launcher result'''
+        ws_dir = ws_dir or self.ws_dir
+        obj = os.path.join(ws_dir, obj)
+        if not os.path.isdir(os.path.dirname(obj)):
+            os.makedirs(os.path.dirname(obj))
+        cmd = [sys.executable, CACHE_SCRIPT, 'gcc', 'gcc'] + (args or []) + ['-I' + os.path.join(ws_dir, 'inc'),
+            '-MMD', '-MF', obj + '.d', '-c', os.path.join(ws_dir, 'a.c'), '-o', obj]
+        env = dict(os.environ, FLUX_WORKSPACE_DIR=ws_dir, FLUX_CACHE_DIR=self.cache_dir,
+            FLUX_CACHE_STATS=self.stats_file, FLUX_CACHE_REMOTE='', **(env or {}))
+        self.assertEqual(subprocess.call(cmd, env=env), 0)
+        with open(self.stats_file, 'r') as f:
+            return f.read().splitlines()[-1]
+
+    #------------------------------------------------------------------------------
+    def count_entries(self):
+        return sum(len(os.listdir(os.path.join(self.cache_dir, x))) for x in os.listdir(self.cache_dir) if len(x) == 2)
+
+    #------------------------------------------------------------------------------
+    def test_miss_then_hit(self):
+        self.assertEqual(self.compile('debug/a.c.o'), 'miss')
+        # another profile with the same args: same object
+        self.assertEqual(self.compile('release/a.c.o'), 'hit')
+        with open(os.path.join(self.ws_dir, 'debug/a.c.o'), 'rb') as f:
+            with open(os.path.join(self.ws_dir, 'release/a.c.o'), 'rb') as g:
+                self.assertEqual(f.read(), g.read())
+        # depfile restored for the new object
+        with open(os.path.join(self.ws_dir, 'release/a.c.o.d'), 'r') as f:
+            deps = f.read()
+        self.assertTrue(deps.startswith(os.path.join(self.ws_dir, 'release/a.c.o') + ':'))
+        self.assertIn(os.path.join(self.ws_dir, 'inc', 'a.h'), deps)
+        self.assertEqual(self.count_entries(), 1)
+
+    #------------------------------------------------------------------------------
+    def test_key_stable_across_workspaces(self):
+        self.compile('debug/a.c.o')
+        other_dir = os.path.join(self.tmp_dir, 'other')
+        shutil.copytree(self.ws_dir, other_dir)
+        self.assertEqual(self.compile('debug/a.c.o', ws_dir=other_dir), 'hit')
+        with open(os.path.join(other_dir, 'debug/a.c.o.d'), 'r') as f:
+            self.assertIn(os.path.join(other_dir, 'inc', 'a.h'), f.read())
+
+    #------------------------------------------------------------------------------
+    def test_changes_miss(self):
+        self.compile('debug/a.c.o')
+        # compiler args
+        self.assertEqual(self.compile('debug/a.c.o', args=['-O2']), 'miss')
+        # included header
+        self.write(os.path.join(self.ws_dir, 'inc', 'a.h'), 'int a(void);\nint b(void);\n')
+        self.assertEqual(self.compile('debug/a.c.o'), 'miss')
+        self.assertEqual(self.compile('debug/a.c.o'), 'hit')
+        self.assertEqual(self.count_entries(), 3)
+
+    #------------------------------------------------------------------------------
+    def test_disabled(self):
+        self.assertEqual(self.compile('debug/a.c.o', env={'FLUX_CACHE': '0'}), 'skip')
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+#------------------------------------------------------------------------------
+
+class TrimTest(unittest.TestCase):
+
+    #------------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.env = os.environ.get('FLUX_CACHE_DIR')
+        os.environ['FLUX_CACHE_DIR'] = self.tmp_dir
+
+    #------------------------------------------------------------------------------
+    def tearDown(self):
+        if self.env is None:
+            os.environ.pop('FLUX_CACHE_DIR', None)
+        else:
+            os.environ['FLUX_CACHE_DIR'] = self.env
+        shutil.rmtree(self.tmp_dir)
+
+    #------------------------------------------------------------------------------
+    def test_trim(self):
+        keys = ['%040x' % i for i in range(4)]
+        for i, key in enumerate(keys):
+            cache.store(self.tmp_dir, key, {'obj': b'x' * 1000})
+            os.utime(cache.get_entry_dir(self.tmp_dir, key), (1000 + i, 1000 + i))
+        # a hit makes the oldest entry the most recently used
+        self.assertTrue(cache.lookup(self.tmp_dir, keys[0]))
+
+        # fits in max size, untouched
+        self.assertEqual(cache.trim(4000), 0)
+        # least recently used evicted first, down to 90% of max size
+        self.assertEqual(cache.trim(3000), 2)
+        self.assertEqual([cache.lookup(self.tmp_dir, x) is not None for x in keys], [True, False, False, True])
+
+    #------------------------------------------------------------------------------
+    def test_missing_entry(self):
+        self.assertIsNone(cache.lookup(self.tmp_dir, 'f' * 40))
+        self.assertEqual(cache.trim(1), 0)
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
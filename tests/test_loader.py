@@ -0,0 +1,111 @@
+"""yaml loaders differential check: same data with the LibYAML C parser and the python parser"""
+
+import os, sys, shutil, tempfile, unittest
+
+FLUX_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLUX_DIR)
+
+from mods import util, bench, loader
+from mods.build import BuildOpts
+
+#------------------------------------------------------------------------------
+
+# project file with flux tags
+PROJECT = '''build: app
+name: hello
+apptype: !?windows gui
+inputs:
+  - main.c
+  - !?debug debug.c
+  - !?release release.c
+  - !?x64 x64.c
+  - !?web web.c
+  - <libsdl2.a>
+options:
+  cc: !opts
+    - -std=gnu99
+    - !?debug -O0 -g
+    - !?release -O3
+    - !?msvc /W3
+    - !?relocatable -ffile-prefix-map=${FLUX_WORKSPACE_DIR}=.
+    - !$env -I${FLUX_LOADER_TEST}/include
+  ld: !join [-L, lib, !?mingw -static]
+transforms:
+  - {ext: [.js, .wasm], run: !?web gzip}
+  - ext: .png
+    run: tools/convert.py
+    out: .tex
+    version: 2
+pack: {compress: true}
+'''
+
+# build options signatures
+OPTS = [
+    ['-target=windows', '-arch=x86', '-config=debug'],
+    ['-target=windows-msvc', '-arch=x64', '-config=release'],
+    ['-target=linux', '-arch=x64', '-config=debug', '-r'],
+    ['-target=macos', '-arch=arm64', '-config=release'],
+    ['-target=emscripten', '-config=release'],
+]
+
+#------------------------------------------------------------------------------
+
+@unittest.skipUnless(loader.find_c_base_loader(), 'PyYAML with LibYAML bindings not installed')
+class LoaderTest(unittest.TestCase):
+
+    #------------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.env = os.environ.get('FLUX_LOADER_TEST')
+        os.environ['FLUX_LOADER_TEST'] = '/test'
+
+    #------------------------------------------------------------------------------
+    def tearDown(self):
+        if self.env is None:
+            os.environ.pop('FLUX_LOADER_TEST', None)
+        else:
+            os.environ['FLUX_LOADER_TEST'] = self.env
+        shutil.rmtree(self.tmp_dir)
+
+    #------------------------------------------------------------------------------
+    def get_opts(self, args):
+        opts = BuildOpts()
+        opts.parse_opts(self.tmp_dir, list(args))
+        return opts
+
+    #------------------------------------------------------------------------------
+    def check_file(self, file):
+        for args in OPTS:
+            opts = self.get_opts(args)
+            c_data = loader.load(file, opts, None, 'c')
+            python_data = loader.load(file, opts, None, 'python')
+            self.assertEqual(c_data, python_data, '%s %s' % (file, ' '.join(args)))
+
+    #------------------------------------------------------------------------------
+    def test_target_files(self):
+        target_dir = util.get_targets_dir(FLUX_DIR)
+        files = sorted(x for x in os.listdir(target_dir) if x.endswith('.yml'))
+        self.assertTrue(files)
+        for name in files:
+            self.check_file(os.path.join(target_dir, name))
+
+    #------------------------------------------------------------------------------
+    def test_project_file(self):
+        file = os.path.join(self.tmp_dir, 'flux.yml')
+        with open(file, 'w') as f:
+            f.write(PROJECT)
+        self.check_file(file)
+        # tags resolved for build options
+        data = loader.load(file, self.get_opts(OPTS[0]), None, 'c')
+        self.assertEqual(data['inputs'], ['main.c', 'debug.c', '', '', '', '<libsdl2.a>'])
+        self.assertEqual(data['options']['cc'], '-std=gnu99 -O0 -g -I/test/include')
+
+    #------------------------------------------------------------------------------
+    def test_large_project_file(self):
+        file = os.path.join(self.tmp_dir, 'large.yml')
+        bench.write_yaml(file, 500)
+        self.check_file(file)
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""packed assets archive, as run by ninja pack rules"""
+
+import os, sys, shutil, tempfile, subprocess, unittest
+
+FLUX_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLUX_DIR)
+
+from mods import pack
+
+PACK_SCRIPT = os.path.join(FLUX_DIR, 'mods', 'pack.py')
+
+#------------------------------------------------------------------------------
+
+class PackTest(unittest.TestCase):
+
+    #------------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.pack_file = os.path.join(self.tmp_dir, 'assets.pack')
+
+    #------------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    #------------------------------------------------------------------------------
+    def write(self, name, data):
+        '''write asset source file, returns its path'''
+        path = os.path.join(self.tmp_dir, 'src', name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    #------------------------------------------------------------------------------
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    #------------------------------------------------------------------------------
+    def read_pack(self):
+        '''returns {name: data} of pack file'''
+        p = pack.Pack(self.pack_file)
+        try:
+            return dict((name, bytes(p[name])) for name in p)
+        finally:
+            p.close()
+
+    #------------------------------------------------------------------------------
+    def test_round_trip(self):
+        files = {
+            'assets/a.txt': self.write('a.txt', b'a' * 1000),
+            'assets/sub/b.bin': self.write('b.bin', os.urandom(100)),
+            'assets/empty': self.write('empty', b''),
+        }
+        self.assertEqual(pack.pack(self.pack_file, files), (3, 0))
+        self.assertEqual(self.read_pack(), {
+            'assets/a.txt': b'a' * 1000,
+            'assets/sub/b.bin': self.read(files['assets/sub/b.bin']),
+            'assets/empty': b'',
+        })
+        # entries data aligned for in place reads
+        with open(self.pack_file, 'rb') as f:
+            entries, _ = pack.read_index(f)
+        for offset, _, _, _, _ in entries.values():
+            self.assertEqual(offset % pack.ALIGN, 0)
+
+    #------------------------------------------------------------------------------
+    def test_compress(self):
+        files = {
+            'assets/a.txt': self.write('a.txt', b'a' * 1000),
+            'assets/b.bin': self.write('b.bin', os.urandom(1000)),
+        }
+        pack.pack(self.pack_file, files, compress=True)
+        with open(self.pack_file, 'rb') as f:
+            entries, _ = pack.read_index(f)
+        # incompressible entries are stored
+        self.assertTrue(entries['assets/a.txt'][3] & pack.FLAG_ZLIB)
+        self.assertFalse(entries['assets/b.bin'][3] & pack.FLAG_ZLIB)
+        self.assertEqual(self.read_pack()['assets/a.txt'], b'a' * 1000)
+
+    #------------------------------------------------------------------------------
+    def test_dedupe(self):
+        files = {
+            'assets/a.txt': self.write('a.txt', b'same'),
+            'assets/b.txt': self.write('b.txt', b'same'),
+        }
+        pack.pack(self.pack_file, files)
+        with open(self.pack_file, 'rb') as f:
+            entries, _ = pack.read_index(f)
+        self.assertEqual(entries['assets/a.txt'][:2], entries['assets/b.txt'][:2])
+
+    #------------------------------------------------------------------------------
+    def test_changed_and_removed(self):
+        files = {
+            'assets/a.txt': self.write('a.txt', b'a1'),
+            'assets/b.txt': self.write('b.txt', b'b1'),
+            'assets/c.txt': self.write('c.txt', b'c1'),
+        }
+        pack.pack(self.pack_file, files)
+
+        # unchanged pack: entries are kept
+        self.assertEqual(pack.pack(self.pack_file, files), (0, 3))
+
+        # changed content with a new mtime, removed asset
+        self.write('b.txt', b'b2 changed')
+        os.utime(files['assets/b.txt'], (0, 0))
+        del files['assets/c.txt']
+        self.assertEqual(pack.pack(self.pack_file, files), (1, 1))
+        self.assertEqual(self.read_pack(), {'assets/a.txt': b'a1', 'assets/b.txt': b'b2 changed'})
+
+    #------------------------------------------------------------------------------
+    def test_touched_source(self):
+        files = {'assets/a.txt': self.write('a.txt', b'a')}
+        pack.pack(self.pack_file, files)
+        os.utime(files['assets/a.txt'], (0, 0))
+        # same content, not written again
+        self.assertEqual(pack.pack(self.pack_file, files), (0, 1))
+
+    #------------------------------------------------------------------------------
+    def test_modified_pack_repacked(self):
+        files = {'assets/a.txt': self.write('a.txt', b'a')}
+        pack.pack(self.pack_file, files)
+        # pack changed since last pack: state is ignored, pack rewritten
+        with open(self.pack_file, 'wb') as f:
+            f.write(b'garbage')
+        self.assertEqual(pack.pack(self.pack_file, files), (1, 0))
+        self.assertEqual(self.read_pack(), {'assets/a.txt': b'a'})
+
+    #------------------------------------------------------------------------------
+    def test_dead_data_repacked(self):
+        files = {'assets/a.bin': self.write('a.bin', os.urandom(1 << 20))}
+        pack.pack(self.pack_file, files)
+        for i in range(3):
+            self.write('a.bin', os.urandom(1 << 20))
+            os.utime(files['assets/a.bin'], (i, i))
+            pack.pack(self.pack_file, files)
+        # old versions data is dropped when it outgrows live data
+        self.assertLess(os.path.getsize(self.pack_file), 3 << 20)
+        self.assertEqual(self.read_pack(), {'assets/a.bin': self.read(files['assets/a.bin'])})
+
+    #------------------------------------------------------------------------------
+    def test_invalid_pack(self):
+        with open(self.pack_file, 'wb') as f:
+            f.write(b'not a pack')
+        self.assertRaises(ValueError, pack.Pack, self.pack_file)
+
+    #------------------------------------------------------------------------------
+    def test_script(self):
+        manifest = os.path.join(self.tmp_dir, 'assets.pack.json')
+        pack.write_manifest(manifest, {'assets/a.txt': self.write('a.txt', b'a' * 100)}, compress=True)
+        code = subprocess.call([sys.executable, PACK_SCRIPT, manifest, self.pack_file])
+        self.assertEqual(code, 0)
+        self.assertEqual(self.read_pack(), {'assets/a.txt': b'a' * 100})
+        # unchanged manifest left untouched
+        self.assertFalse(pack.write_manifest(manifest, {'assets/a.txt': os.path.join(self.tmp_dir, 'src', 'a.txt')}, compress=True))
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
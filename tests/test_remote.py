@@ -0,0 +1,110 @@
+"""remote compile cache round trips with a local cache server"""
+
+import os, sys, socket, shutil, tempfile, threading, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mods import remote
+
+KEY = 'a' * 40
+TOKEN = 'secret'
+
+#------------------------------------------------------------------------------
+
+class RemoteCacheTest(unittest.TestCase):
+
+    #------------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        os.makedirs(self.cache_dir)
+        self.server = remote.create_server(os.path.join(self.tmp_dir, 'blobs'), '127.0.0.1', 0, TOKEN, 1)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.env = dict(os.environ)
+        self.set_remote(self.server.server_address[1], TOKEN)
+
+    #------------------------------------------------------------------------------
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.environ.clear()
+        os.environ.update(self.env)
+        shutil.rmtree(self.tmp_dir)
+
+    #------------------------------------------------------------------------------
+    def set_remote(self, port, token):
+        os.environ['FLUX_CACHE_REMOTE'] = 'http://127.0.0.1:%d' % port
+        os.environ['FLUX_CACHE_REMOTE_TIMEOUT'] = '0.5'
+        os.environ['FLUX_CACHE_REMOTE_TOKEN'] = token
+
+    #------------------------------------------------------------------------------
+    def put_raw(self, length, body, token=TOKEN):
+        '''send a raw PUT, returns response status'''
+        s = socket.create_connection(self.server.server_address)
+        try:
+            head = 'PUT /%s HTTP/1.0\r\nContent-Length: %d\r\nAuthorization: Bearer %s\r\n\r\n' % (KEY, length, token)
+            s.sendall(head.encode('utf-8') + body)
+            s.shutdown(socket.SHUT_WR)
+            return int(s.makefile('rb').readline().split()[1])
+        finally:
+            s.close()
+
+    #------------------------------------------------------------------------------
+    def test_round_trip(self):
+        self.assertIsNone(remote.fetch(self.cache_dir, KEY))
+        self.assertTrue(remote.push(self.cache_dir, KEY, b'blob'))
+        self.assertEqual(remote.fetch(self.cache_dir, KEY), b'blob')
+        # first complete blob is kept
+        self.assertTrue(remote.push(self.cache_dir, KEY, b'other'))
+        self.assertEqual(remote.fetch(self.cache_dir, KEY), b'blob')
+
+    #------------------------------------------------------------------------------
+    def test_put_requires_token(self):
+        os.environ['FLUX_CACHE_REMOTE_TOKEN'] = 'wrong'
+        self.assertFalse(remote.push(self.cache_dir, KEY, b'blob'))
+        del os.environ['FLUX_CACHE_REMOTE_TOKEN']
+        self.assertFalse(remote.push(self.cache_dir, KEY, b'blob'))
+        # refused upload doesn't disable fetches
+        self.assertFalse(remote.is_down(self.cache_dir))
+        self.assertIsNone(remote.fetch(self.cache_dir, KEY))
+
+    #------------------------------------------------------------------------------
+    def test_server_without_token_is_readonly(self):
+        self.server.token = ''
+        os.environ['FLUX_CACHE_REMOTE_TOKEN'] = ''
+        self.assertFalse(remote.push(self.cache_dir, KEY, b'blob'))
+        self.assertEqual(self.put_raw(4, b'blob', ''), 403)
+
+    #------------------------------------------------------------------------------
+    def test_truncated_upload(self):
+        self.assertEqual(self.put_raw(100, b'short'), 400)
+        self.assertIsNone(remote.fetch(self.cache_dir, KEY))
+
+    #------------------------------------------------------------------------------
+    def test_too_large_upload(self):
+        self.assertEqual(self.put_raw(2 * 1024 * 1024, b''), 413)
+        self.assertFalse(remote.push(self.cache_dir, KEY, b'x' * (2 * 1024 * 1024)))
+        self.assertIsNone(remote.fetch(self.cache_dir, KEY))
+
+    #------------------------------------------------------------------------------
+    def test_timeout_fallback(self):
+        # listening socket that never answers
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(('127.0.0.1', 0))
+        s.listen(1)
+        try:
+            self.set_remote(s.getsockname()[1], TOKEN)
+            self.assertIsNone(remote.fetch(self.cache_dir, KEY))
+            self.assertTrue(remote.is_down(self.cache_dir))
+            # remote cache is skipped while down
+            self.set_remote(self.server.server_address[1], TOKEN)
+            self.assertFalse(remote.push(self.cache_dir, KEY, b'blob'))
+            self.assertIsNone(remote.fetch(self.cache_dir, KEY))
+        finally:
+            s.close()
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
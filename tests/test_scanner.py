@@ -0,0 +1,121 @@
+"""fast yaml scanner differential check: same tokens, marks and errors as the python scanner"""
+
+import os, sys, glob, random, shutil, tempfile, unittest
+
+FLUX_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLUX_DIR)
+
+from packages import yaml
+from mods import util, bench
+
+#------------------------------------------------------------------------------
+
+# scanner edge cases
+SCAN_CORPUS = [
+    '',
+    'a: b\n',
+    'a: b # comment\n# comment\n\n  \nc: d',
+    'key: value with spaces   \n  continued plain\n\n  after blank line\n',
+    'list: [a, b c, "d e", \'f\'\'g\', {h: i, j: [k, l]}, m:n, o: p]\n',
+    'flow: {a: b, c: [d, e], ? f : g, h,i}\n',
+    'url: http://host:8080/path?x=1#frag\ntime: 12:30:45\n',
+    'q: "esc \\t \\n \\x41 \\u00e9 \\U0001F600 \\\\ \\" \' end"\n',
+    'q: "multi\n  line\n\n  quoted"\ns: \'single\n  line\'\n',
+    'lit: |\n  line 1\n    line 2\n\n  line 3\nfold: >-\n  a\n  b\n',
+    '- a\n- - b\n  - c\n-   d: e\n    f: g\n',
+    '--- doc 1\n...\n--- !tag\na: *ref\nb: &ref c\n',
+    '%YAML 1.1\n%TAG !e! tag:example.com,2000:\n--- !e!foo "bar"\n',
+    'a: !?debug -O0 -g\nb: !concat [x, !?x64 y, z]\nc: !$env ${HOME}/x\nd: !join [a, b]\n',
+    '\ufeffbom: first\n',
+    'crlf: a\r\nb: c\r\n  d\r\n',
+    'cr: a\rb: c\r',
+    'uni: \u00e9t\u00e9 \u65e5\u672c \u2028next: line\u2029x: y\x85z: w\n',
+    'tab:\tvalue\nt2: a\tb\n',
+    'a: b: c\n',
+    'a: [b, c\n',
+    'a: "unterminated\n',
+    '  - bad\nindent: x\n',
+    '? complex key\n: complex value\n',
+    'a: -1\nb: - x\nc: -x\n',
+    'k: v #not a comment#\nk2: v2#x\n',
+]
+
+FUZZ = 500 # truncated documents
+
+#------------------------------------------------------------------------------
+def scan_tokens(loader_class, data):
+    '''returns scanned tokens of `data` with their marks, and the scanner error if any'''
+    def mark(m):
+        return m and (m.index, m.line, m.column, m.pointer)
+    tokens = []
+    try:
+        scanner = loader_class(data)
+        while scanner.check_token():
+            token = scanner.get_token()
+            attrs = sorted((k, mark(v) if k.endswith('_mark') else v) for k, v in token.__dict__.items())
+            tokens.append((type(token).__name__, attrs))
+    except yaml.YAMLError as e:
+        tokens.append(('error', str(e)))
+    return tokens
+
+#------------------------------------------------------------------------------
+def get_target_docs():
+    docs = []
+    for file in sorted(glob.glob(os.path.join(util.get_targets_dir(FLUX_DIR), '*.yml'))):
+        with open(file, 'rb') as f:
+            docs.append(f.read().decode('utf-8'))
+    return docs
+
+#------------------------------------------------------------------------------
+def get_project_doc():
+    '''returns a synthetic project file using flux tags'''
+    tmp_dir = tempfile.mkdtemp(prefix='flux-test-')
+    try:
+        file = os.path.join(tmp_dir, 'flux.yml')
+        bench.write_yaml(file, 200)
+        with open(file, 'r') as f:
+            return f.read()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+#------------------------------------------------------------------------------
+
+@unittest.skipUnless(hasattr(yaml, 'FastSafeLoader'), 'fast scanner requires python 3')
+class FastScannerTest(unittest.TestCase):
+
+    #------------------------------------------------------------------------------
+    def check(self, docs):
+        for doc in docs:
+            for data in [doc, doc.encode('utf-8')]:
+                self.assertEqual(scan_tokens(yaml.FastSafeLoader, data), scan_tokens(yaml.SafeLoader, data),
+                    'tokens mismatch:\n%r' % data)
+
+    #------------------------------------------------------------------------------
+    def test_edge_cases(self):
+        self.check(SCAN_CORPUS)
+
+    #------------------------------------------------------------------------------
+    def test_target_files(self):
+        docs = get_target_docs()
+        self.assertTrue(docs)
+        self.check(docs)
+
+    #------------------------------------------------------------------------------
+    def test_project_file(self):
+        self.check([get_project_doc()])
+
+    #------------------------------------------------------------------------------
+    def test_truncated(self):
+        # truncated and line ending variants end tokens and errors at any place
+        rnd = random.Random(0)
+        docs = [x for x in SCAN_CORPUS + get_target_docs() + [get_project_doc()] if x]
+        fuzzed = []
+        for _ in range(FUZZ):
+            doc = rnd.choice(docs)
+            doc = doc[:rnd.randint(0, len(doc))]
+            fuzzed.append(doc.replace('\n', '\r\n') if rnd.random() < 0.2 else doc)
+        self.check(fuzzed)
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""build stats: runs read from the ninja log ranges recorded by `flux build`, jobs aggregation and critical path"""
+
+import os, sys, shutil, tempfile, unittest
+
+FLUX_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLUX_DIR)
+
+from mods import stats, timing
+
+#------------------------------------------------------------------------------
+
+class RunsTest(unittest.TestCase):
+
+    #------------------------------------------------------------------------------
+    def setUp(self):
+        self.build_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.build_dir, timing.NINJA_LOG)
+
+    #------------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.build_dir)
+
+    #------------------------------------------------------------------------------
+    def build(self, jobs, header=False):
+        '''append ninja log entries of a build, records its run'''
+        pos = timing.get_log_pos(self.build_dir)
+        with open(self.log_file, 'a') as f:
+            if header:
+                f.write('# ninja log v5\n')
+            for start, end, output in jobs:
+                f.write('%d\t%d\t0\t%s\t%x\n' % (start, end, output, hash(output) & 0xffff))
+        stats.add_run(self.build_dir, pos)
+
+    #------------------------------------------------------------------------------
+    def test_consecutive_runs(self):
+        # second run ends later than the first one, a single clock
+        self.build([(0, 10, 'a.o')], header=True)
+        self.build([(0, 5, 'b.o'), (5, 20, 'app.exe')])
+        self.build([])
+        runs = stats.read_runs(self.build_dir)
+        self.assertEqual(runs, [[(0, 10, 'a.o')], [(0, 5, 'b.o'), (5, 20, 'app.exe')]])
+
+    #------------------------------------------------------------------------------
+    def test_regeneration_clock(self):
+        self.build([(0, 30, 'build.ninja'), (0, 10, 'a.o'), (10, 15, 'app.exe')], header=True)
+        runs = stats.read_runs(self.build_dir)
+        self.assertEqual(runs, [[(0, 30, 'build.ninja'), (30, 40, 'a.o'), (40, 45, 'app.exe')]])
+
+    #------------------------------------------------------------------------------
+    def test_recompacted_log(self):
+        self.build([(0, 10, 'a.o')], header=True)
+        # recompaction rewrites the log in another file
+        tmp_file = self.log_file + '.recompact'
+        shutil.copyfile(self.log_file, tmp_file)
+        os.remove(self.log_file)
+        os.rename(tmp_file, self.log_file)
+        self.assertEqual(stats.read_runs(self.build_dir), [])
+        self.build([(0, 5, 'b.o')])
+        self.assertEqual(stats.read_runs(self.build_dir), [[(0, 5, 'b.o')]])
+
+#------------------------------------------------------------------------------
+
+class StatsTest(unittest.TestCase):
+
+    WS_DIR = '/ws'
+    OUT_DIRS = {
+        '/ws/app/flux-proj/linux-debug-x64': 'app',
+        '/ws/mod/flux-proj/linux-debug-x64': 'mod',
+    }
+    DEPS = {'app': ['mod'], 'mod': []}
+
+    #------------------------------------------------------------------------------
+    def get_stats(self, run, projects=None):
+        return stats.get_stats(run, self.WS_DIR, self.OUT_DIRS, self.DEPS, projects)
+
+    #------------------------------------------------------------------------------
+    def test_aggregation(self):
+        result = self.get_stats([
+            (0, 100, 'mod/flux-proj/linux-debug-x64/build/m.c.o'),
+            (0, 300, 'app/flux-proj/linux-debug-x64/build/main.c.o'),
+            (100, 150, 'mod/flux-proj/linux-debug-x64/mod.a'),
+            (300, 400, 'app/flux-proj/linux-debug-x64/app'),
+        ])
+        self.assertEqual(result['jobs'], 4)
+        self.assertAlmostEqual(result['wall'], 0.4)
+        self.assertAlmostEqual(result['cpu'], 0.55)
+        self.assertAlmostEqual(result['parallelism'], 0.55 / 0.4)
+        self.assertEqual(result['projects']['mod']['jobs'], 2)
+        self.assertAlmostEqual(result['projects']['mod']['cpu'], 0.15)
+        self.assertAlmostEqual(result['projects']['app']['cpu'], 0.4)
+        self.assertEqual(sorted(result['units']), ['app: main.c', 'mod: m.c'])
+
+    #------------------------------------------------------------------------------
+    def test_critical_path_through_archive(self):
+        result = self.get_stats([
+            (0, 50, 'app/flux-proj/linux-debug-x64/build/main.c.o'),
+            (0, 200, 'mod/flux-proj/linux-debug-x64/build/m.c.o'),
+            (200, 250, 'mod/flux-proj/linux-debug-x64/mod.a'),
+            (250, 300, 'app/flux-proj/linux-debug-x64/app'),
+        ])
+        self.assertEqual([x[:3] for x in result['critical']], [
+            ['mod', 'compile', 'm.c'],
+            ['mod', 'archive', 'mod.a'],
+            ['app', 'link', 'app'],
+        ])
+
+    #------------------------------------------------------------------------------
+    def test_critical_path_through_compile(self):
+        # archive done before the slow compile of the app
+        result = self.get_stats([
+            (0, 50, 'mod/flux-proj/linux-debug-x64/build/m.c.o'),
+            (50, 60, 'mod/flux-proj/linux-debug-x64/mod.a'),
+            (0, 200, 'app/flux-proj/linux-debug-x64/build/main.c.o'),
+            (200, 250, 'app/flux-proj/linux-debug-x64/app'),
+        ])
+        self.assertEqual([x[:3] for x in result['critical']], [
+            ['app', 'compile', 'main.c'],
+            ['app', 'link', 'app'],
+        ])
+
+    #------------------------------------------------------------------------------
+    def test_projects_filter(self):
+        result = self.get_stats([
+            (0, 100, 'mod/flux-proj/linux-debug-x64/build/m.c.o'),
+            (0, 300, 'app/flux-proj/linux-debug-x64/build/main.c.o'),
+        ], projects=['mod'])
+        self.assertEqual(list(result['projects']), ['mod'])
+        self.assertIsNone(self.get_stats([(0, 300, 'app/flux-proj/linux-debug-x64/app')], projects=['mod']))
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""incremental files sync, as run by ninja copy rules"""
+
+import os, sys, time, shutil, tempfile, subprocess, unittest
+
+FLUX_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLUX_DIR)
+
+from mods import sync
+
+SYNC_SCRIPT = os.path.join(FLUX_DIR, 'mods', 'sync.py')
+
+#------------------------------------------------------------------------------
+
+class SyncTest(unittest.TestCase):
+
+    #------------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp_dir, 'src.txt')
+        self.dst = os.path.join(self.tmp_dir, 'out', 'sub', 'dst.txt')
+        self.write(self.src, b'data')
+
+    #------------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    #------------------------------------------------------------------------------
+    def write(self, path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    #------------------------------------------------------------------------------
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    #------------------------------------------------------------------------------
+    def run_sync(self, files, root_dir=None, keep=None, env=None):
+        '''run sync script on `{dst: src}` files like ninja does, returns (exit code, stderr)'''
+        manifest = os.path.join(self.tmp_dir, 'sync.json')
+        sync.write_manifest(manifest, files, root_dir, keep)
+        p = subprocess.Popen([sys.executable, SYNC_SCRIPT, manifest, os.path.join(self.tmp_dir, 'sync.stamp')],
+            stderr=subprocess.PIPE, env=dict(os.environ, **(env or {})))
+        _, err = p.communicate(timeout=30)
+        return p.returncode, err.decode('utf-8')
+
+    #------------------------------------------------------------------------------
+    def test_copy_keeps_mtime(self):
+        for mode in sync.MODES:
+            sync.sync_file(self.src, self.dst, mode)
+            self.assertEqual(self.read(self.dst), b'data')
+            self.assertTrue(sync.is_up_to_date(self.src, self.dst, mode, False))
+            os.remove(self.dst)
+
+    #------------------------------------------------------------------------------
+    def test_changed_source(self):
+        sync.sync_file(self.src, self.dst, 'copy')
+        self.write(self.src, b'other')
+        self.assertFalse(sync.is_up_to_date(self.src, self.dst, 'copy', False))
+
+    #------------------------------------------------------------------------------
+    def test_touched_source(self):
+        sync.sync_file(self.src, self.dst, 'copy')
+        t = time.time() + 10
+        os.utime(self.src, (t, t))
+        self.assertFalse(sync.is_up_to_date(self.src, self.dst, 'copy', False))
+        # same content: dst gets source mtime instead of a copy
+        self.assertTrue(sync.is_up_to_date(self.src, self.dst, 'copy', True))
+        self.assertTrue(sync.is_up_to_date(self.src, self.dst, 'copy', False))
+
+    #------------------------------------------------------------------------------
+    def test_hardlink_doesnt_write_through(self):
+        sync.sync_file(self.src, self.dst, 'hardlink')
+        other = os.path.join(self.tmp_dir, 'other.txt')
+        self.write(other, b'other')
+        sync.sync_file(other, self.dst, 'hardlink')
+        self.assertEqual(self.read(self.src), b'data')
+        self.assertEqual(self.read(self.dst), b'other')
+
+    #------------------------------------------------------------------------------
+    def test_remove_stale_files(self):
+        sync.sync_file(self.src, self.dst, 'copy')
+        stale = os.path.join(self.tmp_dir, 'out', 'stale', 'x.txt')
+        os.makedirs(os.path.dirname(stale))
+        self.write(stale, b'x')
+        out_dir = os.path.join(self.tmp_dir, 'out')
+        self.assertEqual(sync.remove_stale_files(out_dir, set([os.path.normpath(self.dst)])), 1)
+        self.assertFalse(os.path.exists(os.path.dirname(stale)))
+        self.assertTrue(os.path.isfile(self.dst))
+
+    #------------------------------------------------------------------------------
+    def test_script(self):
+        out_dir = os.path.join(self.tmp_dir, 'out')
+        kept = os.path.join(out_dir, 'kept.txt')
+        stale = os.path.join(out_dir, 'stale.txt')
+        os.makedirs(out_dir)
+        self.write(kept, b'kept')
+        self.write(stale, b'stale')
+        code, err = self.run_sync({self.dst: self.src}, out_dir, [kept], {'FLUX_SYNC_MODE': 'reflink'})
+        self.assertEqual((code, err), (0, ''))
+        self.assertEqual(self.read(self.dst), b'data')
+        self.assertTrue(os.path.isfile(kept))
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir, 'sync.stamp')))
+
+    #------------------------------------------------------------------------------
+    def test_script_many_files(self):
+        # copied by a thread pool
+        files = {}
+        for i in range(20):
+            src = os.path.join(self.tmp_dir, 'src%d.txt' % i)
+            self.write(src, b'data%d' % i)
+            files[os.path.join(self.tmp_dir, 'out', 'dst%d.txt' % i)] = src
+        code, err = self.run_sync(files)
+        self.assertEqual((code, err), (0, ''))
+        for dst, src in files.items():
+            self.assertEqual(self.read(dst), self.read(src))
+
+    #------------------------------------------------------------------------------
+    def test_script_error_fails(self):
+        # copy errors fail the ninja edge, they don't hang the build
+        code, err = self.run_sync({self.dst: os.path.join(self.tmp_dir, 'missing.txt')})
+        self.assertEqual(code, 1)
+        self.assertIn('error copying file', err)
+        self.assertFalse(os.path.exists(self.dst))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, 'sync.stamp')))
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+"""asset transforms and their results cache, as run by ninja transform rules"""
+
+import os, sys, gzip, shutil, tempfile, subprocess, unittest
+
+FLUX_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLUX_DIR)
+
+from mods import transform
+
+#------------------------------------------------------------------------------
+
+SCRIPT = '''import sys
+with open(sys.argv[1], 'rb') as s:
+    with open(sys.argv[2], 'wb') as d:
+        d.write(s.read().upper())
+'''
+
+#------------------------------------------------------------------------------
+
+class TransformTest(unittest.TestCase):
+
+    #------------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # cache in workspace intermediate dir
+        self.env = os.environ.get('FLUX_WORKSPACE_DIR')
+        os.environ['FLUX_WORKSPACE_DIR'] = self.tmp_dir
+        self.src = os.path.join(self.tmp_dir, 'a.txt')
+        self.dst = os.path.join(self.tmp_dir, 'out', 'a.txt.gz')
+        self.script = os.path.join(self.tmp_dir, 'upper.py')
+        self.write(self.src, b'data')
+        self.write(self.script, SCRIPT.encode('utf-8'))
+
+    #------------------------------------------------------------------------------
+    def tearDown(self):
+        if self.env is None:
+            os.environ.pop('FLUX_WORKSPACE_DIR', None)
+        else:
+            os.environ['FLUX_WORKSPACE_DIR'] = self.env
+        shutil.rmtree(self.tmp_dir)
+
+    #------------------------------------------------------------------------------
+    def write(self, path, data):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    #------------------------------------------------------------------------------
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    #------------------------------------------------------------------------------
+    def get_entry(self, key):
+        return os.path.join(transform.get_cache_dir(), key[:2], key)
+
+    #------------------------------------------------------------------------------
+    def test_gzip(self):
+        transform.run('gzip', '', self.src, self.dst)
+        with gzip.open(self.dst, 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+        # same content, same output
+        first = self.read(self.dst)
+        transform.run('gzip', '', self.src, self.dst + '2')
+        self.assertEqual(self.read(self.dst + '2'), first)
+
+    #------------------------------------------------------------------------------
+    def test_script(self):
+        transform.run(self.script, '1', self.src, self.dst)
+        self.assertEqual(self.read(self.dst), b'DATA')
+
+    #------------------------------------------------------------------------------
+    def test_script_without_output(self):
+        self.write(self.script, b'pass\n')
+        self.assertRaises(IOError, transform.run, self.script, '1', self.src, self.dst)
+        self.assertFalse(os.path.exists(self.dst))
+
+    #------------------------------------------------------------------------------
+    def test_cache_hit(self):
+        transform.run(self.script, '1', self.src, self.dst)
+        entry = self.get_entry(transform.get_key(self.script, '1', self.src))
+        self.assertEqual(self.read(entry), b'DATA')
+        # cached result is copied, the script doesn't run
+        self.write(entry, b'CACHED')
+        transform.run(self.script, '1', self.src, self.dst)
+        self.assertEqual(self.read(self.dst), b'CACHED')
+
+    #------------------------------------------------------------------------------
+    def test_cache_disabled(self):
+        os.environ['FLUX_TRANSFORM_CACHE'] = '0'
+        try:
+            transform.run(self.script, '1', self.src, self.dst)
+        finally:
+            del os.environ['FLUX_TRANSFORM_CACHE']
+        self.assertEqual(self.read(self.dst), b'DATA')
+        self.assertFalse(os.path.exists(transform.get_cache_dir()))
+
+    #------------------------------------------------------------------------------
+    def test_key(self):
+        key = transform.get_key(self.script, '1', self.src)
+        self.assertEqual(transform.get_key(self.script, '1', self.src), key)
+        # version, source and script content changes invalidate results
+        self.assertNotEqual(transform.get_key(self.script, '2', self.src), key)
+        self.write(self.src, b'other data')
+        self.assertNotEqual(transform.get_key(self.script, '1', self.src), key)
+        self.write(self.src, b'data')
+        self.write(self.script, SCRIPT.replace('upper', 'lower').encode('utf-8'))
+        self.assertNotEqual(transform.get_key(self.script, '1', self.src), key)
+        # builtins are keyed by name
+        self.assertNotEqual(transform.get_key('gzip', '', self.src), transform.get_key('deflate', '', self.src))
+
+    #------------------------------------------------------------------------------
+    def test_changed_script_reruns(self):
+        transform.run(self.script, '1', self.src, self.dst)
+        self.write(self.script, SCRIPT.replace('upper', 'lower').encode('utf-8'))
+        transform.run(self.script, '1', self.src, self.dst)
+        self.assertEqual(self.read(self.dst), b'data')
+
+    #------------------------------------------------------------------------------
+    def test_trim(self):
+        entries = []
+        for i in range(4):
+            src = os.path.join(self.tmp_dir, 'src%d.txt' % i)
+            self.write(src, b'%d' % i * 1000)
+            transform.run(self.script, '1', src, os.path.join(self.tmp_dir, 'out', 'dst%d.txt' % i))
+            entry = self.get_entry(transform.get_key(self.script, '1', src))
+            os.utime(entry, (1000 + i, 1000 + i))
+            entries.append(entry)
+        self.assertTrue(transform.is_stored_since(0))
+
+        # fits in max size, untouched
+        self.assertEqual(transform.trim(4000), 0)
+        # least recently used evicted first, down to 90% of max size
+        self.assertEqual(transform.trim(3000), 2)
+        self.assertEqual([os.path.exists(x) for x in entries], [False, False, True, True])
+
+    #------------------------------------------------------------------------------
+    def test_cache_hit_is_used(self):
+        transform.run(self.script, '1', self.src, self.dst)
+        entry = self.get_entry(transform.get_key(self.script, '1', self.src))
+        os.utime(entry, (1000, 1000))
+        transform.run(self.script, '1', self.src, self.dst)
+        self.assertGreater(os.path.getmtime(entry), 1000)
+
+#------------------------------------------------------------------------------
+
+class TransformRulesTest(unittest.TestCase):
+    '''transform rules of a project, checked when its ninja file is generated'''
+
+    #------------------------------------------------------------------------------
+    def setUp(self):
+        self.ws_dir = tempfile.mkdtemp()
+        os.symlink(FLUX_DIR, os.path.join(self.ws_dir, 'flux'))
+        self.app_dir = os.path.join(self.ws_dir, 'app')
+        for name in ['main.c', 'assets/a.txt', 'assets/a.dat', 'assets/a.md']:
+            path = os.path.join(self.app_dir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write('int main() { return 0; }\n' if name == 'main.c' else name)
+
+    #------------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.ws_dir)
+
+    #------------------------------------------------------------------------------
+    def generate(self, transforms):
+        '''generate app ninja files with transform rules, returns (exit code, output)'''
+        with open(os.path.join(self.app_dir, 'flux.yml'), 'w') as f:
+            f.write('build: app\nname: app\ninputs:\n  - main.c\n  - assets@/assets\ntransforms:\n' + transforms)
+        p = subprocess.Popen([sys.executable, os.path.join(self.ws_dir, 'flux', 'flux'), 'build', '-generate', '-target=windows', '-arch=x86', 'app'],
+            cwd=self.ws_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=dict(os.environ, FLUX_STORE='0'))
+        out, _ = p.communicate(timeout=60)
+        return p.returncode, out.decode('utf-8', 'replace')
+
+    #------------------------------------------------------------------------------
+    def test_transform_edges(self):
+        code, out = self.generate('  - {ext: .txt, run: gzip}\n')
+        self.assertEqual(code, 0, out)
+        with open(os.path.join(self.app_dir, 'flux-proj', 'windows-debug-x86', 'build.ninja'), 'r') as f:
+            self.assertIn('assets/a.txt.gz: transform ', f.read())
+
+    #------------------------------------------------------------------------------
+    def test_output_collides_with_asset(self):
+        code, out = self.generate('  - {ext: .txt, run: gzip, out: .dat}\n')
+        self.assertEqual(code, 10)
+        self.assertIn('already an asset', out)
+
+    #------------------------------------------------------------------------------
+    def test_outputs_collide(self):
+        code, out = self.generate('  - {ext: .txt, run: gzip, out: .bin}\n  - {ext: .md, run: gzip, out: .bin}\n')
+        self.assertEqual(code, 10)
+        self.assertIn('both write `assets/a.bin`', out)
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""benchmarks stuff"""
+
+import os
+
+from mods import flux, log, util, bench
+
+from mods.build import BuildOpts
+
+#------------------------------------------------------------------------------
+
+def run(flux_dir, proj_dir, args):
+    if len(args) > 0:
+        cmd = args[0]
+        if cmd == 'ninja':
+            opts = BuildOpts()
+            sizes = opts.parse_opts(proj_dir, args[1:])
+            if not all(x.isdigit() and int(x) > 0 for x in sizes):
+                log.fatal('invalid sources count in `%s` (run "./flux help bench")' % ' '.join(sizes))
+            if not os.path.isfile(os.path.join(util.get_targets_dir(flux_dir), opts.target + '.yml')):
+                log.fatal('target `%s` not found, set `-target` option (run "./flux help bench")' % opts.target)
+            log.info('ninja file generation (%s):' % opts.profile)
+            bench.bench_ninja(flux_dir, opts, [int(x) for x in sizes])
+        elif cmd == 'yaml':
+            opts = BuildOpts()
+            sizes = opts.parse_opts(proj_dir, args[1:])
+            if not all(x.isdigit() and int(x) > 0 for x in sizes):
+                log.fatal('invalid inputs count in `%s` (run "./flux help bench")' % ' '.join(sizes))
+            log.info('project file parsing (%s):' % opts.profile)
+            bench.bench_yaml(flux_dir, opts, [int(x) for x in sizes])
+        elif cmd == 'startup':
+            log.info('trivial verbs startup:')
+            if not bench.bench_startup(flux_dir):
+                log.fatal('startup budget exceeded')
+        elif cmd == 'scan':
+            sizes = args[1:]
+            if not all(x.isdigit() and int(x) > 0 for x in sizes):
+                log.fatal('invalid inputs count in `%s` (run "./flux help bench")' % ' '.join(sizes))
+            log.info('yaml scanning:')
+            bench.bench_scan(flux_dir, [int(x) for x in sizes])
+        else:
+            log.error('unknown benchmark "%s" (run "./flux help bench")' % cmd)
+    else:
+        log.error('expected a benchmark. run "./flux help bench" for help')
+
+def help():
+    return 'run flux benchmarks'
+
+def usage():
+    log.text('(?) '+help()+'\n')
+    log.optional('usage', 'bench <benchmark> [options]')
+    log.colored(log.DEFAULT, '\nbenchmarks: ')
+    log.item('  ninja [build-opts] [sizes]  ', 'ninja file generation of synthetic projects (defaults: 10000 50000 100000 sources)')
+    log.item('  yaml [build-opts] [sizes]   ', 'project file parsing of synthetic project files, C and python parsers (defaults: 1000 10000 inputs)')
+    log.item('  startup                     ', 'startup time of trivial verbs, fails if they import build modules or exceed the startup budget')
+    log.item('  scan [sizes]                ', 'python and fast yaml scanners throughput (defaults: 1000 10000 inputs)')
+    log.text('\nresults are appended to `flux-proj/%s` in workspace dir and compared with previous run' % bench.HISTORY_FILE)
+
+#------------------------------------------------------------------------------
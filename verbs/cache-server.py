@@ -0,0 +1,56 @@
+"""remote compile cache server"""
+
+import os
+
+from mods import flux, log, util, remote, project
+
+#------------------------------------------------------------------------------
+
+def run(flux_dir, proj_dir, args):
+    host = '127.0.0.1'
+    port = 8088
+    token = remote.get_token()
+    max_size = remote.MAX_SIZE
+    verbose = False
+    blobs_dir = util.fix_path(os.path.join(util.get_workspace_dir(flux_dir), project.FDIR, 'cache-server'))
+    for arg in args:
+        if arg in ['-v', '-verbose']:
+            verbose = True
+        elif arg.startswith('-host='):
+            host = arg.partition('=')[2]
+        elif arg.startswith('-port='):
+            port = arg.partition('=')[2]
+            if not port.isdigit():
+                log.fatal('invalid value for `port` option: `%s` - must be a number' % port)
+            port = int(port)
+        elif arg.startswith('-max-size='):
+            max_size = arg.partition('=')[2]
+            if not max_size.isdigit():
+                log.fatal('invalid value for `max-size` option: `%s` - must be a number' % max_size)
+            max_size = int(max_size)
+        elif arg.startswith('-'):
+            log.fatal('unrecognized option: `%s` (run "./flux help cache-server")' % arg)
+        else:
+            blobs_dir = util.fix_path(os.path.abspath(os.path.join(proj_dir, arg)))
+
+    if not token:
+        log.warn('`FLUX_CACHE_REMOTE_TOKEN` env var not set, uploads are refused')
+    log.info('serving `%s` on http://%s:%d (press Ctrl+C to stop)' % (blobs_dir, host, port))
+    remote.serve(blobs_dir, host, port, token, max_size, verbose)
+
+def help():
+    return 'serve a remote compile cache over HTTP'
+
+def usage():
+    log.text('(?) '+help()+'\n')
+    log.optional('usage', 'cache-server [options] [dir]')
+    log.colored(log.DEFAULT, '\noptions: ')
+    log.item('  -host=<host>  ', 'listen address (defaults: 127.0.0.1, `0.0.0.0` serves all interfaces)')
+    log.item('  -port=<port>  ', 'listen port (defaults: 8088)')
+    log.item('  -max-size=<n> ', 'max uploaded blob size in MB (defaults: %d)' % remote.MAX_SIZE)
+    log.item('  -v            ', 'log requests')
+    log.text('\nblobs are stored in `dir` (defaults: `flux-proj/cache-server` in workspace dir)')
+    log.text('uploads require the `FLUX_CACHE_REMOTE_TOKEN` env var shared token, set on server and clients')
+    log.text('set `FLUX_CACHE_REMOTE=http://<host>:<port>` env var to use it from `flux build`')
+
+#------------------------------------------------------------------------------
@@ -24,7 +24,7 @@ def usage():
     log.text('(?) '+help()+'\n')
     log.optional('usage', 'help [verb]')
     for verb_name in sorted(verb.verbs):
-        log.item('  '+verb_name, verb.verbs[verb_name].help())
+        log.item('  '+verb_name, verb.verbs.get_help(verb_name))
 
 #------------------------------------------------------------------------------
     
@@ -1,7 +1,6 @@
 """lists stuff"""
 
 import os
-import glob
 from mods import flux, log, util, verb
 
 #------------------------------------------------------------------------------
@@ -39,15 +38,15 @@ def usage():
 def list_verbs(flux_dir):
     log.colored(log.YELLOW, '===== verbs =====')
     for verb_name in sorted(verb.verbs):
-        log.item(verb_name, verb.verbs[verb_name].help())
+        log.item(verb_name, verb.verbs.get_help(verb_name))
 
 def list_targets(flux_dir):
     log.colored(log.YELLOW, '===== targets =====')
     # verbs directory
     target_dir = util.get_targets_dir(flux_dir)
     if os.path.isdir(target_dir):
-        # get all .py file in verb dir
-        target_files = sorted(glob.glob(target_dir + '/*.yml'))
+        # get all .yml file in targets dir, no glob: it imports `re` and weighs on startup
+        target_files = sorted(os.path.join(target_dir, x) for x in os.listdir(target_dir) if x.endswith('.yml'))
         if target_files:
             width = max(len(util.split_name(x)) for x in target_files)
             for target_file in target_files:
@@ -0,0 +1,103 @@
+"""build stats stuff"""
+
+import os
+
+from mods import flux, log, util, stats, timing
+
+from mods.build import BuildOpts
+from mods.graph import DepGraph
+
+#------------------------------------------------------------------------------
+
+def run(flux_dir, proj_dir, args):
+    # stats options, others are build options and projects
+    top = stats.TOP
+    run_index = -1
+    compare = None
+    json_file = None
+    rest = []
+    for arg in args:
+        opt, _, val = arg.partition('=')
+        if opt == '-top':
+            if not val.isdigit():
+                log.fatal('invalid value for `top` option: `%s` - must be a number' % val)
+            top = int(val)
+        elif opt == '-run':
+            try:
+                run_index = int(val)
+            except ValueError:
+                log.fatal('invalid value for `run` option: `%s` - must be a run index, e.g. `-2`' % val)
+        elif opt == '-compare':
+            compare = val or str(run_index - 1)
+        elif opt == '-json':
+            json_file = os.path.abspath(os.path.join(proj_dir, util.fix_path(val)))
+        else:
+            rest.append(arg)
+
+    opts = BuildOpts()
+    args = opts.parse_opts(proj_dir, rest)
+    graph = DepGraph(flux_dir, opts)
+
+    # projects and their dependencies only
+    projects = None
+    out_dirs = {}
+    deps = None
+    if args:
+        for arg in args:
+            _, proj = flux.load_project(flux_dir, proj_dir, arg, opts)
+            graph.add(proj)
+        projs = graph.get_projects()
+        projects = [x.name for x in projs]
+        out_dirs = dict((x.out_dir, x.name) for x in projs)
+        deps = dict((x.name, [y.name for y in graph.resolve(x)]) for x in projs)
+
+    log_file = os.path.join(graph.build_dir, timing.NINJA_LOG)
+    runs = stats.read_runs(graph.build_dir)
+    if not runs:
+        log.fatal('no build found in `%s`, runs are recorded by `flux build`' % log_file)
+    if not -len(runs) <= run_index < len(runs):
+        log.fatal('run `%d` not found, %d runs in `%s`' % (run_index, len(runs), log_file))
+
+    ws_dir = util.get_workspace_dir(flux_dir)
+    result = stats.get_stats(runs[run_index], ws_dir, out_dirs, deps, projects)
+    if not result:
+        log.fatal('no job of %s in run `%d`' % (', '.join('`%s`' % x for x in projects), run_index))
+    log.info('`%s`: run %d of %d' % (log_file, run_index % len(runs) + 1, len(runs)))
+    stats.report(result, top)
+
+    if compare:
+        try:
+            index = int(compare)
+            if not -len(runs) <= index < len(runs):
+                log.fatal('run `%d` not found, %d runs in `%s`' % (index, len(runs), log_file))
+            base = stats.get_stats(runs[index], ws_dir, out_dirs, deps, projects)
+            base_name = 'run %d' % (index % len(runs) + 1)
+        except ValueError:
+            base_file = os.path.abspath(os.path.join(proj_dir, util.fix_path(compare)))
+            if not os.path.isfile(base_file):
+                log.fatal('stats file `%s` not found' % base_file)
+            base = stats.load(base_file)
+            base_name = '`%s`' % base_file
+        if base:
+            stats.report_delta(result, base, base_name, top)
+        else:
+            log.warn('no job to compare with')
+
+    if json_file:
+        stats.save(json_file, result)
+        log.info('build stats written to `%s`' % json_file)
+
+def help():
+    return 'build stats from ninja log: slowest sources, parallelism and critical path'
+
+def usage():
+    log.text('(?) '+help()+'\n')
+    log.optional('usage', 'stats [options] [build-opts] [projects]')
+    log.colored(log.DEFAULT, '\noptions: ')
+    log.item('  -top=N              ', 'number of listed sources (default: %d)' % stats.TOP)
+    log.item('  -run=N              ', 'run index in ninja log, `-1` is the last run (default), `-2` the previous one')
+    log.item('  -compare[=N|file]   ', 'compare with another run (default: previous run) or with stats saved with `-json`')
+    log.item('  -json=file          ', 'save stats to json file')
+    log.text('\nwithout projects, all jobs of the workspace ninja log of the build profile are reported')
+
+#------------------------------------------------------------------------------